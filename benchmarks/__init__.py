@@ -0,0 +1,6 @@
+"""
+  Benchmarks for the doorbell detection pipeline
+
+  Each module is runnable from the repository root, e.g.
+    `python -m benchmarks.sliding_window`
+"""
@@ -0,0 +1,116 @@
+"""
+  Checks that batch detection of the synthetic corpus, written to wav files,
+    detects the same ring cycles, at the same stream times, as the streaming
+    `AiPhoneGT1A` over the same files, for each `Pitch` model, and measures
+    how much faster it is
+
+    streaming: `AiPhoneGT1A.feed_one` of every block of an `audio.File`
+    batch: `batch_detection.detect_ring_cycles`, with the detector's own model,
+      split across `--num_workers` processes, one per CPU by default
+    fast: `detect_ring_cycles(use_fast_model=True)`, which swaps in a faster
+      model, so its detections are reported, but needn't match
+
+  Exits with 1 if any batch detection differs from the streaming one
+
+  Usage:
+    python -m benchmarks.batch_detection
+    python -m benchmarks.batch_detection --models yin --decimated_sample_rate 8000
+    python -m benchmarks.batch_detection --energy_gate --decimated_sample_rate 8000
+    python -m benchmarks.batch_detection --models yin --num_workers 4
+"""
+
+from argparse import ArgumentParser
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import common
+from benchmarks.synthetic import default_corpus
+from lib import batch_detection
+from lib.audio import File
+from lib.clips import write_wav
+from lib.door_bell_detectors import AiPhoneGT1A
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-models', '--models', type=str, nargs='+', default=['yin', 'yinfast'])
+  arg_parser.add_argument('-decimated_sample_rate', '--decimated_sample_rate', type=int)
+  arg_parser.add_argument('-energy_gate', '--energy_gate', action='store_true')
+  arg_parser.add_argument('-num_workers', '--num_workers', type=int)
+
+  return vars(arg_parser.parse_args())
+
+
+def new_detector(file_path, *, model, decimated_sample_rate, energy_gate):
+  return AiPhoneGT1A(
+    audio_stream=File(file_path=file_path),
+    pitch_kwargs={'model': model, 'decimated_sample_rate': decimated_sample_rate},
+    energy_gate_kwargs={} if energy_gate else None,
+  )
+
+
+def main(*, models, decimated_sample_rate, energy_gate, num_workers=None):
+  logging.disable(logging.INFO)
+
+  num_mismatches = 0
+  with tempfile.TemporaryDirectory() as dir_path:
+    file_paths = []
+    for name, recording in default_corpus().items():
+      file_path = os.path.join(dir_path, '{}.wav'.format(name))
+      write_wav(file_path, recording.samples, sample_rate=recording.sample_rate)
+      file_paths.append(file_path)
+
+    for model in models:
+      seconds = {'streaming': 0.0, 'batch': 0.0, 'fast': 0.0}
+      num_fast_mismatches = 0
+      for file_path in file_paths:
+        new_file_detector = lambda: new_detector(
+          file_path,
+          model=model,
+          decimated_sample_rate=decimated_sample_rate,
+          energy_gate=energy_gate,
+        )
+
+        streaming_run = common.run_detector(new_file_detector())
+        seconds['streaming'] += streaming_run.wall_seconds
+
+        started_at = time.perf_counter()
+        batch_detections = batch_detection.detect_ring_cycles(new_file_detector(), num_workers=num_workers)
+        seconds['batch'] += time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        fast_detections = batch_detection.detect_ring_cycles(
+          new_file_detector(),
+          use_fast_model=True,
+          num_workers=num_workers,
+        )
+        seconds['fast'] += time.perf_counter() - started_at
+
+        if batch_detections != streaming_run.ring_cycle_seconds:
+          num_mismatches += 1
+          print('MISMATCH model={} {}: batch {} != streaming {}'.format(
+            model,
+            os.path.basename(file_path),
+            batch_detections,
+            streaming_run.ring_cycle_seconds,
+          ))
+        if fast_detections != streaming_run.ring_cycle_seconds:
+          num_fast_mismatches += 1
+
+      print('model={}: {}, {} of {} fast detections differ'.format(
+        model,
+        ', '.join('{}={:.3f}s'.format(mode, mode_seconds) for mode, mode_seconds in seconds.items()),
+        num_fast_mismatches,
+        len(file_paths),
+      ))
+
+  if num_mismatches:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,161 @@
+"""
+  Measures the press latency of the SwitchBots, against fake BLE devices
+    whose connects and presses take realistic times and sometimes fail:
+
+    cold: connecting before, and disconnecting after, every press, as
+      `switchbotpy.Bot.press` does
+    managed: `BleConnectionManager`, which keeps the devices connected,
+      serializes each device's presses and retries with backoff
+
+  Usage:
+    python -m benchmarks.ble --num_presses 20 --drop_probability 0.1
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import time
+
+from lib.ble_connections import BleConnectionManager, BleLink
+from lib.instrumentation import LatencyHistogram
+
+DEVICE_NAMES = ('answer_doorbell', 'unlock_door')
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-num_presses', '--num_presses', type=int, default=20)
+  arg_parser.add_argument('-connect_seconds', '--connect_seconds', type=float, default=1.5)
+  arg_parser.add_argument('-press_seconds', '--press_seconds', type=float, default=0.1)
+  arg_parser.add_argument('-drop_probability', '--drop_probability', type=float, default=0.1)
+  arg_parser.add_argument('-seed', '--seed', type=int, default=0)
+
+  return vars(arg_parser.parse_args())
+
+
+class FakeBleLink(BleLink):
+  """
+    A BLE device whose connection is dropped, which the next press
+      discovers by failing, with probability `drop_probability` per press
+  """
+
+  def __init__(self, *, connect_seconds, press_seconds, drop_probability, seed):
+    self.connect_seconds = connect_seconds
+    self.press_seconds = press_seconds
+    self.drop_probability = drop_probability
+
+    self._random = random.Random(seed)
+    self._is_connected = False
+    self._is_dropped = False
+    self._is_pressing = False
+
+    self.num_presses = 0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tconnect_seconds={},\n'
+        '\tpress_seconds={},\n'
+        '\tdrop_probability={}\n'
+      ')'
+      ''.format(
+        FakeBleLink.__name__,
+        self.connect_seconds,
+        self.press_seconds,
+        self.drop_probability,
+      )
+    )
+
+  @property
+  def is_connected(self):
+    return self._is_connected
+
+  def connect(self):
+    time.sleep(self.connect_seconds)
+    self._is_connected = True
+    self._is_dropped = False
+
+  def disconnect(self):
+    self._is_connected = False
+
+  def press(self):
+    assert not self._is_pressing, 'a device was pressed concurrently'
+    self._is_pressing = True
+    try:
+      if self._is_dropped:
+        raise ConnectionError('the connection was dropped')
+
+      time.sleep(self.press_seconds)
+      self.num_presses += 1
+      self._is_dropped = self._random.random() < self.drop_probability
+    finally:
+      self._is_pressing = False
+
+
+def new_links(*, connect_seconds, press_seconds, drop_probability, seed):
+  return {
+    name: FakeBleLink(
+      connect_seconds=connect_seconds,
+      press_seconds=press_seconds,
+      drop_probability=drop_probability,
+      seed=seed + i,
+    )
+    for i, name in enumerate(DEVICE_NAMES)
+  }
+
+
+def press_cold(link):
+  link.connect()
+  try:
+    link.press()
+  finally:
+    link.disconnect()
+
+
+def summarize(mode, histogram):
+  summary = histogram.summary()
+  print('{:>7}: {} presses, mean={:.3f}s p50<={:.3f}s p99<={:.3f}s max={:.3f}s'.format(
+    mode,
+    summary['count'],
+    summary['mean'],
+    summary['p50'],
+    summary['p99'],
+    summary['max'],
+  ))
+
+
+def main(*, num_presses, connect_seconds, press_seconds, drop_probability, seed):
+  logging.basicConfig(level=logging.ERROR)
+
+  link_kwargs = {
+    'connect_seconds': connect_seconds,
+    'press_seconds': press_seconds,
+    'drop_probability': drop_probability,
+    'seed': seed,
+  }
+
+  links = new_links(**link_kwargs)
+  histogram = LatencyHistogram()
+  for i in range(num_presses):
+    started_at = time.monotonic()
+    press_cold(links[DEVICE_NAMES[i % len(DEVICE_NAMES)]])
+    histogram.record(time.monotonic() - started_at)
+  summarize('cold', histogram)
+
+  manager = BleConnectionManager(links=new_links(**link_kwargs), backoff_seconds=0.05)
+  manager.connect_all()
+  histogram = LatencyHistogram()
+  for i in range(num_presses):
+    histogram.record(manager.press(DEVICE_NAMES[i % len(DEVICE_NAMES)]))
+  summarize('managed', histogram)
+
+  # every device pressed by several threads at once, which must be serialized
+  with ThreadPoolExecutor(max_workers=4) as executor:
+    list(executor.map(manager.press, DEVICE_NAMES * 4))
+  print('after concurrent presses: {}'.format(manager.summary()))
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,153 @@
+"""
+  Measures, with `tracemalloc`, the memory that each `Stream.read()` allocates:
+    the bytes allocated, and freed, within a read, and the distinct block
+    arrays that the reads return, which, with the buffer pool, are the
+    `num_buffers` blocks of the pool
+
+    file: a `File`, whose blocks are aubio's, or the pool's
+    callback_microphone: a `CallbackMicrophone`, fed by calling its sounddevice
+      callback with a block of frames before each read, so no device is needed
+    allocating: a reference of what a read allocated before the buffer pool,
+      i.e. a new (block_size, num_channels) array, like `InputStream.read`
+      returns, and its downmix
+
+  The blocking `Microphone` reads straight into the pool via PortAudio, so it
+    needs an input device, and isn't measured here
+
+  Usage:
+    python -m benchmarks.buffers
+    python -m benchmarks.buffers --num_reads 20000 --num_channels 2 --num_buffers 2
+"""
+
+from argparse import ArgumentParser
+import os
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import synthesize
+from lib.audio import CallbackMicrophone, File
+from lib.clips import write_wav
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-num_reads', '--num_reads', type=int, default=5000)
+  arg_parser.add_argument('-num_channels', '--num_channels', type=int, default=1)
+  arg_parser.add_argument('-num_buffers', '--num_buffers', type=int, default=1)
+  arg_parser.add_argument('-block_size', '--block_size', type=int, default=512)
+
+  return vars(arg_parser.parse_args())
+
+
+class _Status:
+  input_overflow = False
+
+
+def callback_microphone_reader(*, num_channels, num_buffers, block_size):
+  microphone = CallbackMicrophone(num_channels=num_channels, num_buffers=num_buffers, block_size=block_size)
+  # sounddevice hands the callback a view of PortAudio's buffer
+  indata = np.random.default_rng(0).uniform(-0.5, 0.5, (block_size, num_channels)).astype(np.float32)
+  status = _Status()
+
+  def read():
+    microphone._callback(indata, block_size, None, status)
+    return microphone.read()
+
+  return read
+
+
+def file_reader(file_path, *, num_buffers, block_size):
+  audio_file = File(file_path=file_path, num_buffers=num_buffers, block_size=block_size)
+  audio_file.open()
+  return audio_file.read
+
+
+def allocating_reader(*, num_channels, block_size):
+  def read():
+    frames = np.empty((block_size, num_channels), dtype=np.float32)
+    return frames.reshape(-1) if num_channels == 1 else frames.mean(axis=1, dtype=np.float32)
+
+  return read
+
+
+def measure(read, *, num_reads, blocks_per_second):
+  """
+    :return: a dict of the bytes that a read allocates, at its peak and
+      once it returns, and of the distinct blocks that the reads return
+  """
+
+  for _ in range(100):
+    read()
+
+  # the distinct blocks are counted in a pass of their own, since counting allocates
+  blocks = [read() for _ in range(num_reads)]
+  num_distinct_blocks = len({block.__array_interface__['data'][0] for block in blocks})
+  del blocks
+
+  tracemalloc.start()
+  try:
+    peak_bytes = 0
+    started_bytes, _ = tracemalloc.get_traced_memory()
+    for _ in range(num_reads):
+      tracemalloc.reset_peak()
+      before_bytes, _ = tracemalloc.get_traced_memory()
+      read()
+      _, read_peak_bytes = tracemalloc.get_traced_memory()
+      peak_bytes += read_peak_bytes - before_bytes
+    ended_bytes, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  return {
+    'peak_bytes_per_read': peak_bytes / num_reads,
+    'peak_bytes_per_second': peak_bytes / num_reads * blocks_per_second,
+    'retained_bytes': ended_bytes - started_bytes,
+    'num_distinct_blocks': num_distinct_blocks,
+  }
+
+
+def main(*, num_reads, num_channels, num_buffers, block_size):
+  sample_rate = 44100
+  blocks_per_second = sample_rate / block_size
+
+  with tempfile.TemporaryDirectory() as dir_path:
+    recording = synthesize(lead_seconds=num_reads * 2 / blocks_per_second, seed=3)
+    file_path = os.path.join(dir_path, 'recording.wav')
+    write_wav(file_path, recording.samples, sample_rate=recording.sample_rate)
+
+    readers = {
+      'file': file_reader(file_path, num_buffers=num_buffers, block_size=block_size),
+      'callback_microphone': callback_microphone_reader(
+        num_channels=num_channels,
+        num_buffers=num_buffers,
+        block_size=block_size,
+      ),
+      'allocating': allocating_reader(num_channels=num_channels, block_size=block_size),
+    }
+
+    print('{} reads of {} samples, {} channel(s), {} buffer(s), {:.1f} blocks/s'.format(
+      num_reads,
+      block_size,
+      num_channels,
+      num_buffers,
+      blocks_per_second,
+    ))
+    for name, read in readers.items():
+      result = measure(read, num_reads=num_reads, blocks_per_second=blocks_per_second)
+      print(
+        '{}: {:.0f} bytes allocated per read at peak ({:.1f}KB/s), {} bytes retained, {} distinct block(s)'
+        ''.format(
+          name,
+          result['peak_bytes_per_read'],
+          result['peak_bytes_per_second'] / 1024,
+          result['retained_bytes'],
+          result['num_distinct_blocks'],
+        )
+      )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
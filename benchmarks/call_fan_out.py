@@ -0,0 +1,252 @@
+"""
+  Measures the ring-to-phone latency of placing the doorbell's calls, i.e. the
+    seconds until twilio has queued them, against a local stand-in of twilio's
+    REST API, whose `connection_setup_seconds` stands in for the TCP and TLS
+    handshakes to api.twilio.com:
+
+    cold: a new client per ring, dialing each phone in turn, as `doorbell_ring`
+      used to for its single phone
+    pooled: `CallFanOut` with a single client whose connections are warmed up,
+      dialing every phone at once, with the kwargs of `doorbell_ring_all`;
+      then, when the first phone answers, the seconds until the other
+      calls are canceled
+
+  Like twilio, the stand-in rejects a call without an absolute `Url`, or
+    `Twiml`, for its answer, or whose `StatusCallback` isn't absolute
+
+  Usage:
+    python -m benchmarks.call_fan_out --num_phones 3 --repeat 5
+"""
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import re
+import statistics
+import threading
+import time
+from urllib.parse import parse_qs
+import uuid
+
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+from lib.call_fan_out import CallFanOut, warm_up_connections
+from lib.twilio_call import _doorbell_call_kwargs
+
+ACCOUNT_SID = 'AC' + '0' * 32
+AUTH_TOKEN = 'stand-in'
+FROM_PHONE = '+15555550000'
+# stands in for the ngrok tunnel that twilio's webhooks are sent to
+HTTP_DOMAIN = 'https://doorbell.example.com/'
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-num_phones', '--num_phones', type=int, default=3)
+  arg_parser.add_argument('-repeat', '--repeat', type=int, default=5)
+  arg_parser.add_argument('-connection_setup_seconds', '--connection_setup_seconds', type=float, default=0.15)
+  arg_parser.add_argument('-request_seconds', '--request_seconds', type=float, default=0.05)
+
+  return vars(arg_parser.parse_args())
+
+
+class StandInTwilioServer(ThreadingHTTPServer):
+  """
+    Just enough of twilio's REST API for fetching the account, and creating
+      and updating calls, with latencies per connection and per request
+  """
+
+  daemon_threads = True
+
+  def __init__(self, *, connection_setup_seconds, request_seconds):
+    super().__init__(('127.0.0.1', 0), _StandInTwilioRequestHandler)
+    self.connection_setup_seconds = connection_setup_seconds
+    self.request_seconds = request_seconds
+
+    self.num_connections = 0
+    self._call_numbers = itertools.count()
+
+  @property
+  def base_url(self):
+    return 'http://{}:{}'.format(*self.server_address)
+
+  def new_call_sid(self):
+    return 'CA{:032x}'.format(next(self._call_numbers))
+
+
+class _StandInTwilioRequestHandler(BaseHTTPRequestHandler):
+  # keeps the connection open between requests, like twilio's API
+  protocol_version = 'HTTP/1.1'
+  # otherwise the headers and body, which are written separately, wait on delayed ACKs
+  disable_nagle_algorithm = True
+
+  def setup(self):
+    self.server.num_connections += 1
+    time.sleep(self.server.connection_setup_seconds)
+    super().setup()
+
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    time.sleep(self.server.request_seconds)
+    self._respond(200, {'sid': ACCOUNT_SID, 'status': 'active'})
+
+  def do_POST(self):
+    form = {
+      key: values[0]
+      for key, values in parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode()).items()
+    }
+    time.sleep(self.server.request_seconds)
+
+    call_sid_match = re.search(r'/Calls/(CA[0-9a-f]+)\.json$', self.path)
+    if call_sid_match is None:
+      if not (_is_absolute_url(form.get('Url')) or 'Twiml' in form):
+        self._respond(400, {'code': 21205, 'message': 'Url or Twiml is required'})
+        return
+      if 'StatusCallback' in form and not _is_absolute_url(form['StatusCallback']):
+        self._respond(400, {'code': 21609, 'message': 'StatusCallback must be an absolute url'})
+        return
+
+      self._respond(201, {
+        'sid': self.server.new_call_sid(),
+        'status': 'queued',
+        'to': form['To'],
+        'from': form['From'],
+      })
+    else:
+      self._respond(200, {
+        'sid': call_sid_match.group(1),
+        'status': form['Status'],
+      })
+
+  def _respond(self, status, payload):
+    body = json.dumps(payload).encode()
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+
+def _is_absolute_url(url):
+  return url is not None and re.match(r'https?://[^/]+/', url) is not None
+
+
+class StandInHttpClient(TwilioHttpClient):
+  """
+    Sends the requests to twilio's API to a `StandInTwilioServer` instead
+  """
+
+  def __init__(self, *, base_url, **kwargs):
+    super().__init__(**kwargs)
+    self.base_url = base_url
+
+  def request(self, method, url, *args, **kwargs):
+    return super().request(method, url.replace('https://api.twilio.com', self.base_url), *args, **kwargs)
+
+
+def new_client(server):
+  return Client(
+    ACCOUNT_SID,
+    AUTH_TOKEN,
+    http_client=StandInHttpClient(base_url=server.base_url),
+  )
+
+
+def ring_cold(server, *, to_phones):
+  """
+    :return: a dict of the seconds from the ring until the first and
+      the last calls are queued
+  """
+
+  started_at = time.monotonic()
+  client = new_client(server)
+  queued_seconds = []
+  for to_phone in to_phones:
+    client.calls.create(to=to_phone, from_=FROM_PHONE, **_doorbell_call_kwargs(http_domain=HTTP_DOMAIN))
+    queued_seconds.append(time.monotonic() - started_at)
+
+  return {
+    'first_queued_seconds': queued_seconds[0],
+    'last_queued_seconds': queued_seconds[-1],
+  }
+
+
+def ring_pooled(client, *, to_phones):
+  """
+    :return: a dict of the seconds from the ring until the first and the
+      last calls are queued, and from the first answer until `on_answered`
+      returns, i.e. the answerer's webhook can respond, and until the
+      others are canceled
+  """
+
+  fan_out = CallFanOut(
+    client=client,
+    from_phone=FROM_PHONE,
+    to_phones=to_phones,
+    create_kwargs=_doorbell_call_kwargs(http_domain=HTTP_DOMAIN, fan_out_id=uuid.uuid4().hex),
+  ).start()
+  assert len(fan_out.call_sids) == len(to_phones), 'only {} of {} calls were created'.format(
+    len(fan_out.call_sids),
+    len(to_phones),
+  )
+
+  answered_at = time.monotonic()
+  fan_out.on_answered(fan_out.call_sids[0])
+  answer_response_seconds = time.monotonic() - answered_at
+  fan_out.wait_for_ended()
+  canceled_seconds = time.monotonic() - answered_at
+
+  return {
+    'first_queued_seconds': min(fan_out.queued_seconds.values()),
+    'last_queued_seconds': max(fan_out.queued_seconds.values()),
+    'answer_response_seconds': answer_response_seconds,
+    'canceled_seconds': canceled_seconds,
+  }
+
+
+def summarize(mode, runs, *, num_connections):
+  print('{:>6}: {} ({} connections opened)'.format(
+    mode,
+    ', '.join(
+      '{}={:.3f}s'.format(key, statistics.median(run[key] for run in runs))
+      for key in runs[0]
+    ),
+    num_connections,
+  ))
+
+
+def main(*, num_phones, repeat, connection_setup_seconds, request_seconds):
+  server = StandInTwilioServer(
+    connection_setup_seconds=connection_setup_seconds,
+    request_seconds=request_seconds,
+  )
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  to_phones = ['+1555555{:04d}'.format(i + 1) for i in range(num_phones)]
+  print('{} phones; {:.3f}s per connection and {:.3f}s per request (medians of {})'.format(
+    num_phones,
+    connection_setup_seconds,
+    request_seconds,
+    repeat,
+  ))
+
+  num_connections_before = server.num_connections
+  runs = [ring_cold(server, to_phones=to_phones) for _ in range(repeat)]
+  summarize('cold', runs, num_connections=server.num_connections - num_connections_before)
+
+  client = new_client(server)
+  warm_up_connections(client, num_connections=num_phones)
+  num_connections_before = server.num_connections
+  runs = [ring_pooled(client, to_phones=to_phones) for _ in range(repeat)]
+  summarize('pooled', runs, num_connections=server.num_connections - num_connections_before)
+
+  server.shutdown()
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,141 @@
+"""
+  Measures the memory and CPU of listening to several intercoms:
+
+    shared: one process whose `CaptureManager` runs a detector per intercom
+    separate: a process per intercom, as running `main.py` once per device does
+
+  Each intercom is a synthetic recording, with its own ring cycles, that is
+    replayed, paced like a live microphone but `--replay_speed` times faster;
+    the per-device metrics of the shared run are printed too
+
+  Usage:
+    python -m benchmarks.capture --num_devices 4
+    python -m benchmarks.capture --num_devices 8 --replay_speed 4 --energy_gate
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+MODES = ('shared', 'separate')
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-num_devices', '--num_devices', type=int, default=4)
+  arg_parser.add_argument('-replay_speed', '--replay_speed', type=float, default=8)
+  arg_parser.add_argument('-energy_gate', '--energy_gate', action='store_true')
+  # the arguments of a single, child, run
+  arg_parser.add_argument('-audio_file_paths', '--audio_file_paths', type=str, nargs='+')
+
+  return vars(arg_parser.parse_args())
+
+
+def run_child(*, audio_file_paths, replay_speed, energy_gate):
+  """
+    Listen to every file at once, in this process, and print a json of
+      the per-device summary and the process' peak resident memory
+  """
+
+  from lib.audio import File
+  from lib.capture import CaptureManager
+  from lib.door_bell_detectors import AiPhoneGT1A
+
+  capture_manager = CaptureManager(
+    detectors={
+      os.path.basename(audio_file_path): AiPhoneGT1A(
+        audio_stream=File(file_path=audio_file_path, replay_speed=replay_speed),
+        energy_gate_kwargs={} if energy_gate else None,
+      )
+      for audio_file_path in audio_file_paths
+    },
+    cooldown_seconds=0,
+  )
+  summary = capture_manager.run(on_ring=lambda device: None)
+
+  print(json.dumps({
+    'devices': summary,
+    # kilobytes on linux
+    'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+  }))
+
+
+def run_children(args_of_children, *, replay_speed, energy_gate):
+  """
+    Run every child concurrently
+
+    :return: a list of each child's json output
+  """
+
+  children = [
+    subprocess.Popen(
+      [
+        sys.executable, '-m', 'benchmarks.capture',
+        '--replay_speed', str(replay_speed),
+        '--audio_file_paths', *audio_file_paths,
+      ] + (['--energy_gate'] if energy_gate else []),
+      stdout=subprocess.PIPE,
+      text=True,
+    )
+    for audio_file_paths in args_of_children
+  ]
+
+  outputs = []
+  for child in children:
+    stdout, _ = child.communicate()
+    assert child.returncode == 0, 'a child run failed with {}'.format(child.returncode)
+    outputs.append(json.loads(stdout.strip().splitlines()[-1]))
+
+  return outputs
+
+
+def main(*, num_devices, replay_speed, energy_gate, audio_file_paths=None):
+  if audio_file_paths is not None:
+    run_child(audio_file_paths=audio_file_paths, replay_speed=replay_speed, energy_gate=energy_gate)
+    return
+
+  from benchmarks.synthetic import synthesize
+  from lib.clips import write_wav
+
+  with tempfile.TemporaryDirectory() as dir_path:
+    audio_file_paths = []
+    for i in range(num_devices):
+      recording = synthesize(num_ring_cycles=1 + i % 2, seed=10 + i)
+      audio_file_path = os.path.join(dir_path, 'intercom_{}.wav'.format(i))
+      write_wav(audio_file_path, recording.samples, sample_rate=recording.sample_rate)
+      audio_file_paths.append(audio_file_path)
+
+    child_kwargs = {'replay_speed': replay_speed, 'energy_gate': energy_gate}
+    shared, = run_children([audio_file_paths], **child_kwargs)
+    separate = run_children([[path] for path in audio_file_paths], **child_kwargs)
+
+  for name, summary in shared['devices'].items():
+    print(
+      '{}: {} ring(s), {:.1f}s of audio, {:.3%} of one core, lag {:.3f}s{}'
+      ''.format(
+        name,
+        summary['num_rings'],
+        summary['audio_seconds'],
+        summary['cpu_fraction'],
+        summary['lag_seconds'],
+        '' if 'duty_cycle' not in summary else ', duty cycle {:.1%}'.format(summary['duty_cycle']),
+      )
+    )
+
+  shared_bytes = shared['max_rss_bytes']
+  separate_bytes = sum(output['max_rss_bytes'] for output in separate)
+  print('shared: 1 process, {:.1f}MB'.format(shared_bytes / 2 ** 20))
+  print('separate: {} processes, {:.1f}MB ({:.1f}x the memory)'.format(
+    len(separate),
+    separate_bytes / 2 ** 20,
+    separate_bytes / shared_bytes,
+  ))
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,74 @@
+"""
+  Measures the cost, to the detection loop, of keeping a `ClipRecorder`:
+    the latency of every `push`, including those that queue a clip, while
+    the writer thread writes clips in the background
+
+  The blocks are pushed `--replay_speed` times faster than real time; the
+    writer has `buffer_seconds`, of audio, to copy each clip, so replaying
+    much faster than the writer can write drops clips, as it should
+
+  Usage:
+    python -m benchmarks.clips
+    python -m benchmarks.clips --audio_seconds 600 --clip_every_seconds 5 --replay_speed 50
+"""
+
+from argparse import ArgumentParser
+import tempfile
+import time
+
+from benchmarks.synthetic import synthesize, SyntheticStream
+from lib.clips import ClipRecorder
+from lib.instrumentation import LatencyHistogram
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-audio_seconds', '--audio_seconds', type=float, default=300)
+  arg_parser.add_argument('-clip_every_seconds', '--clip_every_seconds', type=float, default=15)
+  arg_parser.add_argument('-replay_speed', '--replay_speed', type=float, default=20)
+  arg_parser.add_argument('-clip_format', '--clip_format', type=str, default='wav')
+
+  return vars(arg_parser.parse_args())
+
+
+def main(*, audio_seconds, clip_every_seconds, replay_speed, clip_format):
+  recording = synthesize(num_ring_cycles=0, lead_seconds=audio_seconds, seed=7)
+  audio_stream = SyntheticStream(samples=recording.samples, sample_rate=recording.sample_rate)
+  blocks_per_clip = int(clip_every_seconds * audio_stream.sample_rate / audio_stream.block_size)
+  seconds_per_block = audio_stream.block_size / audio_stream.sample_rate / replay_speed
+
+  push_latencies = LatencyHistogram()
+  with tempfile.TemporaryDirectory() as dir_path:
+    with audio_stream, ClipRecorder(audio_stream, dir_path=dir_path, clip_format=clip_format) as clip_recorder:
+      replay_started_at = time.perf_counter()
+      for block in audio_stream.iter_read():
+        wait_seconds = replay_started_at + audio_stream.num_blocks_read * seconds_per_block - time.perf_counter()
+        if wait_seconds > 0:
+          time.sleep(wait_seconds)
+
+        if audio_stream.num_blocks_read % blocks_per_clip == 0:
+          clip_recorder.request_clip('benchmark')
+
+        started_at = time.perf_counter()
+        clip_recorder.push(block, 0.0)
+        push_latencies.record(time.perf_counter() - started_at)
+
+      write_started_at = time.perf_counter()
+
+    print('push: {}'.format({
+      key: '{:.1f}us'.format(value * 1e6) if isinstance(value, float) else value
+      for key, value in push_latencies.summary().items()
+    }))
+    print('{} clips written, {} dropped, {:.3f}s waited at close for the last ones'.format(
+      clip_recorder.num_clips_written,
+      clip_recorder.num_clips_dropped,
+      time.perf_counter() - write_started_at,
+    ))
+    print('buffer: {:.1f}MB preallocated'.format(
+      (clip_recorder._blocks.nbytes + clip_recorder._confidences.nbytes) / 2 ** 20,
+    ))
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,169 @@
+"""
+  Helpers shared by the benchmarks: timing a detector over a stream,
+    scoring its detections against ground truth and comparing the
+    results with stored baselines
+"""
+
+import json
+import os
+import platform
+import time
+
+from lib.calibration import score_detections
+
+BASELINES_DIR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+# the seconds after a ring cycle's end within which its detection still matches it
+SLACK_SECONDS = 4.0
+
+
+class DetectorRun:
+  """
+    The outcome of running a detector over a whole stream
+  """
+
+  def __init__(self, *, ring_cycle_seconds, num_blocks, audio_seconds, wall_seconds, cpu_seconds):
+    self.ring_cycle_seconds = ring_cycle_seconds
+    self.num_blocks = num_blocks
+    self.audio_seconds = audio_seconds
+    self.wall_seconds = wall_seconds
+    self.cpu_seconds = cpu_seconds
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tring_cycle_seconds={},\n'
+        '\tnum_blocks={},\n'
+        '\taudio_seconds={:.3f},\n'
+        '\twall_seconds={:.3f},\n'
+        '\tcpu_seconds={:.3f}\n'
+      ')'
+      ''.format(
+        DetectorRun.__name__,
+        self.ring_cycle_seconds,
+        self.num_blocks,
+        self.audio_seconds,
+        self.wall_seconds,
+        self.cpu_seconds,
+      )
+    )
+
+
+def run_detector(detector):
+  """
+    Run `detector.iter_rings`, without a cooldown, over the whole of
+      `detector.audio_stream` and time it
+
+    :return: a `DetectorRun`, whose `ring_cycle_seconds` are the stream
+      times at which each ring cycle was detected
+  """
+
+  audio_stream = detector.audio_stream
+
+  wall_start = time.perf_counter()
+  cpu_start = time.process_time()
+  # `iter_rings` is suspended at each ring, so the stream has been read up to its detection
+  ring_cycle_seconds = [
+    audio_stream.num_seconds_read
+    for _ in detector.iter_rings(cooldown_seconds=0)
+  ]
+  wall_seconds = time.perf_counter() - wall_start
+  cpu_seconds = time.process_time() - cpu_start
+
+  return DetectorRun(
+    ring_cycle_seconds=ring_cycle_seconds,
+    num_blocks=audio_stream.num_blocks_read,
+    audio_seconds=audio_stream.num_seconds_read,
+    wall_seconds=wall_seconds,
+    cpu_seconds=cpu_seconds,
+  )
+
+
+def machine_description():
+  return '{} {} python {}'.format(
+    platform.machine(),
+    platform.processor() or platform.system(),
+    platform.python_version(),
+  )
+
+
+def baseline_path(name):
+  return os.path.join(BASELINES_DIR_PATH, '{}.json'.format(name))
+
+
+def load_baseline(name):
+  """
+    :return: the stored baseline results of the benchmark `name`, or None
+  """
+
+  path = baseline_path(name)
+  if not os.path.isfile(path):
+    return None
+
+  with open(path, 'r') as json_file:
+    return json.load(json_file)
+
+
+def save_baseline(name, results):
+  """
+    Store `results`, a dict of config name -> dict of metric -> value,
+      as the baseline of the benchmark `name`
+
+    :return: the path that the baseline was written to
+  """
+
+  os.makedirs(BASELINES_DIR_PATH, exist_ok=True)
+
+  path = baseline_path(name)
+  with open(path, 'w') as json_file:
+    json.dump(
+      {
+        'machine': machine_description(),
+        'results': results,
+      },
+      json_file,
+      indent=2,
+      sort_keys=True,
+    )
+    json_file.write('\n')
+
+  return path
+
+
+def find_regressions(results, baseline, *, higher_is_better, lower_is_better, exact, tolerance):
+  """
+    Compare `results` against `baseline['results']`
+
+    :param higher_is_better: metric names that regress when they drop by more than `tolerance`
+    :param lower_is_better: metric names that regress when they rise by more than `tolerance`
+    :param exact: metric names that regress when they change at all
+    :param tolerance: the allowed relative change, e.g. 0.2 for 20%
+
+    :return: a list of human-readable regression descriptions
+  """
+
+  regressions = []
+  for config_name, metrics in results.items():
+    baseline_metrics = baseline['results'].get(config_name)
+    if baseline_metrics is None:
+      continue
+
+    for metric, value in metrics.items():
+      baseline_value = baseline_metrics.get(metric)
+      if baseline_value is None or value is None:
+        continue
+
+      if metric in higher_is_better:
+        is_regression = value < baseline_value * (1 - tolerance)
+      elif metric in lower_is_better:
+        is_regression = value > baseline_value * (1 + tolerance)
+      elif metric in exact:
+        is_regression = value != baseline_value
+      else:
+        is_regression = False
+
+      if is_regression:
+        regressions.append(
+          '{}: {} went from {} to {}'.format(config_name, metric, baseline_value, value)
+        )
+
+  return regressions
@@ -0,0 +1,122 @@
+"""
+  Measures the CPU savings, and the detection parity, of decimating the audio
+    before `Pitch` detects its pitch, over the synthetic corpus
+
+  Each decimated configuration is compared against the full rate one of
+    the same model: its CPU cost, whether it has the same true positives,
+    false positives and misses, i.e. parity, and its detection latency
+
+  Band limiting removes most of the corpus' white noise, so YIN is more
+    confident of the decimated ring, and the ring's window averages enter
+    the min<->max confidence range at a different time; the detections
+    themselves should match, but `min_ringing_confidence` and
+    `max_ringing_confidence` are worth recalibrating for a decimated rate
+
+  Usage:
+    python -m benchmarks.decimation
+    python -m benchmarks.decimation --models yinfast --decimated_sample_rates 11025 8000
+"""
+
+from argparse import ArgumentParser
+import logging
+import statistics
+
+from benchmarks import common
+from benchmarks.synthetic import default_corpus, SyntheticStream
+from lib.door_bell_detectors import AiPhoneGT1A
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-models', '--models', type=str, nargs='+', default=['yin', 'yinfast'])
+  arg_parser.add_argument(
+    '-decimated_sample_rates', '--decimated_sample_rates',
+    type=int,
+    nargs='+',
+    default=[22050, 16000, 11025, 8000],
+  )
+  arg_parser.add_argument('-block_size', '--block_size', type=int, default=512)
+
+  return vars(arg_parser.parse_args())
+
+
+def run_corpus(corpus, *, model, block_size, decimated_sample_rate):
+  """
+    :return: (cpu_seconds_per_audio_second, the scores summed over the corpus,
+      the mean detection latency)
+  """
+
+  cpu_seconds = 0
+  audio_seconds = 0
+  latencies = []
+  scores = {'num_true_positives': 0, 'num_false_positives': 0, 'num_missed': 0}
+
+  for recording in corpus.values():
+    detector = AiPhoneGT1A(
+      audio_stream=SyntheticStream(
+        samples=recording.samples,
+        sample_rate=recording.sample_rate,
+        block_size=block_size,
+      ),
+      pitch_kwargs={'model': model, 'decimated_sample_rate': decimated_sample_rate},
+    )
+
+    detector_run = common.run_detector(detector)
+    cpu_seconds += detector_run.cpu_seconds
+    audio_seconds += detector_run.audio_seconds
+
+    recording_scores = common.score_detections(
+      detector_run.ring_cycle_seconds,
+      ring_cycles=recording.ring_cycles,
+      slack_seconds=common.SLACK_SECONDS,
+    )
+    latencies.extend(recording_scores['latencies'])
+    for key in scores:
+      scores[key] += recording_scores[key]
+
+  return cpu_seconds / audio_seconds, scores, statistics.mean(latencies) if latencies else None
+
+
+def main(*, models, decimated_sample_rates, block_size):
+  logging.basicConfig(level=logging.WARNING)
+
+  corpus = default_corpus()
+
+  for model in models:
+    full_rate_cpu, full_rate_scores, latency = run_corpus(
+      corpus,
+      model=model,
+      block_size=block_size,
+      decimated_sample_rate=None,
+    )
+    print(
+      'model={} at full rate: {:.3%} of one core, mean latency {:.3f}s, {}'
+      ''.format(model, full_rate_cpu, latency, full_rate_scores),
+      flush=True,
+    )
+
+    for decimated_sample_rate in decimated_sample_rates:
+      cpu, scores, latency = run_corpus(
+        corpus,
+        model=model,
+        block_size=block_size,
+        decimated_sample_rate=decimated_sample_rate,
+      )
+      print(
+        'model={} decimated to {}Hz: {:.3%} of one core ({:.1f}x cheaper), mean latency {:.3f}s, '
+        'parity={}'
+        ''.format(
+          model,
+          decimated_sample_rate,
+          cpu,
+          full_rate_cpu / cpu,
+          latency,
+          scores == full_rate_scores,
+        ),
+        flush=True,
+      )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,130 @@
+"""
+  Measures the throughput and detection latency of `AiPhoneGT1A` over the
+    synthetic corpus, for each combination of `Pitch` model and block size,
+    and compares the results against the stored baseline
+
+  Usage:
+    python -m benchmarks.detector
+    python -m benchmarks.detector --models yinfast --block_sizes 512 --save_baseline
+"""
+
+from argparse import ArgumentParser
+import logging
+import statistics
+import sys
+
+from benchmarks import common
+from benchmarks.synthetic import default_corpus, SyntheticStream
+from lib.door_bell_detectors import AiPhoneGT1A
+
+BASELINE_NAME = 'detector'
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-models', '--models', type=str, nargs='+', default=['yin', 'yinfast'])
+  arg_parser.add_argument('-block_sizes', '--block_sizes', type=int, nargs='+', default=[256, 512, 1024])
+  arg_parser.add_argument('-sample_rate', '--sample_rate', type=int, default=44100)
+  arg_parser.add_argument('-tolerance', '--tolerance', type=float, default=0.2)
+  arg_parser.add_argument('-save_baseline', '--save_baseline', action='store_true')
+
+  return vars(arg_parser.parse_args())
+
+
+def benchmark_config(corpus, *, model, block_size, sample_rate):
+  """
+    :return: a dict of metric -> value for one model and block size
+  """
+
+  num_blocks = 0
+  audio_seconds = 0
+  wall_seconds = 0
+  cpu_seconds = 0
+  latencies = []
+  num_true_positives = 0
+  num_false_positives = 0
+  num_missed = 0
+
+  for recording in corpus.values():
+    detector = AiPhoneGT1A(
+      audio_stream=SyntheticStream(
+        samples=recording.samples,
+        sample_rate=sample_rate,
+        block_size=block_size,
+      ),
+      pitch_confidences_per_second=sample_rate / block_size,
+      pitch_kwargs={'model': model},
+    )
+
+    detector_run = common.run_detector(detector)
+    scores = common.score_detections(
+      detector_run.ring_cycle_seconds,
+      ring_cycles=recording.ring_cycles,
+      slack_seconds=common.SLACK_SECONDS,
+    )
+
+    num_blocks += detector_run.num_blocks
+    audio_seconds += detector_run.audio_seconds
+    wall_seconds += detector_run.wall_seconds
+    cpu_seconds += detector_run.cpu_seconds
+    latencies.extend(scores['latencies'])
+    num_true_positives += scores['num_true_positives']
+    num_false_positives += scores['num_false_positives']
+    num_missed += scores['num_missed']
+
+  return {
+    'blocks_per_second': round(num_blocks / wall_seconds, 1),
+    'cpu_seconds_per_audio_second': round(cpu_seconds / audio_seconds, 5),
+    'mean_latency_seconds': round(statistics.mean(latencies), 3) if latencies else None,
+    'max_latency_seconds': round(max(latencies), 3) if latencies else None,
+    'num_true_positives': num_true_positives,
+    'num_false_positives': num_false_positives,
+    'num_missed': num_missed,
+  }
+
+
+def main(*, models, block_sizes, sample_rate, tolerance, save_baseline):
+  logging.basicConfig(level=logging.WARNING)
+
+  corpus = default_corpus(sample_rate=sample_rate)
+
+  results = {}
+  for model in models:
+    for block_size in block_sizes:
+      config_name = 'model={} block_size={}'.format(model, block_size)
+      results[config_name] = benchmark_config(
+        corpus,
+        model=model,
+        block_size=block_size,
+        sample_rate=sample_rate,
+      )
+      print('{}: {}'.format(config_name, results[config_name]), flush=True)
+
+  if save_baseline:
+    print('saved baseline to {}'.format(common.save_baseline(BASELINE_NAME, results)))
+    return
+
+  baseline = common.load_baseline(BASELINE_NAME)
+  if baseline is None:
+    print('there is no baseline to compare against; run with --save_baseline')
+    return
+
+  regressions = common.find_regressions(
+    results,
+    baseline,
+    higher_is_better={'blocks_per_second'},
+    lower_is_better={'cpu_seconds_per_audio_second', 'mean_latency_seconds', 'max_latency_seconds'},
+    exact={'num_true_positives', 'num_false_positives', 'num_missed'},
+    tolerance=tolerance,
+  )
+  print('compared against the baseline from: {}'.format(baseline['machine']))
+  for regression in regressions:
+    print('REGRESSION {}'.format(regression))
+
+  if regressions:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
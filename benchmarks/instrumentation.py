@@ -0,0 +1,60 @@
+"""
+  Measures the per-block overhead of `INSTRUMENTATION`, disabled and enabled,
+    on the detection hot path
+
+  Usage:
+    python -m benchmarks.instrumentation --repeat 5
+"""
+
+from argparse import ArgumentParser
+import logging
+
+from benchmarks import common
+from benchmarks.synthetic import synthesize, SyntheticStream
+from lib.door_bell_detectors import AiPhoneGT1A
+from lib.instrumentation import INSTRUMENTATION
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-repeat', '--repeat', type=int, default=5)
+
+  return vars(arg_parser.parse_args())
+
+
+def best_seconds_per_block(recording, *, repeat):
+  best = None
+  for _ in range(repeat):
+    detector = AiPhoneGT1A(
+      audio_stream=SyntheticStream(samples=recording.samples),
+      # the cheapest model, so that the instrumentation's share is most visible
+      pitch_kwargs={'model': 'yinfast'},
+    )
+    detector_run = common.run_detector(detector)
+
+    seconds_per_block = detector_run.wall_seconds / detector_run.num_blocks
+    best = seconds_per_block if best is None else min(best, seconds_per_block)
+
+  return best
+
+
+def main(*, repeat):
+  logging.basicConfig(level=logging.WARNING)
+
+  recording = synthesize(num_ring_cycles=2)
+
+  INSTRUMENTATION.disable()
+  disabled = best_seconds_per_block(recording, repeat=repeat)
+
+  INSTRUMENTATION.enable()
+  enabled = best_seconds_per_block(recording, repeat=repeat)
+  INSTRUMENTATION.disable()
+
+  print('disabled: {:.2f}us per block'.format(disabled * 1e6))
+  print(' enabled: {:.2f}us per block ({:+.1%})'.format(enabled * 1e6, enabled / disabled - 1))
+  print(INSTRUMENTATION.summary())
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,94 @@
+"""
+  Compares the per-block cost of averaging pitch confidences via
+    `sum(deque)`, which is what `AiPhoneGT1A` used to do,
+    against `SlidingWindow`
+
+  Usage:
+    python -m benchmarks.sliding_window --window_size 154 --num_values 200000
+"""
+
+from argparse import ArgumentParser
+from collections import deque
+import random
+import time
+
+from lib.sliding_window import SlidingWindow
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-window_size', '--window_size', type=int, default=int(86 * 1.8))
+  arg_parser.add_argument('-num_values', '--num_values', type=int, default=200000)
+  arg_parser.add_argument('-seed', '--seed', type=int, default=0)
+
+  return vars(arg_parser.parse_args())
+
+
+def deque_averages(values, *, window_size, fill_value=0.0):
+  dq = deque(
+    (fill_value for _ in range(window_size)),
+    maxlen=window_size
+  )
+
+  averages = []
+  for value in values:
+    dq.append(value)
+    averages.append(sum(dq) / window_size)
+
+  return averages
+
+
+def sliding_window_averages(values, *, window_size, fill_value=0.0, track_extrema=False):
+  window = SlidingWindow(
+    size=window_size,
+    fill_value=fill_value,
+    track_extrema=track_extrema,
+  )
+
+  averages = []
+  for value in values:
+    window.push(value)
+    averages.append(window.mean)
+
+  return averages
+
+
+def sliding_window_with_extrema_averages(values, *, window_size, fill_value=0.0):
+  return sliding_window_averages(
+    values,
+    window_size=window_size,
+    fill_value=fill_value,
+    track_extrema=True,
+  )
+
+
+def main(*, window_size, num_values, seed):
+  rng = random.Random(seed)
+  values = [rng.random() for _ in range(num_values)]
+
+  results = {}
+  for func in (deque_averages, sliding_window_averages, sliding_window_with_extrema_averages):
+    start = time.perf_counter()
+    averages = func(values, window_size=window_size)
+    seconds = time.perf_counter() - start
+    results[func.__name__] = averages
+
+    print(
+      '{:>38}: {:.3f}s total, {:.3f}us per value'
+      ''.format(
+        func.__name__,
+        seconds,
+        seconds / num_values * 1e6,
+      )
+    )
+
+  max_abs_diff = max(
+    abs(a - b)
+    for a, b in zip(results['deque_averages'], results['sliding_window_averages'])
+  )
+  print('max abs difference between the averages: {:.3g}'.format(max_abs_diff))
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,147 @@
+"""
+  Measures the time from starting `main.py`, i.e. the python interpreter,
+    to the detector processing its first block of audio, for:
+
+    blocking: `is_ringing`, which never touches the twilio or SwitchBot services
+    pipeline: `--async_pipeline`, which warms the services up in the background
+    eager: `--async_pipeline`, but importing and warming up the services
+      before listening starts, as importing `twilio_call` used to
+
+  Each run is a fresh interpreter, so that the imports are included
+
+  Without a `--conf_path` the services' credentials are missing, so warming
+    them up fails fast, and only their imports are measured; with a real
+    `conf.json` the ngrok tunnels and bluetooth stack are included too
+
+  Usage:
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --conf_path conf.json
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ('blocking', 'pipeline', 'eager')
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-repeat', '--repeat', type=int, default=5)
+  arg_parser.add_argument('-modes', '--modes', type=str, nargs='+', choices=MODES, default=list(MODES))
+  arg_parser.add_argument('-conf_path', '--conf_path', type=str)
+  # the arguments of a single, child, run
+  arg_parser.add_argument('-child_mode', '--child_mode', type=str, choices=MODES)
+  arg_parser.add_argument('-audio_file_path', '--audio_file_path', type=str)
+  arg_parser.add_argument('-started_at', '--started_at', type=float)
+
+  return vars(arg_parser.parse_args())
+
+
+def run_child(*, child_mode, conf_path, audio_file_path, started_at):
+  """
+    Run `main.main` once, in this process, and print a json of the
+      seconds from `started_at` to its imports and first processed block
+  """
+
+  import_started_at = time.time()
+  import main as main_module
+  from lib.instrumentation import DETECTOR_FEED, INSTRUMENTATION
+  imported_at = time.time()
+
+  if child_mode == 'eager':
+    import importlib
+    for module_name in ('switchbot_buttons', 'twilio_call'):
+      try:
+        importlib.import_module('lib.{}'.format(module_name)).warm_up()
+      except Exception:
+        pass
+
+  main_module.main(
+    conf_path=conf_path,
+    log_level='ERROR',
+    door_bell_detector='AiPhoneGT1A',
+    audio_file_path=audio_file_path,
+    async_pipeline=child_mode != 'blocking',
+    to_phones=None if child_mode == 'blocking' else ['+15555555555'],
+    # only to enable the instrumentation, which records the first block's time
+    instrumentation_log_seconds=3600,
+  )
+
+  print(json.dumps({
+    'import_seconds': imported_at - import_started_at,
+    'interpreter_seconds': import_started_at - started_at,
+    'first_block_seconds': INSTRUMENTATION.histogram(DETECTOR_FEED).first_recorded_at - started_at,
+  }))
+
+
+def run_mode(mode, *, conf_path, audio_file_path):
+  started_at = time.time()
+  completed_process = subprocess.run(
+    [
+      sys.executable, '-m', 'benchmarks.startup',
+      '--child_mode', mode,
+      '--conf_path', conf_path,
+      '--audio_file_path', audio_file_path,
+      '--started_at', repr(started_at),
+    ],
+    stdout=subprocess.PIPE,
+    stderr=subprocess.PIPE,
+    universal_newlines=True,
+  )
+  assert completed_process.returncode == 0, (
+    "the '{}' run failed with:\n{}".format(mode, completed_process.stderr)
+  )
+
+  return json.loads(completed_process.stdout.strip().splitlines()[-1])
+
+
+def main(*, repeat, modes, conf_path, child_mode, audio_file_path, started_at):
+  if child_mode is not None:
+    run_child(
+      child_mode=child_mode,
+      conf_path=conf_path,
+      audio_file_path=audio_file_path,
+      started_at=started_at,
+    )
+    return
+
+  from benchmarks.synthetic import synthesize
+  from lib.clips import write_wav
+
+  with tempfile.TemporaryDirectory() as dir_path:
+    if conf_path is None:
+      conf_path = os.path.join(dir_path, 'conf.json')
+      with open(conf_path, 'w') as conf_file:
+        json.dump({}, conf_file)
+
+    # ring-free, so that no call is placed
+    recording = synthesize(num_ring_cycles=0, lead_seconds=1, tail_seconds=1)
+    audio_file_path = os.path.join(dir_path, 'silence.wav')
+    write_wav(audio_file_path, recording.samples, sample_rate=recording.sample_rate)
+
+    for mode in modes:
+      runs = [
+        run_mode(mode, conf_path=conf_path, audio_file_path=audio_file_path)
+        for _ in range(repeat)
+      ]
+      print(
+        '{:>8}: first block after {:.3f}s (median of {}), of which {:.3f}s is importing main'
+        ''.format(
+          mode,
+          statistics.median(run['first_block_seconds'] for run in runs),
+          repeat,
+          statistics.median(run['import_seconds'] for run in runs),
+        ),
+        flush=True,
+      )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,316 @@
+"""
+  A deterministic generator of Aiphone GT-1A style ring cycles,
+    i.e. <ringing> <gap> <ringing>, mixed with background noise
+
+  The audio can be written to a WAV file or streamed, without touching
+    the disk, through `SyntheticStream`
+
+  Usage:
+    python -m benchmarks.synthetic --wav_path ring.wav --num_ring_cycles 2
+    python -m benchmarks.synthetic --wav_path recordings/ring.wav --write_labels
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+
+import numpy as np
+
+from lib.audio import Stream
+from lib.clips import write_wav
+
+
+class RingPattern:
+  """
+    The shape of the synthesized ringing
+
+    The GT-1A ring is a tone that is switched on and off many times a second,
+      so the tone is gated by a square wave of `warble_hz`
+  """
+
+  def __init__(
+    self,
+    *,
+    pitch_hz=1000.0,
+    warble_hz=16.0,
+    ringing_seconds=2.0,
+    gap_seconds=2.0,
+    amplitude=0.3,
+  ):
+    self.pitch_hz = pitch_hz
+    self.warble_hz = warble_hz
+    self.ringing_seconds = ringing_seconds
+    self.gap_seconds = gap_seconds
+    self.amplitude = amplitude
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tpitch_hz={},\n'
+        '\twarble_hz={},\n'
+        '\tringing_seconds={},\n'
+        '\tgap_seconds={},\n'
+        '\tamplitude={}\n'
+      ')'
+      ''.format(
+        RingPattern.__name__,
+        self.pitch_hz,
+        self.warble_hz,
+        self.ringing_seconds,
+        self.gap_seconds,
+        self.amplitude,
+      )
+    )
+
+  def ringing(self, *, sample_rate):
+    t = np.arange(int(self.ringing_seconds * sample_rate)) / sample_rate
+    tone = self.amplitude * np.sin(2 * np.pi * self.pitch_hz * t)
+    gate = np.sin(2 * np.pi * self.warble_hz * t) >= 0
+    return tone * gate
+
+  @property
+  def rms(self):
+    """
+      :return: the RMS of the ringing, i.e. a half-gated sine
+    """
+    return self.amplitude / 2
+
+
+class SyntheticRecording:
+  """
+    A synthesized recording along with the ground truth of its ring cycles
+  """
+
+  def __init__(self, *, samples, sample_rate, ring_cycle_onsets_seconds, ring_cycle_seconds):
+    """
+      :param samples: a float32 array of mono audio
+
+      :param ring_cycle_onsets_seconds: the time of the start
+         of the first ring of each ring cycle
+
+      :param ring_cycle_seconds: the duration of every ring cycle,
+         from the start of its first ring to the end of its second ring
+    """
+
+    self.samples = samples
+    self.sample_rate = sample_rate
+    self.ring_cycle_onsets_seconds = ring_cycle_onsets_seconds
+    self.ring_cycle_seconds = ring_cycle_seconds
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tnum_seconds={:.3f},\n'
+        '\tsample_rate={},\n'
+        '\tring_cycle_onsets_seconds={},\n'
+        '\tring_cycle_seconds={}\n'
+      ')'
+      ''.format(
+        SyntheticRecording.__name__,
+        self.num_seconds,
+        self.sample_rate,
+        self.ring_cycle_onsets_seconds,
+        self.ring_cycle_seconds,
+      )
+    )
+
+  @property
+  def num_seconds(self):
+    return len(self.samples) / self.sample_rate
+
+  @property
+  def ring_cycles(self):
+    """
+      :return: the (start, end) seconds of each ring cycle, as labelled for `lib.calibration`
+    """
+
+    return [
+      (onset, onset + self.ring_cycle_seconds)
+      for onset in self.ring_cycle_onsets_seconds
+    ]
+
+
+def synthesize(
+  *,
+  ring_pattern=None,
+  num_ring_cycles=1,
+  lead_seconds=5.0,
+  between_cycles_seconds=8.0,
+  tail_seconds=5.0,
+  snr_db=3.5,
+  hum_hz=60.0,
+  hum_amplitude=0.01,
+  sample_rate=44100,
+  seed=0,
+):
+  """
+    Synthesize `num_ring_cycles` ring cycles over constant background noise
+
+    :param ring_pattern: the `RingPattern` of the ringing, or None for the default
+
+    :param snr_db: the ratio of the ringing's RMS to the RMS of the
+       white background noise, in decibels
+
+    :param hum_hz: the frequency of a mains hum added to the background
+    :param hum_amplitude: the amplitude of the hum, or 0 for no hum
+
+    :param seed: the seed of the noise, so that the output is deterministic
+
+    :return: a `SyntheticRecording`
+  """
+
+  ring_pattern = RingPattern() if ring_pattern is None else ring_pattern
+  rng = np.random.default_rng(seed)
+
+  def silence(seconds):
+    return np.zeros(int(seconds * sample_rate))
+
+  ringing = ring_pattern.ringing(sample_rate=sample_rate)
+  gap = silence(ring_pattern.gap_seconds)
+
+  segments = [silence(lead_seconds)]
+  ring_cycle_onsets_seconds = []
+  num_samples = len(segments[0])
+  for i in range(num_ring_cycles):
+    if i:
+      segments.append(silence(between_cycles_seconds))
+      num_samples += len(segments[-1])
+
+    ring_cycle_onsets_seconds.append(num_samples / sample_rate)
+    segments.extend((ringing, gap, ringing))
+    num_samples += 2 * len(ringing) + len(gap)
+
+  segments.append(silence(tail_seconds))
+  samples = np.concatenate(segments)
+
+  noise_rms = ring_pattern.rms / 10 ** (snr_db / 20)
+  samples += noise_rms * rng.standard_normal(len(samples))
+  if hum_amplitude:
+    t = np.arange(len(samples)) / sample_rate
+    samples += hum_amplitude * np.sin(2 * np.pi * hum_hz * t)
+
+  return SyntheticRecording(
+    samples=np.clip(samples, -1, 1).astype(np.float32),
+    sample_rate=sample_rate,
+    ring_cycle_onsets_seconds=ring_cycle_onsets_seconds,
+    ring_cycle_seconds=(2 * len(ringing) + len(gap)) / sample_rate,
+  )
+
+
+def default_corpus(*, sample_rate=44100):
+  """
+    :return: a dict of name -> `SyntheticRecording` covering clean,
+      noisy, differently pitched and ring-free recordings
+  """
+
+  return {
+    'clean': synthesize(snr_db=6, sample_rate=sample_rate, seed=1),
+    'typical': synthesize(num_ring_cycles=2, sample_rate=sample_rate, seed=2),
+    'noisy': synthesize(snr_db=1.5, sample_rate=sample_rate, seed=3),
+    'low_pitch': synthesize(
+      ring_pattern=RingPattern(pitch_hz=600),
+      sample_rate=sample_rate,
+      seed=4,
+    ),
+    'no_ring': synthesize(num_ring_cycles=0, lead_seconds=20, sample_rate=sample_rate, seed=5),
+  }
+
+
+class SyntheticStream(Stream):
+  """
+    A stand-in for `File` that streams an in-memory array of samples
+
+    Blocks are laid out like `File`'s: the last block is zero padded and,
+      if the array length is a multiple of the block size, an all-zero
+      block follows
+  """
+
+  def __init__(self, *args, samples, **kwargs):
+    super().__init__(*args, **kwargs)
+
+    num_blocks = len(samples) // self.block_size + 1
+    self._blocks = np.zeros((num_blocks, self.block_size), dtype=np.float32)
+    self._blocks.reshape(-1)[:len(samples)] = samples
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\t{}\n'
+      ')._num_blocks={}'
+      ''.format(
+        SyntheticStream.__name__,
+        super().__repr__().replace('\n', '\n\t'),
+        len(self._blocks),
+      )
+    )
+
+  def _open(self):
+    self._stream = iter(self._blocks)
+
+  def _close(self):
+    self._stream = None
+
+  def _read(self):
+    return next(self._stream)
+
+  def _is_depleted(self):
+    return self._num_blocks_read >= len(self._blocks)
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-wav_path', '--wav_path', type=str, required=True)
+  arg_parser.add_argument('-num_ring_cycles', '--num_ring_cycles', type=int, default=1)
+  arg_parser.add_argument('-pitch_hz', '--pitch_hz', type=float, default=1000.0)
+  arg_parser.add_argument('-ringing_seconds', '--ringing_seconds', type=float, default=2.0)
+  arg_parser.add_argument('-gap_seconds', '--gap_seconds', type=float, default=2.0)
+  arg_parser.add_argument('-snr_db', '--snr_db', type=float, default=3.5)
+  arg_parser.add_argument('-sample_rate', '--sample_rate', type=int, default=44100)
+  arg_parser.add_argument('-seed', '--seed', type=int, default=0)
+  arg_parser.add_argument('-write_labels', '--write_labels', action='store_true')
+
+  return vars(arg_parser.parse_args())
+
+
+def main(
+  *,
+  wav_path,
+  num_ring_cycles,
+  pitch_hz,
+  ringing_seconds,
+  gap_seconds,
+  snr_db,
+  sample_rate,
+  seed,
+  write_labels=False,
+):
+  recording = synthesize(
+    ring_pattern=RingPattern(
+      pitch_hz=pitch_hz,
+      ringing_seconds=ringing_seconds,
+      gap_seconds=gap_seconds,
+    ),
+    num_ring_cycles=num_ring_cycles,
+    snr_db=snr_db,
+    sample_rate=sample_rate,
+    seed=seed,
+  )
+  write_wav(wav_path, recording.samples, sample_rate=sample_rate)
+  print(recording)
+
+  if write_labels:
+    # the labels of `lib.calibration`
+    with open('{}.json'.format(os.path.splitext(wav_path)[0]), 'w') as json_file:
+      json.dump(
+        {
+          'ring_cycles': [list(ring_cycle) for ring_cycle in recording.ring_cycles],
+        },
+        json_file,
+        indent=2,
+      )
+      json_file.write('\n')
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
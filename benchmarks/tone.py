@@ -0,0 +1,162 @@
+"""
+  Compares `AiPhoneGT1ATone`, which detects the ring by its tone's energy,
+    against `AiPhoneGT1A`, which detects it by YIN's pitch confidence, over
+    the synthetic corpus: the cost per block, the CPU and the scores
+
+  A doorbell's tone is learned once, from a sample recording of it, so every
+    recording's tone frequencies are learned from a separate recording, of
+    a different seed, of the same ring pattern
+
+  Usage:
+    python -m benchmarks.tone
+    python -m benchmarks.tone --min_ringing_confidences 0.1 0.15 0.2
+"""
+
+from argparse import ArgumentParser
+import logging
+import statistics
+
+from benchmarks import common
+from benchmarks.synthetic import default_corpus, RingPattern, synthesize, SyntheticStream
+from lib.door_bell_detectors import AiPhoneGT1A, AiPhoneGT1ATone
+from lib.tone_energy import learn_tone_frequencies
+
+# the ring pattern of each recording of `default_corpus`
+RING_PATTERNS = {
+  'low_pitch': RingPattern(pitch_hz=600),
+}
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-models', '--models', type=str, nargs='+', default=['yin', 'yinfast'])
+  arg_parser.add_argument(
+    '-min_ringing_confidences', '--min_ringing_confidences',
+    type=float,
+    nargs='+',
+    default=[0.15],
+  )
+  arg_parser.add_argument('-block_size', '--block_size', type=int, default=512)
+
+  return vars(arg_parser.parse_args())
+
+
+def learned_tone_frequencies(corpus):
+  """
+    :return: a dict of recording name -> the tone frequencies learned
+      from a sample recording of its ring pattern
+  """
+
+  tone_frequencies = {}
+  for name, recording in corpus.items():
+    sample = synthesize(
+      ring_pattern=RING_PATTERNS.get(name),
+      sample_rate=recording.sample_rate,
+      seed=100,
+    )
+    tone_frequencies[name] = learn_tone_frequencies(sample.samples, sample_rate=sample.sample_rate)
+
+  return tone_frequencies
+
+
+def run_corpus(corpus, new_detector):
+  """
+    :param new_detector: a function of (recording name, audio stream) -> detector
+
+    :return: (seconds per block, cpu_seconds_per_audio_second, the scores
+      summed over the corpus, the mean detection latency)
+  """
+
+  cpu_seconds = 0
+  audio_seconds = 0
+  num_blocks = 0
+  latencies = []
+  scores = {'num_true_positives': 0, 'num_false_positives': 0, 'num_missed': 0}
+
+  for name, recording in corpus.items():
+    detector = new_detector(name, recording)
+
+    detector_run = common.run_detector(detector)
+    cpu_seconds += detector_run.cpu_seconds
+    audio_seconds += detector_run.audio_seconds
+    num_blocks += detector_run.num_blocks
+
+    recording_scores = common.score_detections(
+      detector_run.ring_cycle_seconds,
+      ring_cycles=recording.ring_cycles,
+      slack_seconds=common.SLACK_SECONDS,
+    )
+    latencies.extend(recording_scores['latencies'])
+    for key in scores:
+      scores[key] += recording_scores[key]
+
+  return (
+    cpu_seconds / num_blocks,
+    cpu_seconds / audio_seconds,
+    scores,
+    statistics.mean(latencies) if latencies else None,
+  )
+
+
+def report(name, seconds_per_block, cpu, scores, latency, *, yin_seconds_per_block):
+  print(
+    '{}: {:.1f}us per block ({:.1f}x cheaper than yin), {:.3%} of one core, '
+    'mean latency {}, {}'
+    ''.format(
+      name,
+      seconds_per_block * 1e6,
+      yin_seconds_per_block / seconds_per_block,
+      cpu,
+      'n/a' if latency is None else '{:.3f}s'.format(latency),
+      scores,
+    ),
+    flush=True,
+  )
+
+
+def main(*, models, min_ringing_confidences, block_size):
+  logging.basicConfig(level=logging.WARNING)
+
+  corpus = default_corpus()
+  tone_frequencies = learned_tone_frequencies(corpus)
+  print('learned tone frequencies: {}'.format(tone_frequencies))
+
+  def new_stream(recording):
+    return SyntheticStream(
+      samples=recording.samples,
+      sample_rate=recording.sample_rate,
+      block_size=block_size,
+    )
+
+  yin_seconds_per_block = None
+  for model in models:
+    results = run_corpus(
+      corpus,
+      lambda name, recording: AiPhoneGT1A(
+        audio_stream=new_stream(recording),
+        pitch_kwargs={'model': model},
+      ),
+    )
+    if yin_seconds_per_block is None:
+      yin_seconds_per_block = results[0]
+    report(model, *results, yin_seconds_per_block=yin_seconds_per_block)
+
+  for min_ringing_confidence in min_ringing_confidences:
+    results = run_corpus(
+      corpus,
+      lambda name, recording: AiPhoneGT1ATone(
+        audio_stream=new_stream(recording),
+        tone_frequencies=tone_frequencies[name],
+        min_ringing_confidence=min_ringing_confidence,
+      ),
+    )
+    report(
+      'tone, min_ringing_confidence={}'.format(min_ringing_confidence),
+      *results,
+      yin_seconds_per_block=yin_seconds_per_block,
+    )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,214 @@
+"""
+  Measures a `TraceCache` over the synthetic corpus, written to wav files:
+
+    cold: batch detection that computes, and caches, every trace
+    warm: batch detection that loads every trace from the cache
+    replay: streaming detection of a `TraceStream` of every cached trace
+
+  and checks that every run detects the same ring cycles as uncached
+    batch detection
+
+  Usage:
+    python -m benchmarks.trace_cache
+    python -m benchmarks.trace_cache --model yin --energy_gate
+"""
+
+from argparse import ArgumentParser
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import default_corpus
+from lib import batch_detection
+from lib.audio import File, Stream
+from lib.clips import write_wav
+from lib.door_bell_detectors import AiPhoneGT1A, DetectorEvent
+from lib.trace_cache import TraceCache
+from lib.utils import AssertContextFunc
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-model', '--model', type=str, default='yinfast')
+  arg_parser.add_argument('-energy_gate', '--energy_gate', action='store_true')
+
+  return vars(arg_parser.parse_args())
+
+
+class TraceStream(Stream):
+  """
+    A stand-in for an `audio.File`, of a cached trace, whose blocks are
+      the indices of the trace, rather than audio
+
+    A `TraceDetector` of a `TraceStream` uses a `TracePitch` of it, so `data`
+      is only meaningful to a `TracePitch`; e.g. an `EnergyGate` or a
+      `ClipRecorder`, which need the audio, can't be used
+  """
+
+  def __init__(self, *args, pitches=None, confidences, **kwargs):
+    """
+      :param args:   The args   to pass to Stream()
+      :param kwargs: The kwargs to pass to Stream()
+
+      :param pitches: the pitch of every block, or None
+      :param confidences: the confidence of every block, e.g. from `TraceCache.trace`
+    """
+
+    super().__init__(*args, **kwargs)
+    self.pitches = pitches
+    self.confidences = confidences
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\t{}\n'
+      ')._num_blocks={}'
+      ''.format(
+        TraceStream.__name__,
+        super().__repr__().replace('\n', '\n\t'),
+        len(self.confidences),
+      )
+    )
+
+  def _open(self):
+    self._stream = iter(range(len(self.confidences)))
+
+  def _close(self):
+    self._stream = None
+
+  def _read(self):
+    return next(self._stream)
+
+  def _is_depleted(self):
+    return self._num_blocks_read >= len(self.confidences)
+
+
+class TracePitch:
+  """
+    A stand-in for an `audio.Pitch`, whose confidence is
+      that of the latest block of a `TraceStream`
+  """
+
+  def __init__(self, audio_stream):
+    self.audio_stream = audio_stream
+    self._is_open = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\taudio_stream={}\n'
+      ')'
+      ''.format(
+        TracePitch.__name__,
+        str(self.audio_stream).replace('\n', '\n\t'),
+      )
+    )
+
+  @property
+  def confidences_per_second(self):
+    return self.audio_stream.sample_rate / self.audio_stream.block_size
+
+  @AssertContextFunc(does_set=True, attribute='_is_open')
+  def open(self):
+    self._is_open = True
+
+  def __enter__(self):
+    self.open()
+    return self
+
+  @AssertContextFunc(sets_to_none=True, attribute='_is_open')
+  def close(self):
+    self._is_open = None
+
+  def __exit__(self, *args, **kwargs):
+    self.close()
+
+  def process_data(self):
+    pitches = self.audio_stream.pitches
+    return None if pitches is None else pitches[self.audio_stream.data]
+
+  @property
+  def confidence(self):
+    return float(self.audio_stream.confidences[self.audio_stream.data])
+
+
+class TraceDetector(AiPhoneGT1A):
+  """
+    An `AiPhoneGT1A` of a `TraceStream`, whose trace was computed
+      with the pitch, and any gate, already
+  """
+
+  def _new_audio_pitch(self, pitch_kwargs):
+    return TracePitch(self.audio_stream)
+
+
+def new_detector(audio_stream, *, model, energy_gate):
+  return AiPhoneGT1A(
+    audio_stream=audio_stream,
+    pitch_kwargs={'model': model},
+    energy_gate_kwargs={} if energy_gate else None,
+  )
+
+
+def replay_ring_cycles(trace_stream):
+  """
+    :return: the stream times, in seconds, at which the streaming
+      detector of `trace_stream` detects each ring cycle
+  """
+
+  detector = TraceDetector(audio_stream=trace_stream)
+  detection_seconds = []
+  with trace_stream, detector.audio_pitch:
+    for _ in trace_stream.iter_read():
+      detector.audio_pitch.process_data()
+      event = detector.feed_one(detector.audio_pitch.confidence)
+      if event is not None and event.kind == DetectorEvent.RING_CYCLE:
+        detection_seconds.append(trace_stream.num_seconds_read)
+
+  return detection_seconds
+
+
+def main(*, model, energy_gate):
+  logging.disable(logging.INFO)
+
+  with tempfile.TemporaryDirectory() as dir_path:
+    file_paths = []
+    for name, recording in default_corpus().items():
+      file_path = os.path.join(dir_path, '{}.wav'.format(name))
+      write_wav(file_path, recording.samples, sample_rate=recording.sample_rate)
+      file_paths.append(file_path)
+
+    expected = {
+      file_path: batch_detection.detect_ring_cycles(
+        new_detector(File(file_path=file_path), model=model, energy_gate=energy_gate),
+      )
+      for file_path in file_paths
+    }
+
+    trace_cache = TraceCache(os.path.join(dir_path, 'traces'))
+    for run in ('cold', 'warm'):
+      started_at = time.perf_counter()
+      for file_path in file_paths:
+        detections = batch_detection.detect_ring_cycles(
+          new_detector(File(file_path=file_path), model=model, energy_gate=energy_gate),
+          trace_cache=trace_cache,
+        )
+        assert detections == expected[file_path], '{} detections of {} differ'.format(run, file_path)
+      print('{}: {:.3f}s for {} recordings'.format(run, time.perf_counter() - started_at, len(file_paths)))
+
+    started_at = time.perf_counter()
+    for file_path in file_paths:
+      detector = new_detector(File(file_path=file_path), model=model, energy_gate=energy_gate)
+      pitches, confidences = trace_cache.trace(detector.audio_stream, detector.audio_pitch)
+      trace_stream = TraceStream(pitches=pitches, confidences=confidences)
+      detections = replay_ring_cycles(trace_stream)
+      assert detections == expected[file_path], 'replayed detections of {} differ'.format(file_path)
+    print('replay: {:.3f}s for {} recordings'.format(time.perf_counter() - started_at, len(file_paths)))
+
+    print(trace_cache)
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
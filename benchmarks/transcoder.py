@@ -0,0 +1,79 @@
+"""
+  Measures the CPU cost of a duplex call's transcoding:
+    outbound: 44.1kHz float32 microphone blocks -> 20ms 8kHz mu-law payloads
+    inbound:  20ms 8kHz mu-law payloads -> 44.1kHz float32
+
+  Usage:
+    python -m benchmarks.transcoder --call_seconds 60
+"""
+
+from argparse import ArgumentParser
+import time
+
+import numpy as np
+
+from lib.transcoder import MULAW_SAMPLE_RATE, MulawDecoder, MulawEncoder
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-call_seconds', '--call_seconds', type=float, default=60)
+  arg_parser.add_argument('-sample_rate', '--sample_rate', type=int, default=44100)
+  arg_parser.add_argument('-block_size', '--block_size', type=int, default=512)
+
+  return vars(arg_parser.parse_args())
+
+
+def main(*, call_seconds, sample_rate, block_size):
+  rng = np.random.default_rng(0)
+
+  num_blocks = int(call_seconds * sample_rate / block_size)
+  microphone_blocks = (0.1 * rng.standard_normal((num_blocks, block_size))).astype(np.float32)
+
+  # the inbound payloads are the outbound ones of a separate encoder,
+  #   so that the encoding isn't included in the inbound timing
+  payloads = []
+  payload_encoder = MulawEncoder(sample_rate=sample_rate)
+  for block in microphone_blocks:
+    payloads.extend(payload_encoder.encode(block))
+
+  encoder = MulawEncoder(sample_rate=sample_rate)
+  cpu_start = time.process_time()
+  num_payloads_encoded = 0
+  for block in microphone_blocks:
+    num_payloads_encoded += len(encoder.encode(block))
+  outbound_cpu_seconds = time.process_time() - cpu_start
+
+  decoder = MulawDecoder(sample_rate=sample_rate)
+  cpu_start = time.process_time()
+  num_samples_decoded = 0
+  for payload in payloads:
+    num_samples_decoded += len(decoder.decode(payload))
+  inbound_cpu_seconds = time.process_time() - cpu_start
+
+  audio_seconds = num_blocks * block_size / sample_rate
+  for direction, cpu_seconds in (
+    ('outbound', outbound_cpu_seconds),
+    ('inbound', inbound_cpu_seconds),
+    ('duplex', outbound_cpu_seconds + inbound_cpu_seconds),
+  ):
+    print(
+      '{:>8}: {:.3f} CPU-seconds for {:.1f}s of call, i.e. {:.3%} of one core'
+      ''.format(direction, cpu_seconds, audio_seconds, cpu_seconds / audio_seconds)
+    )
+
+  print(
+    'encoded {} payloads ({:.1f}s at {}Hz) and decoded {:.1f}s at {}Hz'
+    ''.format(
+      num_payloads_encoded,
+      num_payloads_encoded * 0.02,
+      MULAW_SAMPLE_RATE,
+      num_samples_decoded / sample_rate,
+      sample_rate,
+    )
+  )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -1,21 +1,33 @@
 from abc import ABC, abstractmethod
-from contextlib import contextmanager
+import asyncio
 import logging
-from pathlib import Path
-import os
-import runpy
-import sys
-import warnings
+import threading
+import time
 
 import aubio
+import numpy as np
 import sounddevice
 
+from lib.instrumentation import (
+  INSTRUMENTATION,
+  PITCH_CONFIDENCE,
+  PITCH_PROCESS_DATA,
+  STREAM_LAG,
+  STREAM_READ,
+)
+from lib.resample import BlockResampler
+from lib.ring_buffer import RingBuffer
 from lib.utils import AssertContextFunc
 
 
 class Stream(ABC):
   """
     An abstract class that streams blocks of audio data
+
+    A stream reads into a pool of `num_buffers` preallocated blocks, which it
+      reuses round robin, rather than allocating a block per `read()`; so a
+      block returned by `read()` is only valid for the next `num_buffers - 1`
+      reads, and must be consumed, or copied, before then
   """
   
   def __init__(
@@ -24,14 +36,29 @@ class Stream(ABC):
     sample_rate=44100,
     block_size=512,
     num_channels=1,
+    num_buffers=1,
+    dtype='float32',
   ):
+    """
+      :param num_buffers: the number of blocks in the stream's buffer pool
+      :param dtype: the dtype of the frames in the buffer pool
+    """
+
     self.sample_rate = sample_rate
     self.block_size = block_size
     self.num_channels = num_channels
+    self.num_buffers = num_buffers
+    self.dtype = dtype
     
     self._stream = None
     self._data = None
     self._num_blocks_read = 0
+    self._opened_at = None
+
+    self._buffers = None
+    self._next_buffer_index = 0
+    self._are_blocks_frames = None
+    self._allocate_buffers()
   
   def __repr__(self):
     return (
@@ -87,6 +114,56 @@ class Stream(ABC):
     """
     pass
 
+  def _allocate_buffers(self):
+    """
+      Preallocate the buffer pool: `num_buffers` pairs of a (block_size, num_channels)
+        array of frames, e.g. for an input device to read into, and the contiguous
+        1-D mono block that `read()` returns, which is a view of the frames
+        if there is only 1 channel, and their downmix otherwise
+
+      :return: None
+    """
+
+    frames = np.zeros((self.num_buffers, self.block_size, self.num_channels), dtype=self.dtype)
+    self._are_blocks_frames = self.num_channels == 1 and frames.dtype == np.float32
+    if self._are_blocks_frames:
+      blocks = frames.reshape(self.num_buffers, self.block_size)
+    else:
+      blocks = np.zeros((self.num_buffers, self.block_size), dtype=np.float32)
+
+    # the views are made once, since even making a view allocates
+    self._buffers = [(frames[i], blocks[i]) for i in range(self.num_buffers)]
+    self._next_buffer_index = 0
+
+  def _next_buffer(self):
+    """
+      :return: the (frames, block) of the least recently used buffer of the pool
+    """
+
+    index = self._next_buffer_index
+    self._next_buffer_index = index + 1 if index + 1 < self.num_buffers else 0
+    return self._buffers[index]
+
+  def _to_mono(self, frames, block):
+    """
+      :param frames: frames of the buffer pool, of shape (block_size, num_channels)
+      :param block: the mono block of the same buffer, of shape (block_size,)
+      :return: `block`, holding the mono downmix of `frames`, as aubio expects
+    """
+
+    if self._are_blocks_frames:
+      # the block is a view of the frames themselves
+      return block
+
+    if self.num_channels == 1:
+      np.copyto(block, frames[:, 0])
+      return block
+
+    # summed into the block, and scaled in place, so that no temporary is allocated
+    np.sum(frames, axis=1, dtype=np.float32, out=block)
+    block *= 1 / self.num_channels
+    return block
+
   @property
   def stream(self):
     return self._stream
@@ -114,6 +191,7 @@ class Stream(ABC):
   @AssertContextFunc(does_set=True, attribute='_stream')
   def open(self):
     self._open()
+    self._opened_at = time.monotonic()
 
   @AssertContextFunc(sets_to_none=True, attribute='_stream')
   def close(self):
@@ -125,40 +203,101 @@ class Stream(ABC):
       if self.is_depleted:
         break
       yield self.read()
+
+  async def aiter_read(self, *, executor=None):
+    """
+      The asyncio equivalent of `iter_read`, where each blocking `read()`
+        runs in `executor`, or the event loop's default executor if None,
+        so that the event loop stays free while waiting for audio
+    """
+
+    loop = asyncio.get_running_loop()
+    while True:
+      if self.is_depleted:
+        break
+      yield await loop.run_in_executor(executor, self.read)
   
   def read(self):
+    if INSTRUMENTATION.enabled:
+      return self._instrumented_read()
+
+    self._data = self._read()
+    self._num_blocks_read += 1
+    return self._data
+
+  def _instrumented_read(self):
+    start = time.perf_counter()
     self._data = self._read()
+    INSTRUMENTATION.record(STREAM_READ, time.perf_counter() - start)
+
     self._num_blocks_read += 1
+    INSTRUMENTATION.add_audio_seconds(self.block_size / self.sample_rate)
+
+    # how far the reader is behind the audio, which, for a live stream,
+    #   is how much audio is queued up waiting to be read
+    lag_seconds = time.monotonic() - self._opened_at - self.num_seconds_read
+    INSTRUMENTATION.record(STREAM_LAG, max(lag_seconds, 0.0))
+
     return self._data
   
 
 class Microphone(Stream):
   """
-    A live microphone stream
-    
-    todo: this class could be improved to handle input selection;
-           it currently defaults to the system
+    A live microphone stream, from the system's default input device
+      or from the one selected by `device`
   """
   
-  def __init__(self, *args, dtype='float32', **kwargs):
-    super().__init__(*args, **kwargs)
-    self.dtype = dtype
+  def __init__(self, *args, device=None, dtype='float32', **kwargs):
+    """
+      :param args:   The args   to pass to Stream()
+      :param kwargs: The kwargs to pass to Stream()
+
+      :param device: the input device's index, or a unique substring of
+         its name, as listed by `python -m sounddevice`; or None for the
+         system's default input device
+    """
+
+    super().__init__(*args, dtype=dtype, **kwargs)
+    self.device = parse_device(device)
+    self._num_overflows = 0
+
+    self._read_frames_into = None
 
   def __repr__(self):
     return (
       '{}(\n'
         '\t{},\n'
+        '\tdevice={!r},\n'
         '\tdtype={}\n'
-      ')'
+      ')._num_overflows={}'
       ''.format(
         Microphone.__name__,
-        super().__str__().replace('\n', '\n\t'),
+        super().__repr__().replace('\n', '\n\t'),
+        self.device,
         self.dtype,
+        self._num_overflows,
       )
     )
 
+  @property
+  def device_name(self):
+    """
+      :return: the name of the input device, which raises
+        if `device` doesn't match exactly 1 input device
+    """
+    return sounddevice.query_devices(self.device, kind='input')['name']
+
+  @property
+  def num_overflows(self):
+    """
+      :return: the number of times the device reported that
+        input was dropped because it wasn't read in time
+    """
+    return self._num_overflows
+
   def _open(self):
     stream = sounddevice.InputStream(
+      device=self.device,
       samplerate=self.sample_rate,
       blocksize=self.block_size,
       channels=self.num_channels,
@@ -167,8 +306,11 @@ class Microphone(Stream):
     stream.start()
     
     self._stream = stream
+    self._read_frames_into = _new_frames_reader(stream, self._buffers)
   
   def _close(self):
+    self._read_frames_into = None
+
     if not self._stream.stopped:
       self._stream.stop()
     
@@ -178,32 +320,242 @@ class Microphone(Stream):
     self._stream = None
   
   def _read(self):
-    return self._stream.read(self.block_size)
+    frames, block = self._next_buffer()
+    if self._read_frames_into(frames):
+      self._num_overflows += 1
+      logging.warning('{} overflowed; audio was dropped'.format(Microphone.__name__))
+
+    return self._to_mono(frames, block)
   
   def _is_depleted(self):
     return False
 
 
+class CallbackMicrophone(Microphone):
+  """
+    A live microphone stream that is captured from sounddevice's callback
+      thread into a preallocated `RingBuffer`, which `read()` consumes
+
+    Capture is therefore decoupled from the latency of whatever processes
+      the blocks: a stall in the reader only fills the buffer, and audio
+      is only lost, and counted, once the buffer is full
+
+    Each `read()` copies the frames out of the ring buffer into the next
+      block of the stream's buffer pool, rather than a new array
+  """
+
+  def __init__(self, *args, buffer_seconds=5.0, **kwargs):
+    """
+      :param args:   The args   to pass to Microphone()
+      :param kwargs: The kwargs to pass to Microphone()
+
+      :param buffer_seconds: the number of seconds of audio that the ring
+         buffer holds before captured audio is dropped
+    """
+
+    super().__init__(*args, **kwargs)
+    self.buffer_seconds = buffer_seconds
+
+    self._ring_buffer = self._new_ring_buffer()
+    self._frames_available = threading.Event()
+    self._num_underruns = 0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\t{},\n'
+        '\tbuffer_seconds={}\n'
+      ')._num_underruns={},\n'
+      '._ring_buffer={}'
+      ''.format(
+        CallbackMicrophone.__name__,
+        super().__repr__().replace('\n', '\n\t'),
+        self.buffer_seconds,
+        self._num_underruns,
+        str(self._ring_buffer).replace('\n', '\n\t'),
+      )
+    )
+
+  @property
+  def num_underruns(self):
+    """
+      :return: the number of reads that had to wait for the device
+        because the buffer held less than a block
+    """
+    return self._num_underruns
+
+  @property
+  def num_buffer_overflows(self):
+    """
+      :return: the number of times captured audio was dropped
+        because the reader fell `buffer_seconds` behind
+    """
+    return self._ring_buffer.num_overflows
+
+  @property
+  def buffer_high_water_mark(self):
+    """
+      :return: the most frames that the buffer has held at once
+    """
+    return self._ring_buffer.high_water_mark
+
+  @property
+  def num_frames_buffered(self):
+    return self._ring_buffer.num_available
+
+  def _new_ring_buffer(self):
+    return RingBuffer(
+      capacity=max(int(self.buffer_seconds * self.sample_rate), self.block_size),
+      num_channels=self.num_channels,
+      dtype=self.dtype,
+    )
+
+  def _open(self):
+    self._ring_buffer = self._new_ring_buffer()
+
+    stream = sounddevice.InputStream(
+      device=self.device,
+      samplerate=self.sample_rate,
+      blocksize=self.block_size,
+      channels=self.num_channels,
+      dtype=self.dtype,
+      callback=self._callback,
+    )
+    stream.start()
+
+    self._stream = stream
+
+  def _callback(self, indata, frames, time_info, status):
+    """
+      Runs on sounddevice's audio thread, so it must never block
+    """
+
+    if status.input_overflow:
+      self._num_overflows += 1
+
+    self._ring_buffer.write(indata)
+    self._frames_available.set()
+
+  def _read(self):
+    ring_buffer = self._ring_buffer
+
+    if ring_buffer.num_available < self.block_size:
+      self._num_underruns += 1
+
+      while ring_buffer.num_available < self.block_size:
+        # clear before re-checking, so that a `set()` from the callback
+        #   between the check and the wait isn't lost
+        self._frames_available.clear()
+        if ring_buffer.num_available >= self.block_size:
+          break
+
+        assert self._stream.active, 'the input stream stopped while waiting for audio'
+        self._frames_available.wait(timeout=1)
+
+    frames, block = self._next_buffer()
+    return self._to_mono(ring_buffer.read_into(frames), block)
+
+
+def parse_device(device):
+  """
+    :param device: an input device's index, e.g. from the command line
+       as a string of digits, or a substring of its name, or None
+    :return: `device` as sounddevice expects it: an int index or a name
+  """
+
+  if isinstance(device, str) and device.strip().isdigit():
+    return int(device)
+  return device
+
+
+def _new_frames_reader(input_stream, buffers):
+  """
+    :param input_stream: a started `sounddevice.InputStream`
+    :param buffers: the (frames, block) buffer pool of the `Stream` that reads from it
+
+    :return: a function of (frames) -> whether the input overflowed, which
+      reads `len(frames)` frames, from `input_stream`, into the `frames` of
+      one of `buffers`
+
+    `InputStream.read` allocates a new array per read, so PortAudio reads
+      straight into the frames, via the cffi bindings that sounddevice reads
+      with; if they aren't there, e.g. in another version of sounddevice, or
+      the samples need converting, the array from `read` is copied instead
+  """
+
+  lib = getattr(sounddevice, '_lib', None)
+  ffi = getattr(sounddevice, '_ffi', None)
+  check = getattr(sounddevice, '_check', None)
+  frames_dtype = buffers[0][0].dtype
+
+  if (
+    lib is None or ffi is None or check is None
+    or getattr(input_stream, '_ptr', None) is None
+    or np.dtype(input_stream.dtype) != frames_dtype
+  ):
+    def read_frames_into(frames):
+      data, overflowed = input_stream.read(len(frames))
+      np.copyto(frames, data)
+      return overflowed
+
+    return read_frames_into
+
+  # the cffi pointers are made once, since `from_buffer` allocates
+  pointers = {id(frames): ffi.from_buffer(frames) for frames, _ in buffers}
+  input_overflowed = lib.paInputOverflowed
+
+  def read_frames_into(frames):
+    error = lib.Pa_ReadStream(input_stream._ptr, pointers[id(frames)], len(frames))
+    if error == input_overflowed:
+      return True
+
+    check(error)
+    return False
+
+  return read_frames_into
+
+
 class File(Stream):
   """
     Audio streamed from a file
   """
   
-  def __init__(self, *args, file_path, **kwargs):
+  def __init__(self, *args, file_path, replay_speed=None, **kwargs):
+    """
+      :param args:   The args   to pass to Stream()
+      :param kwargs: The kwargs to pass to Stream()
+
+      :param file_path: the path to the audio file
+
+      :param replay_speed: how fast the file is streamed, relative to real time
+         None: as fast as the file can be decoded
+         1:    in real time, i.e. paced like a live `Microphone`
+         N:    N times faster than real time
+    """
+
     super().__init__(*args, **kwargs)
+
+    assert replay_speed is None or replay_speed > 0, (
+      'replay_speed must be None or positive, but found {}'.format(replay_speed)
+    )
+
     self.file_path = file_path
+    self.replay_speed = replay_speed
     self._last_read_size = None
+    self._replay_started_at = None
 
   def __repr__(self):
     return (
       '{}(\n'
         '\t{},\n'
-        "\tfile_path='{}'\n"
+        "\tfile_path='{}',\n"
+        '\treplay_speed={}\n'
       ')._last_read_size={}'
       ''.format(
         File.__name__,
-        super().__str__().replace('\n', '\n\t'),
+        super().__repr__().replace('\n', '\n\t'),
         self.file_path,
+        self.replay_speed,
         self._last_read_size,
       )
     )
@@ -215,15 +567,40 @@ class File(Stream):
       hop_size=self.block_size,
       channels=self.num_channels,
     )
+    self._replay_started_at = time.monotonic()
   
   def _close(self):
     self._stream.close()
     self._stream = None
+    self._replay_started_at = None
   
   def _read(self):
+    # aubio reads every block into the same `fvec`, which is
+    #   already a pool of 1 buffer, so it's only copied for more
     data, self._last_read_size = self._stream()
+    if self.num_buffers > 1:
+      _, block = self._next_buffer()
+      np.copyto(block, data)
+      data = block
+
+    if self.replay_speed is not None:
+      self._wait_for_replay_clock()
+
     return data
 
+  def _wait_for_replay_clock(self):
+    """
+      Sleep until the wall clock catches up with the end of the block
+        that is being read, in the same way that a live stream only
+        returns a block once all of its samples have been captured
+    """
+
+    num_seconds_read = self.block_size * (self._num_blocks_read + 1) / self.sample_rate
+    replay_at = self._replay_started_at + num_seconds_read / self.replay_speed
+    wait_seconds = replay_at - time.monotonic()
+    if wait_seconds > 0:
+      time.sleep(wait_seconds)
+
   def _is_depleted(self):
     return (
       self._last_read_size is not None
@@ -239,14 +616,36 @@ class Pitch:
     model='yin',
     tolerance=0.8,
     block_size_multiple=8,
+    decimated_sample_rate=None,
   ):
+    """
+      :param audio_stream: the `Stream` whose blocks are processed
+
+      :param model: the aubio pitch detection method
+      :param tolerance: the aubio pitch detection tolerance
+
+      :param block_size_multiple: the number of hops in the buffer
+         that each pitch is detected over
+
+      :param decimated_sample_rate: if set, e.g. to 8000 or 11025, then
+         each block is decimated to about this sample rate, by a polyphase
+         `BlockResampler`, before its pitch is detected; a doorbell's tone
+         sits well below 4kHz, and YIN's cost grows with the square of
+         its buffer size, so this cuts its cost by an order of magnitude
+    """
+
     self.audio_stream = audio_stream
     self.model = model
     self.tolerance = tolerance
     self.block_size_multiple = block_size_multiple
+    self.decimated_sample_rate = decimated_sample_rate
+
+    self._resampler = None if decimated_sample_rate is None else self.new_resampler()
 
     self._aubio_pitch = None
-    self._cached_confidence = {}
+    # the confidence of the stream's latest block, and the number of blocks read when it was got
+    self._cached_confidence = None
+    self._cached_confidence_num_blocks_read = None
 
   def __repr__(self):
     return (
@@ -254,7 +653,8 @@ class Pitch:
         '\taudio_stream={},\n'
         "\tmodel='{}',\n"
         '\ttolerance={},\n'
-        '\tblock_size_multiple={}\n'
+        '\tblock_size_multiple={},\n'
+        '\tdecimated_sample_rate={}\n'
       ')._aubio_pitch={},\n'
       '._cached_confidence={}'
       ''.format(
@@ -263,20 +663,80 @@ class Pitch:
         self.model,
         self.tolerance,
         self.block_size_multiple,
+        self.decimated_sample_rate,
         type(self._aubio_pitch),
         self._cached_confidence,
       )
     )
 
+  @property
+  def hop_size(self):
+    """
+      :return: the number of samples of each block that aubio processes,
+        i.e. the block size after any decimation
+    """
+
+    if self.decimated_sample_rate is None:
+      return self.audio_stream.block_size
+
+    # a whole number of samples per block, so the effective rate is only about `decimated_sample_rate`
+    return int(round(
+      self.audio_stream.block_size * self.decimated_sample_rate / self.audio_stream.sample_rate
+    ))
+
+  @property
+  def sample_rate(self):
+    """
+      :return: the effective sample rate of the samples that aubio processes
+    """
+    return self.audio_stream.sample_rate * self.hop_size / self.audio_stream.block_size
+
+  @property
+  def buf_size(self):
+    buf_size = self.hop_size * self.block_size_multiple
+    if self.decimated_sample_rate is None:
+      return buf_size
+
+    # aubio's FFT based models, e.g. 'yinfast', require a power of 2; it's
+    #   also used by 'yin', so that the two models' confidences match
+    return 1 << (buf_size - 1).bit_length()
+
+  @property
+  def confidences_per_second(self):
+    return self.sample_rate / self.hop_size
+
+  def new_resampler(self):
+    """
+      :return: a new `BlockResampler` that decimates the stream's
+        blocks to `hop_size` samples
+    """
+
+    return BlockResampler(
+      in_block_size=self.audio_stream.block_size,
+      out_block_size=self.hop_size,
+    )
+
+  def new_aubio_pitch(self, *, model=None):
+    """
+      :param model: the model to use instead of `self.model`, if any
+      :return: a new `aubio.pitch` with this pitch's settings
+    """
+
+    aubio_pitch = aubio.pitch(
+      method=self.model if model is None else model,
+      buf_size=self.buf_size,
+      hop_size=self.hop_size,
+      samplerate=int(round(self.sample_rate)),
+    )
+    aubio_pitch.set_tolerance(self.tolerance)
+    return aubio_pitch
+
   @AssertContextFunc(does_set=True, attribute='_aubio_pitch')
   def open(self):
-    self._aubio_pitch = aubio.pitch(
-      method=self.model,
-      buf_size=self.audio_stream.block_size * self.block_size_multiple,
-      hop_size=self.audio_stream.block_size,
-      samplerate=self.audio_stream.sample_rate
-    )
-    self._aubio_pitch.set_tolerance(self.tolerance)
+    if self._resampler is not None:
+      self._resampler.reset()
+    self._aubio_pitch = self.new_aubio_pitch()
+    self._cached_confidence_num_blocks_read = None
   
   def __enter__(self):
     self.open()
@@ -290,72 +750,83 @@ class Pitch:
     self.close()
   
   def process_data(self):
-    return self._aubio_pitch(self.audio_stream.data)
+    return self.process_block(self.audio_stream.data)
+
+  def process_block(self, data):
+    """
+      Detect the pitch of `data`, a block that needn't be the stream's
+        latest, e.g. one replayed by an `EnergyGate`
+
+      :return: the pitch of `data`
+    """
+
+    if INSTRUMENTATION.enabled:
+      start = time.perf_counter()
+      pitch = self._aubio_pitch(self._data(data))
+      INSTRUMENTATION.record(PITCH_PROCESS_DATA, time.perf_counter() - start)
+      return pitch
+
+    return self._aubio_pitch(self._data(data))
+
+  def process_many(self, blocks, *, pitches=None, confidences=None):
+    """
+      Detect the pitch, and confidence, of each of `blocks`, as successive
+        calls of `process_block` would, carrying on from the blocks that
+        were processed before, so that a recording can be processed a
+        chunk of blocks at a time
+
+      :param blocks: a (num_blocks, block_size) array of consecutive blocks
+      :param pitches: an optional array, of at least num_blocks, to write the pitches to
+      :param confidences: an optional array, of at least num_blocks, to write the confidences to
+
+      :return: (the pitch of each block, the confidence of each block)
+    """
+
+    # aubio only takes contiguous float32 rows, so any conversion is done once, for every block
+    blocks = np.ascontiguousarray(blocks, dtype=np.float32)
+    num_blocks = len(blocks)
+
+    pitches = np.empty(num_blocks, dtype=np.float64) if pitches is None else pitches[:num_blocks]
+    confidences = np.empty(num_blocks, dtype=np.float64) if confidences is None else confidences[:num_blocks]
+
+    aubio_pitch = self._aubio_pitch
+    get_confidence = aubio_pitch.get_confidence
+
+    if self._resampler is None:
+      for i, block in enumerate(blocks):
+        pitches[i] = aubio_pitch(block)[0]
+        confidences[i] = get_confidence()
+    else:
+      resample = self._resampler.process
+      resampled = np.empty(self.hop_size, dtype=np.float32)
+      for i, block in enumerate(blocks):
+        pitches[i] = aubio_pitch(resample(block, out=resampled))[0]
+        confidences[i] = get_confidence()
+
+    # the cached confidence is no longer that of the latest block processed
+    self._cached_confidence_num_blocks_read = None
+
+    return pitches, confidences
+
+  def _data(self, data):
+    if self._resampler is None:
+      return data
+    return self._resampler.process(data)
   
   @property
   def confidence(self):
-    cached_confidence = self._cached_confidence.get(self.audio_stream.num_blocks_read)
-    if cached_confidence is None:
-      cached_confidence = self._aubio_pitch.get_confidence()
-      self._cached_confidence = {
-        self.audio_stream.num_blocks_read: cached_confidence
-      }
-    
-    return cached_confidence
+    if INSTRUMENTATION.enabled:
+      start = time.perf_counter()
+      confidence = self._confidence()
+      INSTRUMENTATION.record(PITCH_CONFIDENCE, time.perf_counter() - start)
+      return confidence
 
+    return self._confidence()
 
-@contextmanager
-def _aubio_demos_in_path():
-  aubio_demos_path = os.path.join(
-    Path().absolute(),
-    'submodules/aubio/python/demos'
-  )
-  
-  needs_update = aubio_demos_path not in sys.path
-  
-  if needs_update:
-    assert os.path.isdir(aubio_demos_path), (
-      "There is no directory at '{}'\n"
-      'Be sure you ran `git submodule init && git submodule update`'
-      ''.format(aubio_demos_path)
-    )
-  
-    sys.path.append(aubio_demos_path)
-  
-  try:
-    yield
-  finally:
-    if needs_update:
-      sys.path.remove(aubio_demos_path)
+  def _confidence(self):
+    num_blocks_read = self.audio_stream.num_blocks_read
+    if num_blocks_read != self._cached_confidence_num_blocks_read:
+      self._cached_confidence = self._aubio_pitch.get_confidence()
+      self._cached_confidence_num_blocks_read = num_blocks_read
 
-def plot_audio_file_pitch_confidence(file_path, sample_rate):
-  """
-    Uses matplotlib, via aubio's `demo_pitch.py`,
-    to plot an audio file's pitch confidence over time
-  """
-  
-  argv_bak = sys.argv
-  sys.argv = [
-    argv_bak[0],
-    file_path,
-    sample_rate,
-  ]
-
-  try:
-    exit_bak = sys.exit
-    sys.exit = lambda *args, **kwargs: logging.debug('Intercepted sys.exit(*{}, **{})'.format(args, kwargs))
-    
-    try:
-      with warnings.catch_warnings():
-        with _aubio_demos_in_path():
-          warnings.filterwarnings('ignore', category=UserWarning)
-  
-          runpy.run_module(
-            'demo_pitch',
-            run_name='__main__',
-            alter_sys=True,
-          )
-    finally:
-      sys.exit = exit_bak
-  finally:
-    sys.argv = argv_bak
+    return self._cached_confidence
@@ -0,0 +1,678 @@
+"""
+  Offline, vectorized doorbell detection for long recordings
+
+  Instead of pulling one block at a time through `File.read`,
+    `Pitch.process_data` and the per-block `AiPhoneGT1A.feed_one`,
+    a recording is...
+      (1) decoded into a 2-D array of blocks, in large chunks
+      (2) reduced to a pitch confidence trace, split across processes
+      (3) scanned for ring cycles with cumsum based moving averages
+
+  aubio's YIN costs as much per block here as it does when streaming, so
+    with the detector's own model the trace is at most as many times faster
+    as there are CPUs to split it across, i.e. no faster on a single core;
+    the scan itself is negligible next to it
+
+  The scan replays the exact ring -> gap -> ring logic of `AiPhoneGT1A`,
+    including its stream clock timeouts, and the trace is computed with
+    the detector's own pitch model, so the detections match what
+    `AiPhoneGT1A.is_ringing` would report for the same file; swapping
+    in a faster model, with `use_fast_model`, is opt-in, since its
+    confidences can differ slightly
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import math
+import os
+
+import aubio
+import numpy as np
+
+from lib.audio import Pitch
+from lib.energy_gate import EnergyGate
+from lib.sliding_window import MEAN_TOLERANCE
+from lib.tone_energy import ToneEnergy
+
+# aubio's 'yinfast' computes the same YIN difference function as 'yin'
+#   but via FFT, so its confidences match 'yin' to within float32 rounding
+#   at a fraction of the cost; a confidence near a threshold can still
+#   round the other way, so it's only used when asked for
+FAST_PITCH_MODELS = {
+  'yin': 'yinfast',
+}
+
+# the fewest blocks that a chunk is split into a segment of, per worker,
+#   since each segment repeats the pitch's buffer worth of blocks before it
+MIN_SEGMENT_NUM_BLOCKS = 256
+
+
+def read_blocks(audio_file, *, chunk_num_blocks=1024):
+  """
+    Decode the whole of `audio_file` into memory
+
+    The blocks are laid out exactly as `audio_file.iter_read()` would
+      return them, i.e. the last block is zero padded and, if the file
+      length is a multiple of the block size, an all-zero block follows
+
+    :param audio_file: an unopened `audio.File`
+    :param chunk_num_blocks: the number of blocks decoded per call to aubio
+    :return: a float32 array of shape (num_blocks, block_size)
+  """
+
+  chunks = list(iter_block_chunks(audio_file, chunk_num_blocks=chunk_num_blocks))
+  return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+
+def iter_block_chunks(audio_file, *, chunk_num_blocks=1024):
+  """
+    Decode `audio_file` a chunk of blocks at a time, so that a long
+      recording can be reduced without holding all of it in memory
+
+    The blocks are laid out as `read_blocks` lays them out
+
+    :param audio_file: an unopened `audio.File`
+    :param chunk_num_blocks: the number of blocks decoded per call to aubio
+    :return: a generator of float32 arrays of shape (<= chunk_num_blocks, block_size)
+  """
+
+  block_size = audio_file.block_size
+  chunk_size = block_size * chunk_num_blocks
+
+  source = aubio.source(
+    audio_file.file_path,
+    samplerate=audio_file.sample_rate,
+    hop_size=chunk_size,
+    channels=audio_file.num_channels,
+  )
+
+  try:
+    while True:
+      chunk, num_read = source()
+      if num_read < chunk_size:
+        # the partial block is zero padded, and an all-zero block
+        #   follows a file that ends on a block boundary
+        num_blocks = num_read // block_size + 1
+        samples = np.zeros(num_blocks * block_size, dtype=np.float32)
+        samples[:num_read] = chunk[:num_read]
+        yield samples.reshape(num_blocks, block_size)
+        break
+
+      # copied, since aubio reuses the chunk's buffer
+      yield np.array(chunk, dtype=np.float32).reshape(chunk_num_blocks, block_size)
+  finally:
+    source.close()
+
+
+def pitch_confidences(audio_pitch, blocks, *, use_fast_model=False, num_workers=1):
+  """
+    Compute the pitch confidence of every block
+
+    :param audio_pitch: the `audio.Pitch`, `ToneEnergy` or `EnergyGate` whose settings are used
+    :param blocks: the array returned from `read_blocks`
+    :param use_fast_model: if True then swap in the equivalent,
+       faster model from `FAST_PITCH_MODELS`, when there is one, whose
+       detections may differ from the streaming detector's
+    :param num_workers: the number of processes that the pitch detection
+       is split across, or None for one per CPU; e.g. 1 in the workers
+       of a process pool
+    :return: a float64 array of shape (num_blocks,)
+  """
+
+  _, confidences = pitch_trace(audio_pitch, blocks, use_fast_model=use_fast_model, num_workers=num_workers)
+  return confidences
+
+
+def pitch_trace(audio_pitch, blocks, *, use_fast_model=False, num_workers=1):
+  """
+    The `pitch_confidences` of every block, along with its pitch
+
+    :return: (a float64 array of the pitch, in Hz, of every block, or None
+      for a `ToneEnergy`, which has no pitch, a float64 array of the
+      confidence of every block)
+  """
+
+  trace, = iter_pitch_traces(audio_pitch, [blocks], use_fast_model=use_fast_model, num_workers=num_workers)
+  return trace
+
+
+def iter_pitch_traces(audio_pitch, chunks, *, use_fast_model=False, num_workers=1):
+  """
+    The `pitch_trace` of each chunk of consecutive blocks, e.g. of
+      `iter_block_chunks`, where the pitch detection carries on from
+      one chunk to the next, as if the chunks were a single array
+
+    :param num_workers: see `pitch_confidences`
+
+    :return: a generator of the (pitches or None, confidences) of each chunk
+  """
+
+  num_workers = num_workers or os.cpu_count() or 1
+  executor = None if num_workers == 1 else ProcessPoolExecutor(max_workers=num_workers)
+  try:
+    trace_chunk = _new_chunk_tracer(
+      audio_pitch,
+      use_fast_model=use_fast_model,
+      executor=executor,
+      num_workers=num_workers,
+    )
+    for i, blocks in enumerate(chunks):
+      yield trace_chunk(blocks, is_continued=i > 0)
+  finally:
+    if executor is not None:
+      executor.shutdown()
+
+
+def _new_chunk_tracer(audio_pitch, *, use_fast_model, executor=None, num_workers=1):
+  """
+    :param executor: the `ProcessPoolExecutor` of `num_workers` that a
+       `audio.Pitch`'s chunks are split across, or None to trace them in
+       this process
+
+    :return: a function of (blocks, *, is_continued, is_needed=None) -> (pitches or None, confidences),
+      whose state carries on from the blocks of its previous call when `is_continued`, and
+      which only computes the blocks of the bool array `is_needed`, if given, leaving the
+      pitch, and confidence, of the others 0
+  """
+
+  if isinstance(audio_pitch, EnergyGate):
+    trace_pitch_chunk = _new_chunk_tracer(
+      audio_pitch.pitch,
+      use_fast_model=use_fast_model,
+      executor=executor,
+      num_workers=num_workers,
+    )
+    gate_state = None
+
+    def trace_gate_chunk(blocks, *, is_continued, is_needed=None):
+      nonlocal gate_state
+      is_open, gate_state = audio_pitch.is_open_of(blocks, state=gate_state if is_continued else None)
+      if is_needed is not None:
+        is_open &= is_needed
+
+      # the gate's pre-roll keeps the pitch's buffer whole, so the confidences
+      #   of the open blocks are those of the ungated pitch, which are all that's computed
+      return trace_pitch_chunk(blocks, is_continued=is_continued, is_needed=is_open)
+
+    return trace_gate_chunk
+
+  if isinstance(audio_pitch, ToneEnergy):
+    def trace_tone_chunk(blocks, *, is_continued, is_needed=None):
+      # every block's confidence is independent of the others'
+      if is_needed is None:
+        return None, audio_pitch.confidences_of(blocks)
+
+      confidences = np.zeros(len(blocks), dtype=np.float64)
+      if is_needed.any():
+        confidences[is_needed] = audio_pitch.confidences_of(blocks[is_needed])
+      return None, confidences
+
+    return trace_tone_chunk
+
+  model = audio_pitch.model
+  if use_fast_model:
+    model = FAST_PITCH_MODELS.get(model, model)
+
+  # a pitch of its own, so that neither the model nor the state of `audio_pitch` changes
+  trace_pitch = Pitch(
+    audio_pitch.audio_stream,
+    model=model,
+    tolerance=audio_pitch.tolerance,
+    block_size_multiple=audio_pitch.block_size_multiple,
+    decimated_sample_rate=audio_pitch.decimated_sample_rate,
+  )
+
+  # aubio's pitch has no state but the samples of its buffer, so a segment
+  #   of blocks, traced after the blocks that fill the buffer before it, has
+  #   exactly the confidences that it has in a trace of every block; the
+  #   first of these blocks also flushes the history of any resampler
+  num_warm_up_blocks = int(math.ceil(trace_pitch.buf_size / trace_pitch.hop_size))
+  # the last, at most `num_warm_up_blocks`, blocks of the previous chunks
+  history = None
+
+  def trace_pitch_chunk(blocks, *, is_continued, is_needed=None):
+    nonlocal history
+    blocks = np.ascontiguousarray(blocks, dtype=np.float32)
+    if not is_continued or history is None:
+      history = blocks[:0]
+
+    preceded_blocks = np.concatenate([history, blocks]) if len(history) else blocks
+    num_history_blocks = len(history)
+
+    pitches = np.zeros(len(blocks), dtype=np.float64)
+    confidences = np.zeros(len(blocks), dtype=np.float64)
+
+    segments = _split_runs(
+      [(0, len(blocks))] if is_needed is None else _runs_of(is_needed, max_gap=num_warm_up_blocks),
+      num_workers=num_workers,
+    )
+    traces = []
+    for start, end in segments:
+      # fewer than `num_warm_up_blocks` only at the start of the stream, which a new pitch starts at too
+      warm_up_start = max(0, num_history_blocks + start - num_warm_up_blocks)
+      args = (
+        trace_pitch,
+        preceded_blocks[warm_up_start:num_history_blocks + end],
+        num_history_blocks + start - warm_up_start,
+      )
+      traces.append(_trace_segment(*args) if executor is None else executor.submit(_trace_segment, *args))
+
+    for (start, end), trace in zip(segments, traces):
+      pitches[start:end], confidences[start:end] = trace if executor is None else trace.result()
+
+    if is_needed is not None:
+      # the blocks between the runs that were merged
+      pitches[~is_needed] = 0.0
+      confidences[~is_needed] = 0.0
+
+    history = preceded_blocks[-num_warm_up_blocks:].copy()
+    return pitches, confidences
+
+  return trace_pitch_chunk
+
+
+def _runs_of(is_needed, *, max_gap):
+  """
+    :return: a list of the (start, end) of each run of True in the bool array
+      `is_needed`, where runs that are at most `max_gap` apart are merged, since
+      tracing the gap costs no more than warming up the pitch for the next run
+  """
+
+  edges = np.flatnonzero(np.diff(np.concatenate([[0], is_needed.astype(np.int8), [0]])))
+
+  runs = []
+  for start, end in edges.reshape(-1, 2).tolist():
+    if runs and start - runs[-1][1] <= max_gap:
+      runs[-1] = (runs[-1][0], end)
+    else:
+      runs.append((start, end))
+
+  return runs
+
+
+def _split_runs(runs, *, num_workers):
+  """
+    :return: a list of the (start, end) of segments of `runs`, which
+      split the runs' blocks about evenly across `num_workers`
+  """
+
+  num_blocks = sum(end - start for start, end in runs)
+  segment_num_blocks = max(MIN_SEGMENT_NUM_BLOCKS, int(math.ceil(num_blocks / num_workers)))
+
+  segments = []
+  for start, end in runs:
+    num_segments = int(math.ceil((end - start) / segment_num_blocks))
+    bounds = np.linspace(start, end, num_segments + 1).astype(int).tolist()
+    segments.extend(zip(bounds[:-1], bounds[1:]))
+
+  return segments
+
+
+def _trace_segment(trace_pitch, blocks, num_warm_up_blocks):
+  """
+    :param trace_pitch: an unopened `audio.Pitch`, e.g. one pickled to a worker
+    :param num_warm_up_blocks: the number of `blocks` that only fill the pitch's buffer
+
+    :return: the (pitches, confidences) of the blocks after the first `num_warm_up_blocks`
+  """
+
+  trace_pitch.open()
+  try:
+    pitches, confidences = trace_pitch.process_many(blocks)
+  finally:
+    trace_pitch.close()
+
+  return pitches[num_warm_up_blocks:], confidences[num_warm_up_blocks:]
+
+
+def _window_averages(confidences, *, phase_start, lo, hi, window_size, fill_value):
+  """
+    :return: the averages that a `SlidingWindow(size=window_size, fill_value=fill_value)`,
+      created at index `phase_start`, would have after each of the pushes
+      of `confidences[lo:hi]`
+  """
+
+  base = max(phase_start, lo - window_size + 1)
+  cumsum = np.zeros(hi - base + 1, dtype=np.float64)
+  np.cumsum(confidences[base:hi], out=cumsum[1:])
+
+  indices = np.arange(lo, hi)
+  window_starts = np.maximum(phase_start, indices - window_size + 1)
+  sums = cumsum[indices + 1 - base] - cumsum[window_starts - base]
+  num_fill_values = np.maximum(0, window_size - (indices - phase_start + 1))
+
+  return (sums + fill_value * num_fill_values) / window_size
+
+
+def _refine_window_averages(averages, confidences, *, phase_start, lo, window_size, fill_value, thresholds):
+  """
+    Recompute, in place, the `_window_averages` of `confidences[lo:]` that are
+      within `MEAN_TOLERANCE` of any of `thresholds`, as `SlidingWindow.mean_for`
+      does, so that the comparisons with them match the streaming detector's
+
+    :return: `averages`
+  """
+
+  is_near = np.zeros(len(averages), dtype=bool)
+  for threshold in thresholds:
+    is_near |= np.abs(averages - threshold) <= MEAN_TOLERANCE
+
+  for i in np.flatnonzero(is_near).tolist():
+    index = lo + i
+    window_start = max(phase_start, index - window_size + 1)
+    num_fill_values = window_size - (index + 1 - window_start)
+    averages[i] = math.fsum(
+      confidences[window_start:index + 1].tolist() + [fill_value] * num_fill_values
+    ) / window_size
+
+  return averages
+
+
+def _timeout_index(*, phase_start, max_wait_seconds, block_size, sample_rate):
+  """
+    :return: the index of the block after which a stream clock timeout,
+      started at `phase_start`, fires; mirrors the float arithmetic of
+      `Stream.num_seconds_read` so that the result matches the stream
+  """
+
+  max_wait_seconds_read = block_size * phase_start / sample_rate + max_wait_seconds
+
+  index = max(phase_start, int(max_wait_seconds_read * sample_rate / block_size) - 2)
+  while block_size * (index + 1) / sample_rate < max_wait_seconds_read:
+    index += 1
+
+  return index
+
+
+def _detect_phase(
+  confidences,
+  *,
+  phase_start,
+  window_size,
+  fill_value,
+  min_ringing_confidence,
+  max_ringing_confidence,
+  is_ring,
+  max_wait_seconds,
+  block_size,
+  sample_rate,
+  chunk_size,
+):
+  """
+    Vectorized equivalent of one state of `AiPhoneGT1A.feed_one`
+
+    :return: (is_detected, index of the last confidence consumed)
+             or (False, None) if the confidences ran out
+  """
+
+  num_confidences = len(confidences)
+
+  if max_wait_seconds is None:
+    end = num_confidences
+  else:
+    timeout_index = _timeout_index(
+      phase_start=phase_start,
+      max_wait_seconds=max_wait_seconds,
+      block_size=block_size,
+      sample_rate=sample_rate,
+    )
+    end = min(timeout_index + 1, num_confidences)
+
+  lo = phase_start
+  while lo < end:
+    hi = min(lo + chunk_size, end)
+    averages = _window_averages(
+      confidences,
+      phase_start=phase_start,
+      lo=lo,
+      hi=hi,
+      window_size=window_size,
+      fill_value=fill_value,
+    )
+    _refine_window_averages(
+      averages,
+      confidences,
+      phase_start=phase_start,
+      lo=lo,
+      window_size=window_size,
+      fill_value=fill_value,
+      thresholds=(min_ringing_confidence, max_ringing_confidence),
+    )
+    is_in_range = (
+      (min_ringing_confidence <= averages)
+      & (averages <= max_ringing_confidence)
+    )
+    matches = np.flatnonzero(is_in_range if is_ring else ~is_in_range)
+    if len(matches):
+      return True, lo + int(matches[0])
+
+    lo = hi
+
+  if max_wait_seconds is not None and timeout_index < num_confidences:
+    return False, timeout_index
+
+  return False, None
+
+
+def detector_settings(detector):
+  """
+    :param detector: an `AiPhoneGT1A`
+    :return: a json-able dict of the settings of `detector`, and of its
+      stream, that `cadence_kwargs` takes
+  """
+
+  return {
+    'block_size': detector.audio_stream.block_size,
+    'sample_rate': detector.audio_stream.sample_rate,
+    'pitch_confidences_per_second': detector.pitch_confidences_per_second,
+    'min_ringing_confidence': detector.min_ringing_confidence,
+    'max_ringing_confidence': detector.max_ringing_confidence,
+    'ringing_seconds': detector.ringing_seconds,
+    'gap_seconds': detector.gap_seconds,
+    'max_wait_gap_multiple': detector.max_wait_gap_multiple,
+    'max_wait_subsequent_ring_multiple': detector.max_wait_subsequent_ring_multiple,
+  }
+
+
+def cadence_kwargs(
+  *,
+  block_size,
+  sample_rate,
+  pitch_confidences_per_second,
+  min_ringing_confidence,
+  max_ringing_confidence,
+  ringing_seconds,
+  gap_seconds,
+  max_wait_gap_multiple,
+  max_wait_subsequent_ring_multiple,
+):
+  """
+    :return: the kwargs of `find_ring_cycles` that scan a trace with the
+      windows and timeouts of an `AiPhoneGT1A` of these settings, e.g.
+      of `detector_settings`, without having to create the detector
+  """
+
+  return {
+    'block_size': block_size,
+    'sample_rate': sample_rate,
+    'min_ringing_confidence': min_ringing_confidence,
+    'max_ringing_confidence': max_ringing_confidence,
+    # as `AiPhoneGT1A` sizes its `SlidingWindow`s
+    'ring_window_size': int(pitch_confidences_per_second * ringing_seconds),
+    'gap_window_size': int(pitch_confidences_per_second * gap_seconds),
+    'max_wait_gap_seconds': gap_seconds * max_wait_gap_multiple,
+    'max_wait_subsequent_ring_seconds': ringing_seconds * max_wait_subsequent_ring_multiple,
+  }
+
+
+def find_ring_cycles(confidences, *, max_num_ring_cycles=None, chunk_size=4096, **kwargs):
+  """
+    Find every ring -> gap -> ring cycle in a pitch confidence trace
+
+    After each detected cycle the search re-arms, starting a new cycle
+      from the following confidence
+
+    :param confidences: the array returned from `pitch_confidences`
+    :param max_num_ring_cycles: stop after this many cycles, if set
+    :param chunk_size: the number of averages computed per numpy call
+    :param kwargs: the windows and timeouts of the scan, see `find_ring_cycle_phases`
+
+    :return: a list of the indices of the confidences at which each
+      ring cycle was detected
+  """
+
+  return [
+    phases[-1][1]
+    for phases in find_ring_cycle_phases(
+      confidences,
+      max_num_ring_cycles=max_num_ring_cycles,
+      chunk_size=chunk_size,
+      **kwargs
+    )
+  ]
+
+
+def find_ring_cycle_phases(
+  confidences,
+  *,
+  block_size,
+  sample_rate,
+  min_ringing_confidence,
+  max_ringing_confidence,
+  ring_window_size,
+  gap_window_size,
+  max_wait_gap_seconds,
+  max_wait_subsequent_ring_seconds,
+  max_num_ring_cycles=None,
+  chunk_size=4096,
+):
+  """
+    `find_ring_cycles`, along with when, and how, each phase of every
+      ring cycle was detected
+
+    The windows and timeouts are those of an `AiPhoneGT1A`, e.g. from
+      `cadence_kwargs(**detector_settings(detector))`
+
+    :param block_size: the block size of the trace's stream
+    :param sample_rate: the sample rate of the trace's stream
+
+    :param min_ringing_confidence: the min window average of a ring
+    :param max_ringing_confidence: the max window average of a ring
+
+    :param ring_window_size: the number of confidences averaged by a ring's window
+    :param gap_window_size: the number of confidences averaged by a gap's window
+
+    :param max_wait_gap_seconds: the stream seconds, after a ring, within which a gap must be detected
+    :param max_wait_subsequent_ring_seconds: the stream seconds, after a gap, within which a ring must be detected
+
+    :return: a list, per ring cycle, of the (phase start index, detection
+      index, window average at the detection) of its ring, its gap and its
+      subsequent ring, where the subsequent ring's detection index is the
+      ring cycle's `find_ring_cycles` index
+  """
+
+  average_ring_confidence = (min_ringing_confidence + max_ringing_confidence) / 2
+
+  phases = (
+    # window_size, fill_value, is_ring, max_wait_seconds
+    (ring_window_size, 0.0, True, None),
+    (gap_window_size, average_ring_confidence, False, max_wait_gap_seconds),
+    (ring_window_size, 0.0, True, max_wait_subsequent_ring_seconds),
+  )
+
+  ring_cycle_phases = []
+  phase_start = 0
+  while phase_start < len(confidences):
+    detected_phases = []
+    for window_size, fill_value, is_ring, max_wait_seconds in phases:
+      is_detected, index = _detect_phase(
+        confidences,
+        phase_start=phase_start,
+        window_size=window_size,
+        fill_value=fill_value,
+        min_ringing_confidence=min_ringing_confidence,
+        max_ringing_confidence=max_ringing_confidence,
+        is_ring=is_ring,
+        max_wait_seconds=max_wait_seconds,
+        block_size=block_size,
+        sample_rate=sample_rate,
+        chunk_size=chunk_size,
+      )
+      if index is None:
+        return ring_cycle_phases
+
+      if is_detected:
+        average, = _window_averages(
+          confidences,
+          phase_start=phase_start,
+          lo=index,
+          hi=index + 1,
+          window_size=window_size,
+          fill_value=fill_value,
+        )
+        detected_phases.append((phase_start, index, float(average)))
+
+      phase_start = index + 1
+      if not is_detected:
+        break
+    else:
+      ring_cycle_phases.append(tuple(detected_phases))
+      logging.info(
+        'ring cycle detected at {:.3f}s'
+        ''.format(block_size * (index + 1) / sample_rate)
+      )
+      if max_num_ring_cycles is not None and len(ring_cycle_phases) >= max_num_ring_cycles:
+        break
+
+  return ring_cycle_phases
+
+
+def detect_ring_cycles(
+  detector,
+  *,
+  max_num_ring_cycles=None,
+  use_fast_model=False,
+  trace_cache=None,
+  num_workers=None,
+):
+  """
+    Batch equivalent of `detector.is_ringing()`, for a `detector`
+      whose `audio_stream` is an unopened `audio.File`
+
+    :param use_fast_model: see `pitch_confidences`
+    :param num_workers: see `pitch_confidences`, which defaults to one per CPU here
+    :param trace_cache: an optional `TraceCache`, so that the confidences
+       of a file are only computed once per pitch setting
+
+    :return: a list of the stream times, in seconds, at which each
+      ring cycle was detected, i.e. the `num_seconds_read` of the
+      stream at the moment `is_ringing()` would have returned True
+  """
+
+  audio_stream = detector.audio_stream
+
+  if trace_cache is None:
+    confidences = pitch_confidences(
+      detector.audio_pitch,
+      read_blocks(audio_stream),
+      use_fast_model=use_fast_model,
+      num_workers=num_workers,
+    )
+  else:
+    _, confidences = trace_cache.trace(
+      audio_stream,
+      detector.audio_pitch,
+      use_fast_model=use_fast_model,
+      num_workers=num_workers,
+    )
+
+  ring_cycle_indices = find_ring_cycles(
+    confidences,
+    max_num_ring_cycles=max_num_ring_cycles,
+    **cadence_kwargs(**detector_settings(detector))
+  )
+
+  return [
+    audio_stream.block_size * (index + 1) / audio_stream.sample_rate
+    for index in ring_cycle_indices
+  ]
@@ -0,0 +1,206 @@
+"""
+  Keeps bluetooth low energy devices, e.g. the SwitchBots, connected between
+    presses, so that a press doesn't pay for a cold connect
+
+  The BLE layer is a `BleLink`, one per device, so that the manager can run
+    against real devices or, e.g. for benchmarking, fake ones
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from lib.instrumentation import LatencyHistogram
+
+
+class BleLink(ABC):
+  """
+    An abstract class of the connection to a single BLE device
+  """
+
+  @property
+  @abstractmethod
+  def is_connected(self):
+    pass
+
+  @abstractmethod
+  def connect(self):
+    """
+      Connect to the device, so that `press` can be called
+
+      :return: None
+    """
+    pass
+
+  @abstractmethod
+  def disconnect(self):
+    """
+      Disconnect from the device, which must be safe to call even
+        if the connection has already been lost
+
+      :return: None
+    """
+    pass
+
+  @abstractmethod
+  def press(self):
+    """
+      Press the device's button, raising if it isn't confirmed to have been pressed
+
+      :return: None
+    """
+    pass
+
+
+class BleConnectionManager:
+  """
+    Presses the devices of `links`, connecting each on first use, or on
+      `connect_all`, and then keeping it connected
+
+    Presses of the same device are serialized, since a device handles a
+      single command at a time, while different devices are pressed
+      concurrently; a failed press is retried, after reconnecting, with
+      exponential backoff
+
+    Usage example:
+
+      manager = BleConnectionManager(links={'unlock_door': link})
+      manager.connect_all()
+      ...
+      manager.press('unlock_door')
+  """
+
+  def __init__(self, *, links, max_attempts=3, backoff_seconds=0.25, backoff_multiple=2):
+    """
+      :param links: a dict of device name -> `BleLink`
+
+      :param max_attempts: the number of times a press is attempted
+         before its exception is raised
+
+      :param backoff_seconds: the seconds waited before the first retry
+      :param backoff_multiple: the multiple of each subsequent retry's wait
+    """
+
+    self.links = links
+    self.max_attempts = max_attempts
+    self.backoff_seconds = backoff_seconds
+    self.backoff_multiple = backoff_multiple
+
+    self._locks = {name: threading.Lock() for name in links}
+    self._press_latencies = {name: LatencyHistogram() for name in links}
+    self._num_connects = {name: 0 for name in links}
+    self._num_retries = {name: 0 for name in links}
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tlinks={},\n'
+        '\tmax_attempts={},\n'
+        '\tbackoff_seconds={},\n'
+        '\tbackoff_multiple={}\n'
+      ')'
+      ''.format(
+        BleConnectionManager.__name__,
+        sorted(self.links),
+        self.max_attempts,
+        self.backoff_seconds,
+        self.backoff_multiple,
+      )
+    )
+
+  def connect_all(self):
+    """
+      Connect every device concurrently, e.g. while the doorbell detector
+        starts listening, logging, rather than raising, failures since
+        they're retried on the next press
+
+      :return: a dict of device name -> whether it's connected
+    """
+
+    with ThreadPoolExecutor(max_workers=len(self.links), thread_name_prefix='ble') as executor:
+      futures = {
+        name: executor.submit(self._connect_if_needed, name, lock=True)
+        for name in self.links
+      }
+
+    for name, future in futures.items():
+      try:
+        future.result()
+      except Exception as e:
+        logging.warning("failed to connect to '{}': {!r}".format(name, e))
+
+    return {name: link.is_connected for name, link in self.links.items()}
+
+  def press(self, name):
+    """
+      :return: the seconds that the press took, including any wait
+        for the device's other presses, reconnects and retries
+    """
+
+    started_at = time.monotonic()
+
+    with self._locks[name]:
+      backoff_seconds = self.backoff_seconds
+      for attempt in range(1, self.max_attempts + 1):
+        try:
+          self._connect_if_needed(name)
+          self.links[name].press()
+          break
+        except Exception as e:
+          if attempt == self.max_attempts:
+            raise
+
+          logging.warning("failed to press '{}' on attempt {} of {}: {!r}".format(
+            name,
+            attempt,
+            self.max_attempts,
+            e,
+          ))
+          self._num_retries[name] += 1
+          self._disconnect(name)
+          time.sleep(backoff_seconds)
+          backoff_seconds *= self.backoff_multiple
+
+      seconds = time.monotonic() - started_at
+      self._press_latencies[name].record(seconds)
+
+    logging.info("pressed '{}' in {:.3f}s".format(name, seconds))
+    return seconds
+
+  def close(self):
+    for name in self.links:
+      with self._locks[name]:
+        self._disconnect(name)
+
+  def summary(self):
+    """
+      :return: a dict of device name -> its press latencies,
+        in seconds, and its numbers of connects and retries
+    """
+
+    return {
+      name: {
+        'press_seconds': self._press_latencies[name].summary(),
+        'num_connects': self._num_connects[name],
+        'num_retries': self._num_retries[name],
+      }
+      for name in sorted(self.links)
+    }
+
+  def _connect_if_needed(self, name, *, lock=False):
+    if lock:
+      with self._locks[name]:
+        return self._connect_if_needed(name)
+
+    link = self.links[name]
+    if not link.is_connected:
+      link.connect()
+      self._num_connects[name] += 1
+
+  def _disconnect(self, name):
+    try:
+      self.links[name].disconnect()
+    except Exception as e:
+      logging.warning("failed to disconnect from '{}': {!r}".format(name, e))
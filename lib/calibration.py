@@ -0,0 +1,494 @@
+"""
+  Calibrates a doorbell detector's cadence parameters against a directory
+    of labelled recordings
+
+  Each recording is reduced to its pitch confidence trace, and the settings
+    of its detector, once; the parameters only change how a trace is
+    scanned, so every candidate parameter set is scored by replaying
+    `batch_detection.find_ring_cycles` over the traces, across a process
+    pool, without creating a detector per parameter set
+
+  A recording `<name>.wav`, or any format that aubio decodes, is labelled by
+    a `<name>.json` whose 'ring_cycles' are the [start, end] seconds of each
+    ring cycle, i.e. from the start of its first ring to the end of its
+    second; an empty list labels a recording without any ring; e.g. a clip
+    sidecar, of `ClipRecorder`, is labelled by adding 'ring_cycles' to it
+
+  Usage:
+    python -m lib.calibration --recordings_dir_path recordings --output_path detector.json
+    python -m lib.calibration --recordings_dir_path recordings --num_random_samples 2000
+    python -m lib.calibration --recordings_dir_path recordings --search_space_path space.json
+
+  The output can be passed to `main.py --detector_kwargs_path`, which
+    reads its 'best_detector_kwargs', as does `load_detector_kwargs`
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from lib import audio, batch_detection, door_bell_detectors
+from lib.trace_cache import TraceCache
+
+AUDIO_FILE_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.aif', '.aiff')
+
+# the key of the output whose value is the kwargs of the best detector
+BEST_DETECTOR_KWARGS = 'best_detector_kwargs'
+
+# the values of each parameter of `AiPhoneGT1A` that the grid search tries;
+#   a random search samples uniformly between each one's min and max
+DEFAULT_SEARCH_SPACE = {
+  'min_ringing_confidence': [0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6],
+  'max_ringing_confidence': [0.7, 0.75, 0.8, 0.9, 1.0],
+  'ringing_seconds': [1.2, 1.5, 1.8],
+  'gap_seconds': [1.2, 1.5, 1.8],
+  'max_wait_gap_multiple': [2, 3],
+  'max_wait_subsequent_ring_multiple': [2, 3],
+}
+
+# the parameters that only change how a trace is scanned, rather than the trace
+CADENCE_PARAMETERS = (
+  'min_ringing_confidence',
+  'max_ringing_confidence',
+  'pitch_confidences_per_second',
+  'ringing_seconds',
+  'gap_seconds',
+  'max_wait_gap_multiple',
+  'max_wait_subsequent_ring_multiple',
+)
+
+# the parameters that are sampled as ints by a random search
+INT_PARAMETERS = ('max_wait_gap_multiple', 'max_wait_subsequent_ring_multiple')
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-recordings_dir_path', '--recordings_dir_path', type=str, required=True)
+  arg_parser.add_argument('-output_path', '--output_path', type=str)
+  arg_parser.add_argument('-door_bell_detector', '--door_bell_detector', type=str, default='AiPhoneGT1A')
+  arg_parser.add_argument('-detector_kwargs_path', '--detector_kwargs_path', type=str)
+  arg_parser.add_argument('-search_space_path', '--search_space_path', type=str)
+  arg_parser.add_argument('-num_random_samples', '--num_random_samples', type=int)
+  arg_parser.add_argument('-seed', '--seed', type=int, default=0)
+  arg_parser.add_argument('-slack_seconds', '--slack_seconds', type=float, default=4.0)
+  arg_parser.add_argument('-num_workers', '--num_workers', type=int)
+  arg_parser.add_argument('-trace_cache_dir_path', '--trace_cache_dir_path', type=str)
+  arg_parser.add_argument('-use_fast_model', '--use_fast_model', action='store_true')
+  arg_parser.add_argument('-num_results', '--num_results', type=int, default=10)
+  arg_parser.add_argument('-log_level', '--log_level', type=str, default='INFO')
+
+  kwargs = vars(arg_parser.parse_args())
+  kwargs['log_level'] = logging._checkLevel(kwargs['log_level'].upper())
+
+  return kwargs
+
+
+class LabelledRecording:
+  """
+    A recording and the [start, end] seconds of each of its ring cycles
+  """
+
+  def __init__(self, *, file_path, ring_cycles):
+    self.file_path = file_path
+    self.ring_cycles = ring_cycles
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tfile_path='{}',\n"
+        '\tring_cycles={}\n'
+      ')'
+      ''.format(
+        LabelledRecording.__name__,
+        self.file_path,
+        self.ring_cycles,
+      )
+    )
+
+
+def find_labelled_recordings(dir_path):
+  """
+    :return: a list of the `LabelledRecording`s in `dir_path`, skipping,
+      with a warning, every recording without a 'ring_cycles' label
+  """
+
+  recordings = []
+  for file_name in sorted(os.listdir(dir_path)):
+    stem, extension = os.path.splitext(file_name)
+    if extension.lower() not in AUDIO_FILE_EXTENSIONS:
+      continue
+
+    labels_path = os.path.join(dir_path, '{}.json'.format(stem))
+    labels = None
+    if os.path.isfile(labels_path):
+      with open(labels_path, 'r') as json_file:
+        labels = json.load(json_file)
+
+    if labels is None or 'ring_cycles' not in labels:
+      logging.warning("skipping '{}', which has no 'ring_cycles' in '{}'".format(file_name, labels_path))
+      continue
+
+    recordings.append(LabelledRecording(
+      file_path=os.path.join(dir_path, file_name),
+      ring_cycles=[tuple(ring_cycle) for ring_cycle in labels['ring_cycles']],
+    ))
+
+  return recordings
+
+
+def score_detections(detection_seconds, *, ring_cycles, slack_seconds):
+  """
+    Match detections to labelled ring cycles: a detection matches a ring
+      cycle if it's between its start and `slack_seconds` after its end
+
+    :return: a dict of the numbers of true and false positives and misses,
+      and the latencies, in seconds, from each matched cycle's start
+  """
+
+  unmatched_detections = list(detection_seconds)
+  latencies = []
+  num_missed = 0
+  for start, end in ring_cycles:
+    matches = [seconds for seconds in unmatched_detections if start <= seconds <= end + slack_seconds]
+    if matches:
+      unmatched_detections.remove(matches[0])
+      latencies.append(matches[0] - start)
+    else:
+      num_missed += 1
+
+  return {
+    'num_true_positives': len(latencies),
+    'num_false_positives': len(unmatched_detections),
+    'num_missed': num_missed,
+    'latencies': latencies,
+  }
+
+
+def iter_grid(search_space):
+  """
+    :return: an iterator of every combination of `search_space`'s values
+  """
+
+  names = sorted(search_space)
+  for values in itertools.product(*(search_space[name] for name in names)):
+    yield dict(zip(names, values))
+
+
+def iter_random(search_space, *, num_samples, seed):
+  """
+    :return: an iterator of `num_samples` parameter sets, each sampled
+      uniformly between the min and max of `search_space`'s values
+  """
+
+  rng = random.Random(seed)
+  names = sorted(search_space)
+  for _ in range(num_samples):
+    parameters = {}
+    for name in names:
+      lo, hi = min(search_space[name]), max(search_space[name])
+      parameters[name] = rng.randint(lo, hi) if name in INT_PARAMETERS else round(rng.uniform(lo, hi), 3)
+    yield parameters
+
+
+def load_detector_kwargs(json_path):
+  """
+    :return: the detector kwargs of the json file at `json_path`, which
+      is either a dict of the kwargs or the output of a calibration,
+      whose 'best_detector_kwargs' are returned
+  """
+
+  with open(json_path, 'r') as json_file:
+    detector_kwargs = json.load(json_file)
+
+  return detector_kwargs.get(BEST_DETECTOR_KWARGS, detector_kwargs)
+
+
+def new_detector(door_bell_detector, *, file_path, detector_kwargs):
+  """
+    :return: a detector of the class named `door_bell_detector`, of the
+      unopened `audio.File` at `file_path`
+  """
+
+  doorbell_detector_class = getattr(door_bell_detectors, door_bell_detector)
+  return doorbell_detector_class(
+    audio_stream=audio.File(file_path=file_path),
+    **detector_kwargs
+  )
+
+
+def confidence_trace(
+  file_path,
+  *,
+  door_bell_detector,
+  detector_kwargs,
+  trace_cache_dir_path=None,
+  use_fast_model=False,
+):
+  """
+    :param trace_cache_dir_path: an optional directory of a `TraceCache`,
+       so that recalibrating skips the recordings whose trace is cached
+    :param use_fast_model: see `batch_detection.pitch_confidences`
+
+    :return: (the pitch confidence trace of the recording at `file_path`,
+      as `batch_detection.detect_ring_cycles` computes it, the
+      `batch_detection.detector_settings` of its detector)
+  """
+
+  detector = new_detector(door_bell_detector, file_path=file_path, detector_kwargs=detector_kwargs)
+  settings = batch_detection.detector_settings(detector)
+
+  if trace_cache_dir_path is not None:
+    _, confidences = TraceCache(trace_cache_dir_path).trace(
+      detector.audio_stream,
+      detector.audio_pitch,
+      use_fast_model=use_fast_model,
+    )
+    # copied out of the memory map, since it's sent back to the parent process
+    return np.array(confidences), settings
+
+  blocks = batch_detection.read_blocks(detector.audio_stream)
+  return batch_detection.pitch_confidences(detector.audio_pitch, blocks, use_fast_model=use_fast_model), settings
+
+
+# each worker's copy of the traces, and of the settings of each recording's
+#   detector, which are sent once, by `_init_worker`, rather than with
+#   every parameter set
+_worker_state = {}
+
+
+def _init_worker(recordings, traces, settings, slack_seconds):
+  logging.disable(logging.INFO)
+  _worker_state.update(
+    recordings=recordings,
+    traces=traces,
+    settings=settings,
+    slack_seconds=slack_seconds,
+  )
+
+
+def _evaluate(parameters):
+  """
+    Score `parameters` over every trace of this worker's `_worker_state`
+
+    :return: a dict of `parameters` and their precision, recall,
+      f1 score and latencies, or None if they're invalid
+  """
+
+  if parameters['min_ringing_confidence'] > parameters['max_ringing_confidence']:
+    return None
+
+  totals = {'num_true_positives': 0, 'num_false_positives': 0, 'num_missed': 0}
+  latencies = []
+  for recording, trace, settings in zip(
+    _worker_state['recordings'],
+    _worker_state['traces'],
+    _worker_state['settings'],
+  ):
+    # the windows and timeouts that the recording's detector would have, with `parameters`
+    cadence_kwargs = batch_detection.cadence_kwargs(**{**settings, **parameters})
+    block_size = cadence_kwargs['block_size']
+    sample_rate = cadence_kwargs['sample_rate']
+
+    detection_seconds = [
+      block_size * (index + 1) / sample_rate
+      for index in batch_detection.find_ring_cycles(trace, **cadence_kwargs)
+    ]
+    scores = score_detections(
+      detection_seconds,
+      ring_cycles=recording.ring_cycles,
+      slack_seconds=_worker_state['slack_seconds'],
+    )
+    latencies.extend(scores.pop('latencies'))
+    for key in totals:
+      totals[key] += scores[key]
+
+  num_detections = totals['num_true_positives'] + totals['num_false_positives']
+  num_ring_cycles = totals['num_true_positives'] + totals['num_missed']
+  precision = totals['num_true_positives'] / num_detections if num_detections else 1.0
+  recall = totals['num_true_positives'] / num_ring_cycles if num_ring_cycles else 1.0
+
+  return {
+    'detector_kwargs': parameters,
+    'precision': precision,
+    'recall': recall,
+    'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    'mean_latency_seconds': statistics.mean(latencies) if latencies else None,
+    'max_latency_seconds': max(latencies) if latencies else None,
+    **totals,
+  }
+
+
+def _sort_key(result):
+  """
+    The best result has the highest f1 score, then the lowest mean latency
+  """
+
+  mean_latency_seconds = result['mean_latency_seconds']
+  return (-result['f1'], float('inf') if mean_latency_seconds is None else mean_latency_seconds)
+
+
+def calibrate(
+  recordings,
+  parameter_sets,
+  *,
+  door_bell_detector='AiPhoneGT1A',
+  detector_kwargs=None,
+  slack_seconds=4.0,
+  num_workers=None,
+  trace_cache_dir_path=None,
+  use_fast_model=False,
+):
+  """
+    :param recordings: a list of `LabelledRecording`s
+    :param parameter_sets: an iterable of dicts of the detector kwargs to score
+
+    :param detector_kwargs: the kwargs of every detector, e.g. its
+       `pitch_kwargs`, that the parameter sets are added to
+
+    :param trace_cache_dir_path: see `confidence_trace`
+    :param use_fast_model: see `confidence_trace`
+
+    :return: a list of the results of every valid parameter set, best first
+  """
+
+  detector_kwargs = detector_kwargs or {}
+
+  parameter_sets = list(parameter_sets)
+  unknown_parameters = {name for parameters in parameter_sets for name in parameters} - set(CADENCE_PARAMETERS)
+  assert not unknown_parameters, 'only the cadence parameters {} can be calibrated, not {}'.format(
+    CADENCE_PARAMETERS,
+    sorted(unknown_parameters),
+  )
+
+  with ProcessPoolExecutor(max_workers=num_workers) as executor:
+    started_at = time.monotonic()
+    traces_and_settings = list(executor.map(
+      _confidence_trace_of,
+      [recording.file_path for recording in recordings],
+      itertools.repeat(door_bell_detector),
+      itertools.repeat(detector_kwargs),
+      itertools.repeat(trace_cache_dir_path),
+      itertools.repeat(use_fast_model),
+    ))
+    traces = [trace for trace, _ in traces_and_settings]
+    settings = [settings for _, settings in traces_and_settings]
+    logging.info('computed {} confidence traces in {:.1f}s'.format(len(traces), time.monotonic() - started_at))
+
+  initargs = (recordings, traces, settings, slack_seconds)
+  with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=initargs) as executor:
+    started_at = time.monotonic()
+    chunk_size = max(1, len(parameter_sets) // (4 * (num_workers or os.cpu_count() or 1)))
+    results = [
+      result
+      for result in executor.map(_evaluate, parameter_sets, chunksize=chunk_size)
+      if result is not None
+    ]
+    logging.info('scored {} parameter sets in {:.1f}s'.format(len(parameter_sets), time.monotonic() - started_at))
+
+  return sorted(results, key=_sort_key)
+
+
+def _confidence_trace_of(file_path, door_bell_detector, detector_kwargs, trace_cache_dir_path, use_fast_model):
+  return confidence_trace(
+    file_path,
+    door_bell_detector=door_bell_detector,
+    detector_kwargs=detector_kwargs,
+    trace_cache_dir_path=trace_cache_dir_path,
+    use_fast_model=use_fast_model,
+  )
+
+
+def main(
+  *,
+  recordings_dir_path,
+  output_path=None,
+  door_bell_detector='AiPhoneGT1A',
+  detector_kwargs_path=None,
+  search_space_path=None,
+  num_random_samples=None,
+  seed=0,
+  slack_seconds=4.0,
+  num_workers=None,
+  num_results=10,
+  trace_cache_dir_path=None,
+  use_fast_model=False,
+  log_level=logging.INFO,
+):
+  logging.basicConfig(level=log_level)
+
+  detector_kwargs = {}
+  if detector_kwargs_path is not None:
+    detector_kwargs = load_detector_kwargs(detector_kwargs_path)
+
+  search_space = DEFAULT_SEARCH_SPACE
+  if search_space_path is not None:
+    with open(search_space_path, 'r') as json_file:
+      search_space = json.load(json_file)
+
+  recordings = find_labelled_recordings(recordings_dir_path)
+  assert recordings, "there are no labelled recordings in '{}'".format(recordings_dir_path)
+  logging.info('calibrating over {} recordings with {} ring cycles'.format(
+    len(recordings),
+    sum(len(recording.ring_cycles) for recording in recordings),
+  ))
+
+  parameter_sets = (
+    iter_grid(search_space)
+    if num_random_samples is None
+    else iter_random(search_space, num_samples=num_random_samples, seed=seed)
+  )
+  results = calibrate(
+    recordings,
+    parameter_sets,
+    door_bell_detector=door_bell_detector,
+    detector_kwargs=detector_kwargs,
+    slack_seconds=slack_seconds,
+    num_workers=num_workers,
+    trace_cache_dir_path=trace_cache_dir_path,
+    use_fast_model=use_fast_model,
+  )
+  assert results, 'no parameter set was valid'
+
+  output = {
+    'door_bell_detector': door_bell_detector,
+    'num_recordings': len(recordings),
+    'num_parameter_sets': len(results),
+    BEST_DETECTOR_KWARGS: {**detector_kwargs, **results[0]['detector_kwargs']},
+    'best': results[0],
+    'results': results[:num_results],
+  }
+
+  if output_path is None:
+    json.dump(output, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+  else:
+    with open(output_path, 'w') as json_file:
+      json.dump(output, json_file, indent=2)
+      json_file.write('\n')
+    logging.info("wrote the calibration to '{}'".format(output_path))
+
+  best = results[0]
+  logging.info(
+    'best: precision={:.3f} recall={:.3f} f1={:.3f} mean latency={}, {}'
+    ''.format(
+      best['precision'],
+      best['recall'],
+      best['f1'],
+      best['mean_latency_seconds'],
+      best['detector_kwargs'],
+    )
+  )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
@@ -0,0 +1,259 @@
+"""
+  Dials several phones at once for a single doorbell ring: the first phone
+    to answer gets the doorbell, and every other call is canceled
+
+  The answers arrive via twilio's status callbacks, and its fetches of the
+    answered calls' TwiML, so the flask routes that handle them call
+    `CallFanOut.on_answered`
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from lib.utils import computed_once
+
+MAX_CONCURRENT_REQUESTS = 8
+
+
+@computed_once
+def request_executor():
+  """
+    :return: the executor of the concurrent twilio requests of every fan out,
+      whose threads outlive a single ring
+  """
+  return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix='twilio')
+
+
+def warm_up_connections(client, *, num_connections=1):
+  """
+    Open `num_connections` pooled HTTPS connections of `client`, a
+      `twilio.rest.Client`, by concurrently fetching its account, which
+      is free and has no effect
+
+    :return: None
+  """
+
+  futures = [
+    request_executor().submit(client.api.v2010.accounts(client.account_sid).fetch)
+    for _ in range(num_connections)
+  ]
+  for future in futures:
+    future.result()
+
+
+class CallFanOut:
+  """
+    Usage example:
+
+      fan_out = CallFanOut(
+        client=client,
+        from_phone='+15555550000',
+        to_phones=['+15555550001', '+15555550002'],
+        create_kwargs={'url': ..., 'status_callback': ..., 'status_callback_event': 'answered'},
+      )
+      fan_out.start()
+      ...
+      # in the status callback's route
+      if fan_out.on_answered(request.form['CallSid']):
+        ...
+  """
+
+  def __init__(self, *, client, from_phone, to_phones, create_kwargs=None):
+    """
+      :param client: the `twilio.rest.Client`, ideally one whose
+         HTTP session is already connected
+
+      :param from_phone: the twilio number that calls
+      :param to_phones: the numbers to call, all at once
+
+      :param create_kwargs: the further kwargs of every `client.calls.create`,
+         e.g. its `url` and `status_callback`
+    """
+
+    assert to_phones, 'there must be at least 1 phone to call'
+
+    self.client = client
+    self.from_phone = from_phone
+    self.to_phones = list(to_phones)
+    self.create_kwargs = create_kwargs or {}
+
+    self._lock = threading.Lock()
+    self._started_at = None
+    self._to_phones_by_call_sid = {}
+    self._answered_call_sid = None
+    self._ended_call_sids = set()
+    self._end_futures = []
+
+    # seconds since `start`, per phone
+    self.queued_seconds = {}
+    self.ended_seconds = {}
+    self.answered_seconds = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tfrom_phone='{}',\n"
+        '\tto_phones={}\n'
+      ')._answered_call_sid={}'
+      ''.format(
+        CallFanOut.__name__,
+        self.from_phone,
+        self.to_phones,
+        self._answered_call_sid,
+      )
+    )
+
+  @property
+  def call_sids(self):
+    with self._lock:
+      return list(self._to_phones_by_call_sid)
+
+  @property
+  def answered_phone(self):
+    with self._lock:
+      return self._to_phones_by_call_sid.get(self._answered_call_sid)
+
+  def start(self):
+    """
+      Create every call concurrently, and wait for twilio to queue them
+
+      :return: self
+    """
+
+    self._started_at = time.monotonic()
+
+    futures = [
+      request_executor().submit(self._create_call, to_phone)
+      for to_phone in self.to_phones
+    ]
+    for future, to_phone in zip(futures, self.to_phones):
+      try:
+        future.result()
+      except Exception:
+        logging.exception('failed to call {}'.format(to_phone))
+
+    return self
+
+  def on_answered(self, call_sid):
+    """
+      Handle twilio's status callback of `call_sid` having been answered
+
+      Both the status callback and the fetch of the answered call's TwiML
+        report the answer, in either order, so the first answer's own
+        repeated reports are True too, and end nothing
+
+      The other calls are hung up in the background, since this is called
+        from the webhooks whose TwiML the answerer waits for; see
+        `wait_for_ended`
+
+      :return: True if `call_sid` is the first answer, which gets the
+        doorbell; False if another call was answered first, in which
+        case `call_sid` is hung up
+    """
+
+    with self._lock:
+      if call_sid == self._answered_call_sid:
+        return True
+
+      is_first_answer = self._answered_call_sid is None
+      if is_first_answer:
+        self._answered_call_sid = call_sid
+        self.answered_seconds = time.monotonic() - self._started_at
+        call_sids_to_end = [
+          other_call_sid
+          for other_call_sid in self._to_phones_by_call_sid
+          if other_call_sid != call_sid
+        ]
+      else:
+        call_sids_to_end = [call_sid]
+
+    if is_first_answer:
+      logging.info('{} answered the doorbell after {:.3f}s'.format(
+        self._to_phones_by_call_sid.get(call_sid),
+        self.answered_seconds,
+      ))
+
+    self._end_calls(call_sids_to_end, wait=False)
+    return is_first_answer
+
+  def cancel(self):
+    """
+      End every call that hasn't been answered first,
+        e.g. since the visitor has gone
+
+      :return: None
+    """
+
+    with self._lock:
+      call_sids_to_end = [
+        call_sid
+        for call_sid in self._to_phones_by_call_sid
+        if call_sid != self._answered_call_sid
+      ]
+    self._end_calls(call_sids_to_end, wait=True)
+
+  def wait_for_ended(self):
+    """
+      Wait for every hang-up that `on_answered` has started so far
+
+      :return: None
+    """
+
+    with self._lock:
+      futures = list(self._end_futures)
+    for future in futures:
+      future.result()
+
+  def _create_call(self, to_phone):
+    call = self.client.calls.create(
+      to=to_phone,
+      from_=self.from_phone,
+      **self.create_kwargs
+    )
+
+    with self._lock:
+      self._to_phones_by_call_sid[call.sid] = to_phone
+      self.queued_seconds[to_phone] = time.monotonic() - self._started_at
+      # another phone answered before this call was even queued
+      is_too_late = self._answered_call_sid not in (None, call.sid)
+
+    if is_too_late:
+      self._end_call(call.sid)
+
+    return call
+
+  def _end_calls(self, call_sids, *, wait):
+    futures = [
+      request_executor().submit(self._end_call, call_sid)
+      for call_sid in call_sids
+    ]
+    if not wait:
+      with self._lock:
+        self._end_futures.extend(futures)
+      return
+
+    for future in futures:
+      future.result()
+
+  def _end_call(self, call_sid):
+    with self._lock:
+      if call_sid in self._ended_call_sids:
+        return
+      self._ended_call_sids.add(call_sid)
+
+    # a ringing call is canceled, but one that was answered must be completed
+    for status in ('canceled', 'completed'):
+      try:
+        self.client.calls(call_sid).update(status=status)
+      except Exception as e:
+        last_exception = e
+      else:
+        break
+    else:
+      logging.warning('failed to end call {}: {!r}'.format(call_sid, last_exception))
+      return
+
+    with self._lock:
+      self.ended_seconds[self._to_phones_by_call_sid.get(call_sid)] = time.monotonic() - self._started_at
@@ -0,0 +1,246 @@
+"""
+  Runs the doorbell detectors of several intercoms, each listening to its
+    own input device, in one process, rather than a process per intercom
+    that each holds its own interpreter, aubio and service connections
+
+  Each detector listens on its own thread, and a `CallbackMicrophone` also
+    captures on its own callback thread, so a stall in one intercom's
+    detection doesn't hold up the others; pitch detection is short compared
+    with a block, so the threads share the GIL comfortably
+"""
+
+import logging
+import threading
+import time
+
+from lib.energy_gate import EnergyGate
+
+
+class DeviceCapture:
+  """
+    The listening thread of a single detector, and its metrics
+  """
+
+  def __init__(self, *, name, detector):
+    self.name = name
+    self.detector = detector
+
+    self.num_rings = 0
+    self.last_ring_at = None
+    self.error = None
+
+    self._thread = None
+    self._started_at = None
+    self._final_cpu_seconds = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tname='{}',\n"
+        '\tdetector={}\n'
+      ')'
+      ''.format(
+        DeviceCapture.__name__,
+        self.name,
+        str(self.detector).replace('\n', '\n\t'),
+      )
+    )
+
+  @property
+  def is_alive(self):
+    return self._thread is not None and self._thread.is_alive()
+
+  def start(self, *, on_ring, cooldown_seconds, stop_event):
+    self._thread = threading.Thread(
+      target=self._listen,
+      kwargs={'on_ring': on_ring, 'cooldown_seconds': cooldown_seconds, 'stop_event': stop_event},
+      name='capture-{}'.format(self.name),
+      daemon=True,
+    )
+    self._started_at = time.monotonic()
+    self._thread.start()
+
+  def join(self, timeout=None):
+    if self._thread is not None:
+      self._thread.join(timeout)
+
+  def summary(self):
+    """
+      :return: a dict of this device's metrics: its rings, the audio it has
+        read, how far behind the live audio it is, the CPU that its thread
+        has used, and its stream's, and any energy gate's, counters
+    """
+
+    audio_stream = self.detector.audio_stream
+    audio_seconds = audio_stream.num_seconds_read
+    cpu_seconds = self._cpu_seconds()
+
+    summary = {
+      'num_rings': self.num_rings,
+      'last_ring_at': self.last_ring_at,
+      'is_alive': self.is_alive,
+      'error': None if self.error is None else repr(self.error),
+      'num_blocks_read': audio_stream.num_blocks_read,
+      'audio_seconds': audio_seconds,
+      'lag_seconds': (
+        None
+        if self._started_at is None
+        else max(time.monotonic() - self._started_at - audio_seconds, 0.0)
+      ),
+      'cpu_seconds': cpu_seconds,
+      'cpu_fraction': cpu_seconds / audio_seconds if cpu_seconds is not None and audio_seconds else None,
+    }
+
+    # the counters of `Microphone` and `CallbackMicrophone`
+    for attribute in ('num_overflows', 'num_underruns', 'num_buffer_overflows'):
+      if hasattr(audio_stream, attribute):
+        summary[attribute] = getattr(audio_stream, attribute)
+
+    audio_pitch = getattr(self.detector, 'audio_pitch', None)
+    if isinstance(audio_pitch, EnergyGate):
+      summary['duty_cycle'] = audio_pitch.duty_cycle
+
+    return summary
+
+  def _listen(self, *, on_ring, cooldown_seconds, stop_event):
+    def on_device_ring():
+      self.num_rings += 1
+      self.last_ring_at = time.time()
+      on_ring(self.name)
+
+    try:
+      self.detector.listen(
+        on_ring=on_device_ring,
+        cooldown_seconds=cooldown_seconds,
+        stop_event=stop_event,
+      )
+    except Exception as e:
+      # e.g. a device that was unplugged, which mustn't stop the other devices
+      self.error = e
+      logging.exception("capture of '{}' failed".format(self.name))
+    finally:
+      self._final_cpu_seconds = time.thread_time()
+
+  def _cpu_seconds(self):
+    """
+      :return: the CPU seconds used by this device's listening thread,
+        or None where a thread's CPU clock isn't available
+    """
+
+    if self._final_cpu_seconds is not None:
+      return self._final_cpu_seconds
+
+    thread = self._thread
+    if thread is None or thread.ident is None or not hasattr(time, 'pthread_getcpuclockid'):
+      return None
+
+    try:
+      return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except OSError:
+      # the thread exited after the check
+      return self._final_cpu_seconds
+
+
+class CaptureManager:
+  """
+    Listens with several doorbell detectors at once, one thread each,
+      e.g. one per intercom, each with a `Microphone(device=...)`
+
+    Usage example:
+
+      manager = CaptureManager(detectors={
+        'front': AiPhoneGT1A(audio_stream=CallbackMicrophone(device='USB Audio')),
+        'back': AiPhoneGT1A(audio_stream=CallbackMicrophone(device=3)),
+      })
+      manager.run(on_ring=lambda name: print('{} is ringing'.format(name)))
+  """
+
+  def __init__(self, *, detectors, cooldown_seconds=10, log_interval_seconds=None):
+    """
+      :param detectors: a dict of device name -> the `DoorbellDetector`
+         that listens to it; each detector's stream must be its own
+
+      :param cooldown_seconds: passed to each detector's `listen`
+
+      :param log_interval_seconds: if set, how often the per-device
+         metrics are logged while running
+    """
+
+    assert len({id(detector.audio_stream) for detector in detectors.values()}) == len(detectors), (
+      'every detector must have its own audio stream'
+    )
+
+    self.cooldown_seconds = cooldown_seconds
+    self.log_interval_seconds = log_interval_seconds
+
+    self.devices = {
+      name: DeviceCapture(name=name, detector=detector)
+      for name, detector in detectors.items()
+    }
+    self._stop_event = threading.Event()
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tdevices={},\n'
+        '\tcooldown_seconds={},\n'
+        '\tlog_interval_seconds={}\n'
+      ')'
+      ''.format(
+        CaptureManager.__name__,
+        sorted(self.devices),
+        self.cooldown_seconds,
+        self.log_interval_seconds,
+      )
+    )
+
+  def run(self, *, on_ring):
+    """
+      Listen on every device until `stop()` is called or every device's
+        stream has ended, or failed
+
+      :param on_ring: called with the device's name each time a ring is
+         detected, on that device's thread
+
+      :return: the `summary()` once every device has stopped
+    """
+
+    self._stop_event.clear()
+    for device in self.devices.values():
+      device.start(
+        on_ring=on_ring,
+        cooldown_seconds=self.cooldown_seconds,
+        stop_event=self._stop_event,
+      )
+      logging.info("started capturing '{}'".format(device.name))
+
+    wait_seconds = self.log_interval_seconds or 1.0
+    while any(device.is_alive for device in self.devices.values()):
+      if self._stop_event.wait(wait_seconds):
+        break
+      if self.log_interval_seconds is not None:
+        logging.info('capture summary: {}'.format(self.summary()))
+
+    for device in self.devices.values():
+      device.join()
+
+    summary = self.summary()
+    logging.info('stopped capturing; summary: {}'.format(summary))
+    return summary
+
+  def stop(self):
+    """
+      Stop every device within a block; safe to call from any thread,
+        e.g. a signal handler
+
+      :return: None
+    """
+
+    self._stop_event.set()
+
+  def summary(self):
+    """
+      :return: a dict of device name -> its `DeviceCapture.summary()`
+    """
+
+    return {name: self.devices[name].summary() for name in sorted(self.devices)}
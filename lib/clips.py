@@ -0,0 +1,323 @@
+"""
+  Keeps the last seconds of a stream, and its pitch confidences, so that a
+    clip of every detection, or of any moment on demand, can be written for
+    reviewing false positives and tuning the thresholds against
+
+  The detection loop only ever copies its latest block into a preallocated
+    buffer; the clips are copied out of the buffer, and written, by a
+    background writer thread
+"""
+
+from collections import deque
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+
+class ClipRecorder:
+  """
+    A circular buffer of the last `buffer_seconds` of `audio_stream`'s
+      blocks, and their confidences, and the writer of clips out of it
+
+    A clip, requested by `request_clip`, spans `pre_roll_seconds` before the
+      request to `post_roll_seconds` after it; once its post-roll has been
+      pushed, the clip's block range is queued for the writer thread, which
+      copies it out of the buffer and writes `<name>.wav`, or `.flac`, along
+      with `<name>.json` of the clip's confidence trace
+
+    The buffer isn't locked, so `buffer_seconds` must leave the writer time
+      to copy a clip before its blocks are overwritten; the writer checks,
+      after copying, and drops the clip, with a warning, if they were
+
+    Usage example:
+
+      with ClipRecorder(audio_stream, dir_path='clips') as clip_recorder:
+        detector = AiPhoneGT1A(audio_stream=audio_stream, clip_recorder=clip_recorder)
+        detector.listen(on_ring=...)
+  """
+
+  def __init__(
+    self,
+    audio_stream,
+    *,
+    dir_path,
+    buffer_seconds=30.0,
+    pre_roll_seconds=10.0,
+    post_roll_seconds=3.0,
+    clip_format='wav',
+    max_queued_clips=8,
+  ):
+    """
+      :param audio_stream: the `Stream` whose blocks are pushed
+      :param dir_path: the directory that the clips are written to
+
+      :param buffer_seconds: the seconds of audio that are kept, which
+         must exceed a clip's pre-roll and post-roll by a few seconds
+
+      :param pre_roll_seconds: the seconds of audio before the request
+      :param post_roll_seconds: the seconds of audio after the request
+
+      :param clip_format: 'wav', or 'flac', which requires `soundfile`
+
+      :param max_queued_clips: the number of clips that can wait for the
+         writer before newer clips are dropped, rather than waited for
+    """
+
+    assert buffer_seconds > pre_roll_seconds + post_roll_seconds, (
+      "kwarg 'buffer_seconds' must exceed the pre-roll and post-roll, but found {} <= {} + {}"
+      ''.format(buffer_seconds, pre_roll_seconds, post_roll_seconds)
+    )
+    assert clip_format in ('wav', 'flac'), (
+      "kwarg 'clip_format' must be 'wav' or 'flac', but found '{}'".format(clip_format)
+    )
+
+    self.audio_stream = audio_stream
+    self.dir_path = dir_path
+    self.buffer_seconds = buffer_seconds
+    self.pre_roll_seconds = pre_roll_seconds
+    self.post_roll_seconds = post_roll_seconds
+    self.clip_format = clip_format
+    self.max_queued_clips = max_queued_clips
+
+    blocks_per_second = audio_stream.sample_rate / audio_stream.block_size
+    self._num_pre_roll_blocks = int(round(pre_roll_seconds * blocks_per_second))
+    self._num_post_roll_blocks = int(round(post_roll_seconds * blocks_per_second))
+
+    num_buffered_blocks = int(np.ceil(buffer_seconds * blocks_per_second))
+    self._blocks = np.zeros((num_buffered_blocks, audio_stream.block_size), dtype=np.float32)
+    self._confidences = np.zeros(num_buffered_blocks, dtype=np.float64)
+    self._num_pushed = 0
+
+    # requests, from any thread, that `push` turns into clips
+    self._requests = deque()
+    # clips whose post-roll hasn't been pushed yet, only touched by `push`'s thread
+    self._pending_clips = []
+
+    self._clip_queue = None
+    self._writer_thread = None
+
+    self.num_clips_written = 0
+    self.num_clips_dropped = 0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tdir_path='{}',\n"
+        '\tbuffer_seconds={},\n'
+        '\tpre_roll_seconds={},\n'
+        '\tpost_roll_seconds={},\n'
+        "\tclip_format='{}',\n"
+        '\tmax_queued_clips={}\n'
+      ')._num_clips_written={},\n'
+      '._num_clips_dropped={}'
+      ''.format(
+        ClipRecorder.__name__,
+        self.dir_path,
+        self.buffer_seconds,
+        self.pre_roll_seconds,
+        self.post_roll_seconds,
+        self.clip_format,
+        self.max_queued_clips,
+        self.num_clips_written,
+        self.num_clips_dropped,
+      )
+    )
+
+  def open(self):
+    assert self._writer_thread is None, 'the clip recorder is already open'
+
+    os.makedirs(self.dir_path, exist_ok=True)
+    self._clip_queue = queue.Queue(maxsize=self.max_queued_clips)
+    self._writer_thread = threading.Thread(target=self._write_clips, name='clip-writer', daemon=True)
+    self._writer_thread.start()
+
+  def __enter__(self):
+    self.open()
+    return self
+
+  def close(self):
+    """
+      Queue the pending clips, with whatever post-roll they have, and
+        wait for the writer to write every queued clip
+
+      :return: None
+    """
+
+    assert self._writer_thread is not None, 'the clip recorder is not open'
+
+    self.flush()
+    self._clip_queue.put(None)
+    self._writer_thread.join()
+
+    self._writer_thread = None
+    self._clip_queue = None
+
+  def __exit__(self, *args, **kwargs):
+    self.close()
+
+  def push(self, block, confidence):
+    """
+      Keep `block`, and its pitch `confidence`, and queue the clips
+        whose post-roll it completes; called by the detection loop
+
+      :return: None
+    """
+
+    index = self._num_pushed % len(self._blocks)
+    np.copyto(self._blocks[index], block)
+    self._confidences[index] = confidence
+    self._num_pushed += 1
+
+    while self._requests:
+      self._start_clip(*self._requests.popleft())
+
+    while self._pending_clips and self._pending_clips[0]['end'] <= self._num_pushed:
+      self._queue_clip(self._pending_clips.pop(0))
+
+  def request_clip(self, label, *, metadata=None):
+    """
+      Request a clip around the latest block pushed; safe to call from any thread
+
+      :param label: the name of the clip's cause, e.g. 'ring_cycle' or 'on_demand'
+      :param metadata: an optional json-able dict that's added to the sidecar json
+
+      :return: None
+    """
+
+    self._requests.append((label, metadata, time.time(), self._num_pushed))
+
+  @property
+  def num_post_roll_blocks_pending(self):
+    """
+      :return: the number of blocks that are still to be pushed before
+        every clip requested so far has the whole of its post-roll
+    """
+
+    ends = [clip['end'] for clip in self._pending_clips]
+    ends.extend(request[-1] + self._num_post_roll_blocks for request in list(self._requests))
+    return max((end - self._num_pushed for end in ends), default=0)
+
+  def flush(self):
+    """
+      Queue every pending clip now, with whatever post-roll it has so far,
+        e.g. since the stream is being closed
+
+      :return: None
+    """
+
+    while self._requests:
+      self._start_clip(*self._requests.popleft())
+
+    for clip in self._pending_clips:
+      clip['end'] = min(clip['end'], self._num_pushed)
+      self._queue_clip(clip)
+
+    self._pending_clips = []
+
+  def _start_clip(self, label, metadata, requested_at, request_index):
+    self._pending_clips.append({
+      'label': label,
+      'metadata': metadata,
+      'requested_at': requested_at,
+      'request_index': request_index,
+      'start': max(0, request_index - self._num_pre_roll_blocks, self._num_pushed - len(self._blocks)),
+      'end': request_index + self._num_post_roll_blocks,
+    })
+
+  def _queue_clip(self, clip):
+    try:
+      self._clip_queue.put_nowait(clip)
+    except queue.Full:
+      self.num_clips_dropped += 1
+      logging.warning("dropped the '{}' clip since the clip writer is behind".format(clip['label']))
+
+  def _write_clips(self):
+    while True:
+      clip = self._clip_queue.get()
+      if clip is None:
+        break
+
+      try:
+        self._write_clip(clip)
+      except Exception:
+        self.num_clips_dropped += 1
+        logging.exception("failed to write the '{}' clip".format(clip['label']))
+
+  def _write_clip(self, clip):
+    start, end = clip['start'], clip['end']
+    indices = np.arange(start, end) % len(self._blocks)
+    samples = self._blocks[indices].reshape(-1)
+    confidences = self._confidences[indices]
+
+    # the push thread may have overwritten the oldest blocks while they were copied
+    if self._num_pushed - start > len(self._blocks):
+      self.num_clips_dropped += 1
+      logging.warning("dropped the '{}' clip since its audio was overwritten before it was copied".format(
+        clip['label'],
+      ))
+      return
+
+    block_seconds = self.audio_stream.block_size / self.audio_stream.sample_rate
+    name = '{}_{}_{}'.format(
+      time.strftime('%Y%m%dT%H%M%S', time.gmtime(clip['requested_at'])),
+      clip['label'],
+      clip['request_index'],
+    )
+    audio_path = os.path.join(self.dir_path, '{}.{}'.format(name, self.clip_format))
+
+    if self.clip_format == 'flac':
+      _write_flac(audio_path, samples, sample_rate=self.audio_stream.sample_rate)
+    else:
+      write_wav(audio_path, samples, sample_rate=self.audio_stream.sample_rate)
+
+    with open(os.path.join(self.dir_path, '{}.json'.format(name)), 'w') as json_file:
+      json.dump(
+        {
+          'label': clip['label'],
+          'metadata': clip['metadata'],
+          'requested_at': clip['requested_at'],
+          'audio_file_name': os.path.basename(audio_path),
+          'sample_rate': self.audio_stream.sample_rate,
+          'block_size': self.audio_stream.block_size,
+          # stream times, in seconds, as `Stream.num_seconds_read` counts them
+          'start_seconds': start * block_seconds,
+          'request_seconds': clip['request_index'] * block_seconds,
+          'end_seconds': end * block_seconds,
+          # one per block, of the block that ends `block_size` samples later
+          'confidences': confidences.tolist(),
+        },
+        json_file,
+        indent=2,
+      )
+      json_file.write('\n')
+
+    self.num_clips_written += 1
+    logging.info("wrote the '{}' clip to '{}'".format(clip['label'], audio_path))
+
+
+def write_wav(file_path, samples, *, sample_rate):
+  """
+    Write mono float samples, in [-1, 1], as a 16-bit PCM WAV file
+
+    :return: None
+  """
+
+  pcm = np.round(np.clip(samples, -1, 1) * 32767).astype('<i2')
+  with wave.open(file_path, 'wb') as wav_file:
+    wav_file.setnchannels(1)
+    wav_file.setsampwidth(2)
+    wav_file.setframerate(sample_rate)
+    wav_file.writeframes(pcm.tobytes())
+
+
+def _write_flac(file_path, samples, *, sample_rate):
+  # imported here since FLAC clips are optional, and the only use of `soundfile`
+  import soundfile
+
+  soundfile.write(file_path, samples, sample_rate, subtype='PCM_16')
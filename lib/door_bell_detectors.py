@@ -1,9 +1,16 @@
 from abc import ABC, abstractmethod
-from collections import deque
+import asyncio
+from contextlib import contextmanager
 import logging
+import math
 import time
 
-from lib.audio import Pitch
+from lib.audio import File, Pitch
+from lib.batch_detection import read_blocks
+from lib.energy_gate import EnergyGate
+from lib.instrumentation import DETECTOR_FEED, INSTRUMENTATION
+from lib.sliding_window import SlidingWindow
+from lib.tone_energy import learn_tone_frequencies, ToneEnergy
 
 
 class DoorbellDetector(ABC):
@@ -36,6 +43,16 @@ class DoorbellDetector(ABC):
     """
     pass
 
+  @abstractmethod
+  def iter_rings(self, *, cooldown_seconds=10, stop_event=None):
+    """
+      Iterate over the audio stream, detecting ring after ring, until
+        the stream ends or `stop_event` is set
+
+      :return: a generator of a `RingEvent` per ring detected
+    """
+    pass
+
 
 class AiPhoneGT1A(DoorbellDetector):
   """
@@ -49,11 +66,14 @@ class AiPhoneGT1A(DoorbellDetector):
     *args,
     min_ringing_confidence=0.45,
     max_ringing_confidence=0.75,
-    pitch_confidences_per_second=86,
+    pitch_confidences_per_second=None,
     ringing_seconds=1.8,
     gap_seconds=1.8,
     max_wait_gap_multiple=2,
     max_wait_subsequent_ring_multiple=2,
+    pitch_kwargs=None,
+    energy_gate_kwargs=None,
+    clip_recorder=None,
     **kwargs
   ):
     """
@@ -67,7 +87,9 @@ class AiPhoneGT1A(DoorbellDetector):
          of confidence values that is considered as ringing
 
       :param pitch_confidences_per_second: the number of
-         `pitch_confidences` that cover 1 second of audio
+         `pitch_confidences` that cover 1 second of audio; if None then
+         it's derived from the pitch's effective sample rate and hop size,
+         which is about 86 for 512 sample blocks of 44.1kHz audio
 
       :param ringing_seconds: the number of seconds that the audio
          must have an average pitch confidence within the min<->max
@@ -87,22 +109,66 @@ class AiPhoneGT1A(DoorbellDetector):
           allow `gap_seconds * max_wait_gap_multiple` seconds
           for a ring to be detected subsequent to the detection of a
           single ring followed by a single gap
+
+      :param pitch_kwargs: optional kwargs to pass to Pitch(),
+          e.g. to select its `model` or `decimated_sample_rate`
+
+      :param energy_gate_kwargs: if not None then the pitch is put behind
+          an `EnergyGate`, created with these kwargs, so that the blocks
+          of a silent intercom skip the pitch detection
+
+      :param clip_recorder: an optional, open, `ClipRecorder` of this
+          detector's `audio_stream`, that keeps every block, and its
+          confidence, and writes a clip of every ring cycle detected; the
+          stream is read on, before it's closed, until every clip has its
+          post-roll, so e.g. `is_ringing` returns that much later
     """
     
     super().__init__(*args, **kwargs)
     
     self.min_ringing_confidence = min_ringing_confidence
     self.max_ringing_confidence = max_ringing_confidence
-    self.pitch_confidences_per_second = pitch_confidences_per_second
     self.ringing_seconds = ringing_seconds
     self.gap_seconds = gap_seconds
     self.max_wait_gap_multiple = max_wait_gap_multiple
     self.max_wait_subsequent_ring_multiple = max_wait_subsequent_ring_multiple
+    self.clip_recorder = clip_recorder
     
-    self.audio_pitch = Pitch(
-      audio_stream=self.audio_stream,
+    self.audio_pitch = self._new_audio_pitch(pitch_kwargs or {})
+    if energy_gate_kwargs is not None:
+      self.audio_pitch = EnergyGate(self.audio_pitch, **energy_gate_kwargs)
+    self.pitch_confidences_per_second = (
+      self.audio_pitch.confidences_per_second
+      if pitch_confidences_per_second is None
+      else pitch_confidences_per_second
+    )
+
+    # the windows are reused, via `SlidingWindow.reset`, by every state of `feed_one`,
+    #   so that feeding confidences doesn't allocate
+    self._ring_window = SlidingWindow(
+      size=int(self.pitch_confidences_per_second * self.ringing_seconds),
+      track_extrema=False,
+    )
+    self._gap_window = SlidingWindow(
+      size=int(self.pitch_confidences_per_second * self.gap_seconds),
+      track_extrema=False,
     )
 
+    self._stop_event = None
+
+    self._state = None
+    self._window = None
+    self._max_wait_seconds_fed = None
+    self._phase_start_index = None
+    # the (start index, end index, window average, min, max, sum, count) of each
+    #   phase of the ring cycle detected so far, and of the last ring cycle detected
+    self._detected_phases = []
+    self._ring_cycle_phases = None
+    self._num_confidences_fed = 0
+    # the window average that the last confidence fed was compared against the thresholds with
+    self.avg_confidence = None
+    self.reset()
+
   def __repr__(self):
     return (
       '{}(\n'
@@ -118,7 +184,7 @@ class AiPhoneGT1A(DoorbellDetector):
       ')'
       ''.format(
         AiPhoneGT1A.__name__,
-        super().__str__().replace('\n', '\n\t'),
+        super().__repr__().replace('\n', '\n\t'),
         self.audio_pitch.__str__().replace('\n', '\n\t'),
         self.min_ringing_confidence,
         self.max_ringing_confidence,
@@ -130,146 +196,658 @@ class AiPhoneGT1A(DoorbellDetector):
       )
     )
 
-  def is_ringing(self):
+  def _new_audio_pitch(self, pitch_kwargs):
+    """
+      :return: the source of the confidence of every block, which
+        subclasses can replace, e.g. with a `ToneEnergy`
+    """
+    return Pitch(audio_stream=self.audio_stream, **pitch_kwargs)
+
+  @contextmanager
+  def _opened(self):
     with self.audio_stream:
       logging.info('opened audio stream of {}'.format(self.audio_stream))
       with self.audio_pitch:
         logging.info('opened audio pitch of {}'.format(self.audio_pitch))
-        while not self.audio_stream.is_depleted:
-          if self._is_ringing():
-            logging.info('THE RING HAS BEEN DETECTED')
-            logging.info('audio_stream={}'.format(self.audio_stream))
-            return True
-          
+        try:
+          yield
+          if self.clip_recorder is not None:
+            self._fill_post_rolls()
+        finally:
+          if self.clip_recorder is not None:
+            # the stream is closing, so the post-roll of any pending clip won't grow
+            self.clip_recorder.flush()
+
+  def _fill_post_rolls(self):
+    """
+      Keep reading the stream, e.g. after `is_ringing` returns, until every
+        pending clip has its whole post-roll, or the stream ends or is stopped
+    """
+
+    if self._is_stopped() or not self.clip_recorder.num_post_roll_blocks_pending:
+      return
+
+    for _ in self._iter_confidences():
+      if not self.clip_recorder.num_post_roll_blocks_pending:
+        break
+
+  def is_ringing(self):
+    with self._opened():
+      return self._wait_for_ring()
+
+  def listen(self, *, on_ring, cooldown_seconds=10, stop_event=None):
+    """
+      Detect ring after ring, keeping the audio stream and pitch open
+        for the whole time, until the stream ends or `stop_event` is set
+
+      :param on_ring: called with no arguments each time a ring is detected
+
+      :param cooldown_seconds: the number of seconds of audio, after
+         a ring is detected, that are consumed without detecting,
+         so that a single visitor's ringing isn't reported repeatedly
+
+      :param stop_event: an optional `threading.Event` that, once set,
+         stops the listening within a block
+
+      :return: the number of rings that were detected
+    """
+
+    num_rings = 0
+    for _ in self.iter_rings(cooldown_seconds=cooldown_seconds, stop_event=stop_event):
+      num_rings += 1
+      on_ring()
+
+    logging.info('stopped listening after {} ring(s)'.format(num_rings))
+    return num_rings
+
+  def iter_rings(self, *, cooldown_seconds=10, stop_event=None):
+    """
+      The generator equivalent of `listen`, which yields a `RingEvent`, of
+        the offsets and confidences of its rings and gap, per ring cycle
+
+      :param cooldown_seconds: see `listen`
+      :param stop_event: see `listen`
+    """
+
+    self._stop_event = stop_event
+
+    try:
+      with self._opened():
+        while self._wait_for_ring():
+          yield self._new_ring_event()
+          if cooldown_seconds:
+            self._skip_seconds(cooldown_seconds)
+    finally:
+      self._stop_event = None
+
+  async def aiter_ring_cycles(self, *, executor=None, stop_event=None):
+    """
+      The asyncio equivalent of `listen`, without a cooldown: keeps the audio
+        stream and pitch open and yields a `DetectorEvent` for every ring cycle
+
+      Opening, reading, via `Stream.aiter_read`, and pitch detection block, so
+        they run in `executor`, or the event loop's default executor if None;
+        only the state machine runs on the event loop
+
+      :param stop_event: an optional `asyncio.Event` that, once set,
+         stops the iteration within a block
+    """
+
+    loop = asyncio.get_running_loop()
+
+    opened = self._opened()
+    await loop.run_in_executor(executor, opened.__enter__)
+    try:
+      self.reset()
+      async for _ in self.audio_stream.aiter_read(executor=executor):
+        if stop_event is not None and stop_event.is_set():
+          break
+
+        confidence = await loop.run_in_executor(executor, self._process_confidence)
+        event = self.feed_one(confidence)
+        if event is not None and event.kind == DetectorEvent.RING_CYCLE:
+          logging.info('THE RING HAS BEEN DETECTED')
+          yield event
+    finally:
+      await loop.run_in_executor(executor, opened.__exit__, None, None, None)
+
+  def _process_confidence(self):
+    """
+      Compute the pitch confidence of the block just read, and keep it for any clip
+
+      :return: the pitch confidence
+    """
+
+    self.audio_pitch.process_data()
+    confidence = self.audio_pitch.confidence
+    if self.clip_recorder is not None:
+      self.clip_recorder.push(self.audio_stream.data, confidence)
+
+    return confidence
+
+  def _wait_for_ring(self):
+    """
+      :return: True when a ring is detected
+               or False if the stream ends, or is stopped, before a ring is detected
+    """
+
+    self.reset()
+    for confidence in self._iter_confidences():
+      event = self.feed_one(confidence)
+      if event is not None and event.kind == DetectorEvent.RING_CYCLE:
+        logging.info('THE RING HAS BEEN DETECTED')
+        logging.info('audio_stream={}'.format(self.audio_stream))
+        logging.info('audio_pitch={}'.format(self.audio_pitch))
+        return True
+
+    logging.info('stream ended, or was stopped, before a ring was detected')
     return False
+
+  def _skip_seconds(self, seconds):
+    """
+      Consume `seconds` of audio, as measured by the stream's clock,
+        while still feeding the pitch detection so that it stays primed
+    """
+
+    skip_until_seconds_read = self.audio_stream.num_seconds_read + seconds
+    for _ in self._iter_confidences():
+      if self.audio_stream.num_seconds_read >= skip_until_seconds_read:
+        break
+
+  def _is_stopped(self):
+    return self._stop_event is not None and self._stop_event.is_set()
   
-  def _is_ringing(self):
+  def _iter_confidences(self):
+    for _ in self.audio_stream.iter_read():
+      yield self._process_confidence()
+
+      if self._is_stopped():
+        break
+
+      if INSTRUMENTATION.enabled:
+        INSTRUMENTATION.maybe_log()
+
+  def reset(self):
+    """
+      Re-arm the state machine, so that the next confidence fed
+        starts the search for a new ring cycle
+
+      :return: None
     """
+
+    self._num_confidences_fed = 0
+    self.avg_confidence = None
+    self._enter_state(_WAITING_FOR_RING)
+
+  def feed(self, confidences):
+    """
+      Push pitch confidences through the ring -> gap -> ring state machine
+
       This is the high level algorithm:
-        Iterate over pitch confidences and detect a full "ring cycle"
+        Detect a full "ring cycle" from the stream of pitch confidences
       A "ring cycle" is <ringing> <pause> <ringing>
+
+      :param confidences: an iterable of pitch confidences, one per block
+         of `audio_stream`, in the order they were computed
+      :return: a list of the `DetectorEvent`s that the confidences triggered
     """
-  
-    return (
-      self._detect_single_ring()
-      and self._detect_single_gap(max_wait_seconds_multiple=self.max_wait_gap_multiple)
-      and self._detect_single_ring(max_wait_seconds_multiple=self.max_wait_subsequent_ring_multiple)
+
+    events = []
+    for confidence in confidences:
+      event = self.feed_one(confidence)
+      if event is not None:
+        events.append(event)
+
+    return events
+
+  def feed_one(self, confidence):
+    """
+      Push a single pitch confidence through the state machine
+
+      :return: the `DetectorEvent` triggered by `confidence`, if any, else None
+    """
+
+    if INSTRUMENTATION.enabled:
+      start = time.perf_counter()
+      event = self._feed_one(confidence)
+      INSTRUMENTATION.record(DETECTOR_FEED, time.perf_counter() - start)
+      return event
+
+    return self._feed_one(confidence)
+
+  def _feed_one(self, confidence):
+    self._num_confidences_fed += 1
+
+    window = self._window
+    window.push(confidence)
+    self.avg_confidence = avg_confidence = window.mean_for(
+      self.min_ringing_confidence,
+      self.max_ringing_confidence,
     )
-  
-  def _iter_confidences(self):
-    for _ in self.audio_stream.iter_read():
-      self.audio_pitch.process_data()
-      yield self.audio_pitch.confidence
-  
-  def _detect_single_ring(self, max_wait_seconds_multiple=None):
+    is_in_ringing_range = (
+      self.min_ringing_confidence <= avg_confidence <= self.max_ringing_confidence
+    )
+
+    state = self._state
+    if state == _WAITING_FOR_GAP:
+      is_detected = not is_in_ringing_range
+    else:
+      is_detected = is_in_ringing_range
+
+    if is_detected:
+      kind, next_state = _TRANSITIONS_ON_DETECTION[state]
+    elif (
+      self._max_wait_seconds_fed is not None
+      and self.num_seconds_fed >= self._max_wait_seconds_fed
+    ):
+      kind, next_state = DetectorEvent.TIMED_OUT, _WAITING_FOR_RING
+    else:
+      return None
+
+    event = DetectorEvent(
+      kind=kind,
+      confidence_index=self._num_confidences_fed - 1,
+      avg_confidence=avg_confidence,
+    )
+    logging.info('{} while {}'.format(event, state))
+
+    if kind != DetectorEvent.TIMED_OUT:
+      self._detect_phase(window)
+
+    if kind == DetectorEvent.RING_CYCLE and self.clip_recorder is not None:
+      self.clip_recorder.request_clip('ring_cycle', metadata={
+        'avg_confidence': avg_confidence,
+        'min_ringing_confidence': self.min_ringing_confidence,
+        'max_ringing_confidence': self.max_ringing_confidence,
+      })
+
+    self._enter_state(next_state)
+    return event
+
+  def _detect_phase(self, window):
+    """
+      Keep the span, and the confidences, of the phase that `window` just detected
+    """
+
+    num_values = min(window.num_pushed, window.size)
+    values = window.values()[-num_values:]
+    end_index = self._num_confidences_fed - 1
+
+    self._detected_phases.append((
+      max(self._phase_start_index, end_index + 1 - window.size),
+      end_index,
+      window.mean,
+      min(values),
+      max(values),
+      math.fsum(values),
+      num_values,
+    ))
+
+    if len(self._detected_phases) == 3:
+      self._ring_cycle_phases = self._detected_phases
+
+  def _new_ring_event(self):
     """
-      Iterate pitch confidences and detect when ringing is heard
+      :return: the `RingEvent` of the last ring cycle detected
+    """
+
+    block_size = self.audio_stream.block_size
+    # the confidences fed since the last `reset()` are the latest blocks read
+    block_offset = self.audio_stream.num_blocks_read - self._num_confidences_fed
+    ring, gap, subsequent_ring = self._ring_cycle_phases
+
+    return RingEvent(
+      sample_rate=self.audio_stream.sample_rate,
+      ring_samples=_sample_span(ring, block_offset=block_offset, block_size=block_size),
+      gap_samples=_sample_span(gap, block_offset=block_offset, block_size=block_size),
+      subsequent_ring_samples=_sample_span(subsequent_ring, block_offset=block_offset, block_size=block_size),
+      ring_confidence=ring[2],
+      gap_confidence=gap[2],
+      subsequent_ring_confidence=subsequent_ring[2],
+      min_confidence=min(phase[3] for phase in self._ring_cycle_phases),
+      max_confidence=max(phase[4] for phase in self._ring_cycle_phases),
+      mean_confidence=(
+        sum(phase[5] for phase in self._ring_cycle_phases)
+        / sum(phase[6] for phase in self._ring_cycle_phases)
+      ),
+    )
+
+  @property
+  def num_seconds_fed(self):
+    """
+      :return: the seconds of audio covered by the confidences fed since
+        the last `reset()`, computed the same way as `Stream.num_seconds_read`
+    """
+
+    num_samples_fed = self.audio_stream.block_size * self._num_confidences_fed
+    return num_samples_fed / self.audio_stream.sample_rate
+
+  def _enter_state(self, state):
+    """
+      Start detecting the phase of the ring cycle that `state` waits for
 
       A ring being detected means that the audio, at some point,
          has an average pitch confidence within the min<->max
          confidence range, over a period of `ringing_seconds`
 
-      :param max_wait_seconds_multiple: optional param that, if set, will
-        cause the detection to abort if we reach:
-          start_time + ringing_seconds * max_wait_seconds_multiple
+      A gap being detected means that the audio, at some point,
+         has an average pitch confidence outside the min<->max
+         confidence range, over a period of `gap_seconds`
 
-      :return: True if a ring is detected else False
+      The gap, and the subsequent ring, must be detected within
+         `max_wait_gap_multiple * gap_seconds` and
+         `max_wait_subsequent_ring_multiple * ringing_seconds`
+         seconds of audio, respectively, or the cycle times out;
+         the wait is measured on the stream's own clock, rather than the
+         wall clock, so that a `File` replayed faster than real time times
+         out at the same point in the audio as a live `Microphone` would
     """
 
-    if max_wait_seconds_multiple is None:
-      max_wait_time = None
+    if state == _WAITING_FOR_RING:
+      window, fill_value, max_wait_seconds = self._ring_window, 0.0, None
+    elif state == _WAITING_FOR_GAP:
+      window = self._gap_window
+      fill_value = (self.min_ringing_confidence + self.max_ringing_confidence) / 2
+      max_wait_seconds = self.gap_seconds * self.max_wait_gap_multiple
     else:
-      max_wait_time = time.time() + self.ringing_seconds * max_wait_seconds_multiple
-  
-    num_confidences_to_average = int(self.pitch_confidences_per_second * self.ringing_seconds)
-    dq = deque(
-      (0 for _ in range(num_confidences_to_average)),
-      maxlen=num_confidences_to_average
+      window, fill_value = self._ring_window, 0.0
+      max_wait_seconds = self.ringing_seconds * self.max_wait_subsequent_ring_multiple
+
+    window.reset(fill_value=fill_value)
+    if state == _WAITING_FOR_RING:
+      self._detected_phases = []
+
+    self._state = state
+    self._phase_start_index = self._num_confidences_fed
+    self._window = window
+    self._max_wait_seconds_fed = (
+      None
+      if max_wait_seconds is None
+      else self.num_seconds_fed + max_wait_seconds
     )
-  
-    for pitch_confidence in self._iter_confidences():
-      dq.append(pitch_confidence)
-      avg_confidence = sum(dq) / num_confidences_to_average
-      
-      if self.min_ringing_confidence <= avg_confidence <= self.max_ringing_confidence:
-        logging.info(
-          "RING RING for _detect_single_ring(max_wait_seconds_multiple={})"
-          ''.format(max_wait_seconds_multiple)
-        )
-        ret = True
-        break
-      if max_wait_time and (time.time() >= max_wait_time):
-        logging.info(
-          "_detect_single_ring(max_wait_seconds_multiple={}) timed out"
-          ''.format(max_wait_seconds_multiple)
-        )
-        ret = False
-        break
-    else:
-      logging.info(
-        "_detect_single_ring(max_wait_seconds_multiple={}) stream ended"
-        ''.format(max_wait_seconds_multiple)
-      )
-      ret = False
 
-    logging.info(self.audio_stream)
-    logging.info(self.audio_pitch)
-    
-    return ret
-  
-  def _detect_single_gap(self, max_wait_seconds_multiple=None):
+
+class AiPhoneGT1ATone(AiPhoneGT1A):
+  """
+    Detect the ring from an Aiphone GT-1A intercom by the fraction of the
+      audio's energy at the ring's tone frequencies, via `ToneEnergy`,
+      rather than by YIN's pitch confidence
+
+    The ring -> gap -> ring cadence is detected exactly as `AiPhoneGT1A`
+      does, at a small fraction of the per-block cost
+  """
+
+  def __init__(
+    self,
+    *args,
+    tone_frequencies=None,
+    tone_sample_file_path=None,
+    num_tones=1,
+    min_ringing_confidence=0.15,
+    max_ringing_confidence=1.0,
+    pitch_kwargs=None,
+    **kwargs
+  ):
     """
-      Iterate pitch confidences and detect when ringing is *not* heard
+      :param args:   The args   to pass to AiPhoneGT1A()
+      :param kwargs: The kwargs to pass to AiPhoneGT1A()
 
-      A gap being detected means that the audio, at some point,
-         has an average pitch confidence outside the min<->max
-         confidence range, over a period of `gap_seconds`
+      :param tone_frequencies: the frequencies, in Hz, of the ring's tone
+
+      :param tone_sample_file_path: if `tone_frequencies` is None then
+         they're learned from the recording of a ring at this path
 
-      :param max_wait_seconds_multiple: optional param that, if set, will
-        cause the detection to abort if we reach:
-          start_time + gap_seconds * max_wait_seconds_multiple
+      :param num_tones: the number of frequencies to learn
+
+      :param min_ringing_confidence: the minimum end of the range
+         of tone energy fractions that is considered as ringing
+
+      :param max_ringing_confidence: the maximum end of the range
+         of tone energy fractions that is considered as ringing
 
-      :return: True if a gap is detected else False
+      :param pitch_kwargs: must be None, since there's no `Pitch` to pass them to
     """
-  
-    if max_wait_seconds_multiple is None:
-      max_wait_time = None
-    else:
-      max_wait_time = time.time() + self.gap_seconds * max_wait_seconds_multiple
-  
-    average_ring_confidence = (self.min_ringing_confidence + self.max_ringing_confidence) / 2
-  
-    num_confidences_to_average = int(self.pitch_confidences_per_second * self.gap_seconds)
-    dq = deque(
-      (average_ring_confidence for _ in range(num_confidences_to_average)),
-      maxlen=num_confidences_to_average
+
+    assert pitch_kwargs is None, (
+      "kwarg 'pitch_kwargs' isn't supported by {}, which detects by `ToneEnergy`, "
+      'but found {}'.format(AiPhoneGT1ATone.__name__, pitch_kwargs)
     )
-  
-    for pitch_confidence in self._iter_confidences():
-      dq.append(pitch_confidence)
-      avg_confidence = sum(dq) / num_confidences_to_average
-      if not (self.min_ringing_confidence <= avg_confidence <= self.max_ringing_confidence):
-        logging.info(
-          "GAP GAP for _detect_single_gap(max_wait_seconds_multiple={})"
-          ''.format(max_wait_seconds_multiple)
-        )
-        ret = True
-        break
-      if max_wait_time and (time.time() >= max_wait_time):
-        logging.info(
-          "_detect_single_gap(max_wait_seconds_multiple={}) timed out"
-          ''.format(max_wait_seconds_multiple)
-        )
-        ret = False
-        break
-    else:
-      logging.info(
-        "_detect_single_gap(max_wait_seconds_multiple={}) stream ended"
-        ''.format(max_wait_seconds_multiple)
+    assert (tone_frequencies is None) != (tone_sample_file_path is None), (
+      "must specify exactly 1 of kwarg 'tone_frequencies' or 'tone_sample_file_path'"
+    )
+
+    self.tone_sample_file_path = tone_sample_file_path
+    self.num_tones = num_tones
+    self._tone_frequencies = tone_frequencies
+
+    super().__init__(
+      *args,
+      min_ringing_confidence=min_ringing_confidence,
+      max_ringing_confidence=max_ringing_confidence,
+      **kwargs
+    )
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\t{},\n'
+        "\ttone_sample_file_path='{}',\n"
+        '\tnum_tones={}\n'
+      ')'
+      ''.format(
+        AiPhoneGT1ATone.__name__,
+        super().__repr__().replace('\n', '\n\t'),
+        self.tone_sample_file_path,
+        self.num_tones,
+      )
+    )
+
+  def _new_audio_pitch(self, pitch_kwargs):
+    tone_frequencies = self._tone_frequencies
+    if tone_frequencies is None:
+      tone_frequencies = self._learn_tone_frequencies()
+      logging.info('learned the tone frequencies {} from {}'.format(
+        tone_frequencies,
+        self.tone_sample_file_path,
+      ))
+
+    return ToneEnergy(
+      self.audio_stream,
+      tone_frequencies=tone_frequencies,
+    )
+
+  def _learn_tone_frequencies(self):
+    sample_file = File(
+      file_path=self.tone_sample_file_path,
+      sample_rate=self.audio_stream.sample_rate,
+      block_size=self.audio_stream.block_size,
+    )
+    return learn_tone_frequencies(
+      read_blocks(sample_file).reshape(-1),
+      sample_rate=sample_file.sample_rate,
+      num_tones=self.num_tones,
+    )
+
+
+class DetectorEvent:
+  """
+    Something that a detector's state machine noticed in its input
+  """
+
+  RING = 'ring'
+  GAP = 'gap'
+  RING_CYCLE = 'ring_cycle'
+  TIMED_OUT = 'timed_out'
+
+  __slots__ = (
+    'kind',
+    'confidence_index',
+    'avg_confidence',
+  )
+
+  def __init__(self, *, kind, confidence_index, avg_confidence):
+    """
+      :param kind: one of RING, GAP, RING_CYCLE or TIMED_OUT
+
+      :param confidence_index: the index, counted from the detector's last
+         `reset()`, of the confidence that triggered the event
+
+      :param avg_confidence: the window average at the time of the event
+    """
+
+    self.kind = kind
+    self.confidence_index = confidence_index
+    self.avg_confidence = avg_confidence
+
+  def __repr__(self):
+    return (
+      "{}(kind='{}', confidence_index={}, avg_confidence={:.3f})"
+      ''.format(
+        DetectorEvent.__name__,
+        self.kind,
+        self.confidence_index,
+        self.avg_confidence,
+      )
+    )
+
+
+class RingEvent:
+  """
+    A ring cycle that a detector detected, with where, in its stream, each
+      of its phases was detected, and the pitch confidences that it was
+      detected from, e.g. for the latency from the ring's onset to its
+      detection, or for clipping the ring out of a recording
+
+    The offsets count the samples of the stream since it was opened, and
+      are accurate to the block, since the detector only sees whole blocks;
+      a phase spans the window that averaged within, or, for the gap,
+      outside, the ringing range, cut off at the end of the previous phase
+  """
+
+  __slots__ = (
+    'sample_rate',
+    'ring_start_sample',
+    'ring_end_sample',
+    'gap_start_sample',
+    'gap_end_sample',
+    'subsequent_ring_start_sample',
+    'subsequent_ring_end_sample',
+    'ring_confidence',
+    'gap_confidence',
+    'subsequent_ring_confidence',
+    'min_confidence',
+    'max_confidence',
+    'mean_confidence',
+    'detected_at',
+  )
+
+  def __init__(
+    self,
+    *,
+    sample_rate,
+    ring_samples,
+    gap_samples,
+    subsequent_ring_samples,
+    ring_confidence,
+    gap_confidence,
+    subsequent_ring_confidence,
+    min_confidence,
+    max_confidence,
+    mean_confidence,
+    detected_at=None,
+  ):
+    """
+      :param ring_samples: the (start, end) sample offsets of the first ring
+      :param gap_samples: the (start, end) sample offsets of the gap
+      :param subsequent_ring_samples: the (start, end) sample offsets of
+         the subsequent ring, whose end is when the ring cycle was detected
+
+      :param ring_confidence: the window average that detected the first ring
+      :param gap_confidence: the window average that detected the gap
+      :param subsequent_ring_confidence: the window average that detected the subsequent ring
+
+      :param min_confidence: the min of the confidences of the phases
+      :param max_confidence: the max of the confidences of the phases
+      :param mean_confidence: the mean of the confidences of the phases
+
+      :param detected_at: the `time.time()` of the detection, defaults to now
+    """
+
+    self.sample_rate = sample_rate
+    self.ring_start_sample, self.ring_end_sample = ring_samples
+    self.gap_start_sample, self.gap_end_sample = gap_samples
+    self.subsequent_ring_start_sample, self.subsequent_ring_end_sample = subsequent_ring_samples
+    self.ring_confidence = ring_confidence
+    self.gap_confidence = gap_confidence
+    self.subsequent_ring_confidence = subsequent_ring_confidence
+    self.min_confidence = min_confidence
+    self.max_confidence = max_confidence
+    self.mean_confidence = mean_confidence
+    self.detected_at = time.time() if detected_at is None else detected_at
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tring_samples=({}, {}),\n'
+        '\tgap_samples=({}, {}),\n'
+        '\tsubsequent_ring_samples=({}, {}),\n'
+        '\tconfidences=({:.3f}, {:.3f}, {:.3f}),\n'
+        '\tmin_confidence={:.3f},\n'
+        '\tmax_confidence={:.3f},\n'
+        '\tmean_confidence={:.3f}\n'
+      ').latency_seconds={:.3f}'
+      ''.format(
+        RingEvent.__name__,
+        self.ring_start_sample,
+        self.ring_end_sample,
+        self.gap_start_sample,
+        self.gap_end_sample,
+        self.subsequent_ring_start_sample,
+        self.subsequent_ring_end_sample,
+        self.ring_confidence,
+        self.gap_confidence,
+        self.subsequent_ring_confidence,
+        self.min_confidence,
+        self.max_confidence,
+        self.mean_confidence,
+        self.latency_seconds,
       )
-      ret = False
+    )
+
+  @property
+  def detection_sample(self):
+    return self.subsequent_ring_end_sample
+
+  @property
+  def start_seconds(self):
+    return self.ring_start_sample / self.sample_rate
+
+  @property
+  def detection_seconds(self):
+    """
+      :return: the stream time of the detection, as `Stream.num_seconds_read` counts it
+    """
+    return self.detection_sample / self.sample_rate
+
+  @property
+  def latency_seconds(self):
+    """
+      :return: the seconds of audio from the onset of the first ring to the detection
+    """
+    return (self.detection_sample - self.ring_start_sample) / self.sample_rate
+
+
+def _sample_span(phase, *, block_offset, block_size):
+  start_index, end_index = phase[:2]
+  return (block_offset + start_index) * block_size, (block_offset + end_index + 1) * block_size
+
 
-    logging.info(self.audio_stream)
-    logging.info(self.audio_pitch)
+_WAITING_FOR_RING = 'waiting for ring'
+_WAITING_FOR_GAP = 'waiting for gap'
+_WAITING_FOR_SUBSEQUENT_RING = 'waiting for subsequent ring'
 
-    return ret
+_TRANSITIONS_ON_DETECTION = {
+  _WAITING_FOR_RING: (DetectorEvent.RING, _WAITING_FOR_GAP),
+  _WAITING_FOR_GAP: (DetectorEvent.GAP, _WAITING_FOR_SUBSEQUENT_RING),
+  _WAITING_FOR_SUBSEQUENT_RING: (DetectorEvent.RING_CYCLE, _WAITING_FOR_RING),
+}
@@ -0,0 +1,301 @@
+"""
+  A cheap RMS/peak gate in front of the pitch detection, so that the blocks
+    of an idle intercom, i.e. almost all of them, skip YIN entirely
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from lib.audio import Pitch
+
+
+class EnergyGate:
+  """
+    Takes the place of a `audio.Pitch`, or `ToneEnergy`, and only passes
+      the blocks whose level is above the background noise on to it; every
+      other block has a confidence of 0
+
+    The gate opens when a block's RMS is `open_db`, or its peak is
+      `peak_open_db`, above its noise floor, and closes once the RMS has been less than `close_db`
+      above its floor for `hold_seconds`; the noise floors follow the levels
+      of the blocks while the gate is closed, falling over
+      `floor_fall_seconds` and rising over the longer `floor_rise_seconds`,
+      so that they settle near the quietest blocks of the room
+
+    While closed, the last `pre_roll_seconds` of blocks are kept and, when
+      the gate opens, replayed through the pitch before the opening block,
+      so that the pitch's buffer holds the onset; for a `audio.Pitch`, the
+      pre-roll is at least the blocks of its buffer, e.g. 8 blocks by
+      default or 12 when decimated to 8kHz, so that every confidence of an
+      open block is exactly what it'd have been without the gate
+
+    Usage example:
+
+      with EnergyGate(Pitch(audio_stream)) as gated_pitch:
+        for _ in audio_stream.iter_read():
+          gated_pitch.process_data()
+          print(gated_pitch.confidence)
+        print(gated_pitch.duty_cycle)
+  """
+
+  def __init__(
+    self,
+    pitch,
+    *,
+    open_db=3.0,
+    close_db=1.5,
+    peak_open_db=10.0,
+    hold_seconds=0.25,
+    pre_roll_seconds=0.1,
+    floor_fall_seconds=0.5,
+    floor_rise_seconds=10.0,
+    min_rms=1e-4,
+  ):
+    """
+      :param pitch: the `audio.Pitch`, or `ToneEnergy`, of the gated blocks
+
+      :param open_db: the decibels above the noise floor that open the gate
+      :param close_db: the decibels above the noise floor that keep it open
+
+      :param peak_open_db: the decibels above the peak's noise floor that
+         open the gate, e.g. for an onset late in a block, whose RMS is
+         diluted; it's higher than `open_db` since the peak of noise
+         fluctuates far more than its RMS
+
+      :param hold_seconds: the seconds of audio below `close_db`
+         after which the gate closes, which bridges the ring's warble
+
+      :param pre_roll_seconds: the seconds of audio, before the gate
+         opens, that are replayed through the pitch; it's rounded up to
+         the blocks of a `audio.Pitch`'s buffer
+
+      :param floor_fall_seconds: the time constant, in seconds of audio,
+         of the noise floors' fall
+      :param floor_rise_seconds: the time constant, in seconds of audio,
+         of the noise floors' rise
+
+      :param min_rms: the RMS below which the gate never opens,
+         e.g. for the digital silence of a muted microphone
+    """
+
+    assert close_db <= open_db, (
+      "kwarg 'close_db' must be at most 'open_db', but found {} > {}".format(close_db, open_db)
+    )
+
+    self.pitch = pitch
+    self.audio_stream = pitch.audio_stream
+    self.open_db = open_db
+    self.close_db = close_db
+    self.peak_open_db = peak_open_db
+    self.hold_seconds = hold_seconds
+    self.pre_roll_seconds = pre_roll_seconds
+    self.floor_fall_seconds = floor_fall_seconds
+    self.floor_rise_seconds = floor_rise_seconds
+    self.min_rms = min_rms
+
+    block_seconds = self.audio_stream.block_size / self.audio_stream.sample_rate
+    self._open_ratio = 10 ** (open_db / 20)
+    self._close_ratio = 10 ** (close_db / 20)
+    self._peak_open_ratio = 10 ** (peak_open_db / 20)
+    self._num_hold_blocks = int(math.ceil(hold_seconds / block_seconds))
+    self._floor_fall = min(1.0, block_seconds / floor_fall_seconds)
+    self._floor_rise = min(1.0, block_seconds / floor_rise_seconds)
+
+    num_pre_roll_blocks = int(math.ceil(pre_roll_seconds / block_seconds))
+    if isinstance(pitch, Pitch):
+      # the blocks that make up the pitch's buffer, and, when decimated, flush its resampler's history
+      num_pre_roll_blocks = max(num_pre_roll_blocks, int(math.ceil(pitch.buf_size / pitch.hop_size)))
+    self._pre_roll = np.zeros((num_pre_roll_blocks, self.audio_stream.block_size), dtype=np.float32)
+
+    self.reset()
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tpitch={},\n'
+        '\topen_db={},\n'
+        '\tclose_db={},\n'
+        '\tpeak_open_db={},\n'
+        '\thold_seconds={},\n'
+        '\tpre_roll_seconds={},\n'
+        '\tfloor_fall_seconds={},\n'
+        '\tfloor_rise_seconds={},\n'
+        '\tmin_rms={}\n'
+      ')._num_open_blocks={}/{}'
+      ''.format(
+        EnergyGate.__name__,
+        str(self.pitch).replace('\n', '\n\t'),
+        self.open_db,
+        self.close_db,
+        self.peak_open_db,
+        self.hold_seconds,
+        self.pre_roll_seconds,
+        self.floor_fall_seconds,
+        self.floor_rise_seconds,
+        self.min_rms,
+        self.num_open_blocks,
+        self.num_blocks,
+      )
+    )
+
+  @property
+  def confidences_per_second(self):
+    return self.pitch.confidences_per_second
+
+  @property
+  def duty_cycle(self):
+    """
+      :return: the fraction of the blocks, since the gate was
+        opened or reset, that were passed on to the pitch
+    """
+    return self.num_open_blocks / self.num_blocks if self.num_blocks else 0.0
+
+  def reset(self):
+    """
+      Forget the noise floor, the pre-roll and the duty cycle
+
+      :return: None
+    """
+
+    self.num_blocks = 0
+    self.num_open_blocks = 0
+
+    self._is_gate_open = False
+    self._num_blocks_below_close = 0
+    self._rms_floor = None
+    self._peak_floor = None
+    self._num_pre_roll_blocks = 0
+    self._next_pre_roll_index = 0
+
+  def open(self):
+    self.reset()
+    self.pitch.open()
+
+  def __enter__(self):
+    self.open()
+    return self
+
+  def close(self):
+    logging.info('the energy gate passed {} of {} blocks, a duty cycle of {:.3%}'.format(
+      self.num_open_blocks,
+      self.num_blocks,
+      self.duty_cycle,
+    ))
+    self.pitch.close()
+
+  def __exit__(self, *args, **kwargs):
+    self.close()
+
+  def process_data(self):
+    self.process_block(self.audio_stream.data)
+
+  def process_block(self, data):
+    was_gate_open = self._is_gate_open
+    if self._update(data):
+      if not was_gate_open:
+        self._replay_pre_roll()
+      self.pitch.process_block(data)
+      self.num_open_blocks += 1
+    else:
+      self._push_pre_roll(data)
+
+  @property
+  def confidence(self):
+    return self.pitch.confidence if self._is_gate_open else 0.0
+
+  def is_open_of(self, blocks, *, state=None):
+    """
+      The batch equivalent of whether `process_block` would pass each block on,
+        which leaves this gate's noise floors, hold and pre-roll untouched
+
+      :param blocks: a float32 array of shape (num_blocks, block_size)
+      :param state: the state returned from the previous call, if `blocks`
+         follow its blocks, e.g. for chunks of a file, or None to start
+         a new stream
+
+      :return: (a bool array of shape (num_blocks,), the state after `blocks`)
+    """
+
+    if state is None:
+      state = self._new_state()
+    is_open = np.fromiter((state._update(block) for block in blocks), dtype=bool, count=len(blocks))
+    return is_open, state
+
+  def _new_state(self):
+    """
+      :return: a closed gate of the same settings and pitch, whose noise floors,
+        hold and pre-roll are its own
+    """
+
+    return EnergyGate(
+      self.pitch,
+      open_db=self.open_db,
+      close_db=self.close_db,
+      peak_open_db=self.peak_open_db,
+      hold_seconds=self.hold_seconds,
+      pre_roll_seconds=self.pre_roll_seconds,
+      floor_fall_seconds=self.floor_fall_seconds,
+      floor_rise_seconds=self.floor_rise_seconds,
+      min_rms=self.min_rms,
+    )
+
+  def _update(self, data):
+    """
+      Update the gate, and the noise floor, with the level of the block `data`
+
+      :return: whether the gate is open for `data`
+    """
+
+    rms = math.sqrt(float(np.dot(data, data)) / len(data))
+    peak = max(float(data.max()), -float(data.min()))
+    self.num_blocks += 1
+
+    if self._rms_floor is None:
+      self._rms_floor, self._peak_floor = rms, peak
+
+    rms_ratio = rms / max(self._rms_floor, 1e-12)
+    peak_ratio = peak / max(self._peak_floor, 1e-12)
+    is_loud = rms >= self.min_rms
+
+    if self._is_gate_open:
+      if is_loud and rms_ratio >= self._close_ratio:
+        self._num_blocks_below_close = 0
+      else:
+        self._num_blocks_below_close += 1
+        self._is_gate_open = self._num_blocks_below_close < self._num_hold_blocks
+    else:
+      self._is_gate_open = is_loud and (
+        rms_ratio >= self._open_ratio or peak_ratio >= self._peak_open_ratio
+      )
+      self._num_blocks_below_close = 0
+
+    if not self._is_gate_open:
+      self._rms_floor = _follow(self._rms_floor, rms, fall=self._floor_fall, rise=self._floor_rise)
+      self._peak_floor = _follow(self._peak_floor, peak, fall=self._floor_fall, rise=self._floor_rise)
+
+    return self._is_gate_open
+
+  def _push_pre_roll(self, data):
+    if not len(self._pre_roll):
+      return
+
+    np.copyto(self._pre_roll[self._next_pre_roll_index], data)
+    self._next_pre_roll_index = (self._next_pre_roll_index + 1) % len(self._pre_roll)
+    self._num_pre_roll_blocks = min(self._num_pre_roll_blocks + 1, len(self._pre_roll))
+
+  def _replay_pre_roll(self):
+    num_blocks = self._num_pre_roll_blocks
+    for i in range(self._next_pre_roll_index - num_blocks, self._next_pre_roll_index):
+      self.pitch.process_block(self._pre_roll[i % len(self._pre_roll)])
+
+    self._num_pre_roll_blocks = 0
+
+
+def _follow(floor, level, *, fall, rise):
+  """
+    :return: the noise floor after a block of `level`, having moved
+      `fall`, or `rise`, of the way towards it
+  """
+  return floor + (fall if level <= floor else rise) * (level - floor)
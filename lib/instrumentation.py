@@ -0,0 +1,247 @@
+"""
+  Optional, low-overhead latency instrumentation of the detection hot path
+
+  Instrumented code checks `INSTRUMENTATION.enabled` before reading the
+    clock, so that when it's disabled, which is the default, the cost is
+    a single attribute lookup per stage
+
+  Usage example:
+
+    INSTRUMENTATION.enable(log_interval_seconds=60)
+    ...
+    INSTRUMENTATION.summary()
+"""
+
+from bisect import bisect_right
+import logging
+import time
+
+STREAM_READ = 'stream.read'
+STREAM_LAG = 'stream.lag'
+PITCH_PROCESS_DATA = 'pitch.process_data'
+PITCH_CONFIDENCE = 'pitch.confidence'
+DETECTOR_FEED = 'detector.feed_one'
+
+# the stages whose time is spent processing, rather than waiting for, audio
+PROCESSING_STAGES = (
+  PITCH_PROCESS_DATA,
+  PITCH_CONFIDENCE,
+  DETECTOR_FEED,
+)
+
+
+class LatencyHistogram:
+  """
+    Counts durations into fixed, log-spaced buckets, so that recording
+      a duration never allocates
+  """
+
+  def __init__(self, *, min_seconds=1e-6, max_seconds=10.0, buckets_per_decade=4):
+    self.min_seconds = min_seconds
+    self.max_seconds = max_seconds
+    self.buckets_per_decade = buckets_per_decade
+
+    # `_upper_bounds[i]` is the exclusive upper bound of bucket i,
+    #   and the last bucket catches everything above `max_seconds`
+    self._upper_bounds = []
+    upper_bound = min_seconds
+    while upper_bound < max_seconds * (1 + 1e-9):
+      self._upper_bounds.append(upper_bound)
+      upper_bound *= 10 ** (1 / buckets_per_decade)
+
+    self._counts = [0] * (len(self._upper_bounds) + 1)
+    self._count = 0
+    self._total_seconds = 0.0
+    self._max_seconds_seen = 0.0
+    # the wall clock time, rather than monotonic, so that it's comparable across processes
+    self.first_recorded_at = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tmin_seconds={},\n'
+        '\tmax_seconds={},\n'
+        '\tbuckets_per_decade={}\n'
+      ')._count={}'
+      ''.format(
+        LatencyHistogram.__name__,
+        self.min_seconds,
+        self.max_seconds,
+        self.buckets_per_decade,
+        self._count,
+      )
+    )
+
+  def record(self, seconds):
+    if not self._count:
+      self.first_recorded_at = time.time()
+    self._counts[bisect_right(self._upper_bounds, seconds)] += 1
+    self._count += 1
+    self._total_seconds += seconds
+    if seconds > self._max_seconds_seen:
+      self._max_seconds_seen = seconds
+
+  def reset(self):
+    for i in range(len(self._counts)):
+      self._counts[i] = 0
+    self._count = 0
+    self._total_seconds = 0.0
+    self._max_seconds_seen = 0.0
+    self.first_recorded_at = None
+
+  @property
+  def count(self):
+    return self._count
+
+  @property
+  def total_seconds(self):
+    return self._total_seconds
+
+  def percentile(self, fraction):
+    """
+      :param fraction: e.g. 0.99 for the 99th percentile
+      :return: the upper bound of the bucket holding the percentile,
+        capped at the max, or None if nothing was recorded
+    """
+
+    if not self._count:
+      return None
+
+    num_to_reach = fraction * self._count
+    cumulative_count = 0
+    for i, count in enumerate(self._counts):
+      cumulative_count += count
+      if cumulative_count >= num_to_reach:
+        break
+
+    if i < len(self._upper_bounds):
+      # a bucket's upper bound can be above every duration in it
+      return min(self._upper_bounds[i], self._max_seconds_seen)
+    return self._max_seconds_seen
+
+  def summary(self):
+    """
+      :return: a dict of summary statistics, in seconds
+    """
+
+    return {
+      'count': self._count,
+      'mean': self._total_seconds / self._count if self._count else None,
+      'p50': self.percentile(0.5),
+      'p99': self.percentile(0.99),
+      'max': self._max_seconds_seen if self._count else None,
+    }
+
+
+class Instrumentation:
+  def __init__(self):
+    self.enabled = False
+    self.log_interval_seconds = None
+
+    self._histograms = {}
+    self._audio_seconds = 0.0
+    self._next_log_at = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tenabled={},\n'
+        '\tlog_interval_seconds={}\n'
+      ')._audio_seconds={}'
+      ''.format(
+        Instrumentation.__name__,
+        self.enabled,
+        self.log_interval_seconds,
+        self._audio_seconds,
+      )
+    )
+
+  def enable(self, *, log_interval_seconds=None):
+    """
+      :param log_interval_seconds: if set then `maybe_log` logs the
+         summary at most once per this many seconds
+      :return: None
+    """
+
+    self.log_interval_seconds = log_interval_seconds
+    self._next_log_at = (
+      None
+      if log_interval_seconds is None
+      else time.monotonic() + log_interval_seconds
+    )
+    self.enabled = True
+
+  def disable(self):
+    self.enabled = False
+
+  def reset(self):
+    for histogram in self._histograms.values():
+      histogram.reset()
+    self._audio_seconds = 0.0
+
+  def histogram(self, stage):
+    """
+      :return: the histogram of `stage`, which is created on first use
+    """
+
+    histogram = self._histograms.get(stage)
+    if histogram is None:
+      histogram = self._histograms[stage] = LatencyHistogram()
+    return histogram
+
+  def record(self, stage, seconds):
+    self.histogram(stage).record(seconds)
+
+  def add_audio_seconds(self, seconds):
+    """
+      Account for `seconds` more audio having been read, which is
+        what the real time factor is relative to
+    """
+    self._audio_seconds += seconds
+
+  @property
+  def real_time_factor(self):
+    """
+      :return: the seconds spent processing, by `PROCESSING_STAGES`,
+        per second of audio read; above 1 means the detector can't keep up
+    """
+
+    if not self._audio_seconds:
+      return None
+
+    processing_seconds = sum(
+      self._histograms[stage].total_seconds
+      for stage in PROCESSING_STAGES
+      if stage in self._histograms
+    )
+    return processing_seconds / self._audio_seconds
+
+  def summary(self):
+    """
+      :return: a dict of the real time factor and each stage's latency summary
+    """
+
+    return {
+      'audio_seconds': self._audio_seconds,
+      'real_time_factor': self.real_time_factor,
+      'stages': {
+        stage: histogram.summary()
+        for stage, histogram in sorted(self._histograms.items())
+      },
+    }
+
+  def maybe_log(self):
+    """
+      Log the summary if `log_interval_seconds` have passed since it was last logged
+
+      :return: None
+    """
+
+    if self._next_log_at is None or time.monotonic() < self._next_log_at:
+      return
+
+    self._next_log_at = time.monotonic() + self.log_interval_seconds
+    logging.info('instrumentation summary: {}'.format(self.summary()))
+
+
+INSTRUMENTATION = Instrumentation()
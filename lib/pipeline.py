@@ -0,0 +1,248 @@
+"""
+  An asyncio pipeline that runs doorbell detection, the phone call
+    dispatch and the SwitchBot actions on one event loop
+
+    detector --(ring_queue)--> call dispatch
+    twilio webhooks --(action_queue)--> SwitchBot presses
+
+  When there are phones to call, the flask/SocketIO server of the twilio
+    webhooks is started next to the stages, on a thread of its own, and
+    routes the answered calls and the callers' keypresses to `request_action`
+
+  The blocking work of each stage runs in an executor: the audio stage
+    has a dedicated single thread, so that the stream and aubio are only
+    ever touched by one thread at a time
+
+  The twilio and SwitchBot services are imported and warmed up in the
+    default executor while the detector is already listening, rather
+    than before it starts
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+import logging
+import time
+
+
+class DoorbellPipeline:
+  """
+    Usage example:
+
+      pipeline = DoorbellPipeline(detector=detector, to_phones=['+15555555555'])
+      asyncio.run(pipeline.run())
+  """
+
+  ANSWER_DOORBELL = 'answer_doorbell'
+  UNLOCK_DOOR = 'unlock_door'
+
+  def __init__(
+    self,
+    *,
+    detector,
+    to_phones=None,
+    ring_queue_size=4,
+    action_queue_size=4,
+    warm_up_services=True,
+  ):
+    """
+      :param detector: the `DoorbellDetector` whose ring cycles are dispatched
+
+      :param to_phones: the phone numbers called, all at once, for each ring,
+         the first to answer getting the doorbell; or None to only log the rings
+
+      :param ring_queue_size: the number of detected rings that can wait
+         for the call dispatch before newer rings are dropped
+
+      :param action_queue_size: the number of SwitchBot actions that can
+         wait to be pressed before newer actions are dropped
+
+      :param warm_up_services: whether to warm up, in the background, the
+         services that the dispatch uses, so that the first ring or press
+         doesn't wait for them
+    """
+
+    self.detector = detector
+    self.to_phones = to_phones
+    self.ring_queue_size = ring_queue_size
+    self.action_queue_size = action_queue_size
+    self.warm_up_services = warm_up_services
+
+    self._loop = None
+    self._stop_event = None
+    self._ring_queue = None
+    self._action_queue = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tdetector={},\n'
+        '\tto_phones={},\n'
+        '\tring_queue_size={},\n'
+        '\taction_queue_size={},\n'
+        '\twarm_up_services={}\n'
+      ')'
+      ''.format(
+        DoorbellPipeline.__name__,
+        str(self.detector).replace('\n', '\n\t'),
+        self.to_phones,
+        self.ring_queue_size,
+        self.action_queue_size,
+        self.warm_up_services,
+      )
+    )
+
+  async def run(self):
+    """
+      Run every stage until `stop()` is called or the audio stream ends
+
+      :return: None
+    """
+
+    self._loop = asyncio.get_running_loop()
+    self._stop_event = asyncio.Event()
+    self._ring_queue = asyncio.Queue(maxsize=self.ring_queue_size)
+    self._action_queue = asyncio.Queue(maxsize=self.action_queue_size)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio') as audio_executor:
+      background_tasks = [
+        asyncio.create_task(self._dispatch_calls()),
+        asyncio.create_task(self._dispatch_actions()),
+      ]
+      if self.to_phones is not None:
+        background_tasks.append(asyncio.create_task(self._serve_webhooks()))
+      if self.warm_up_services:
+        background_tasks.extend(
+          asyncio.create_task(self._warm_up(module_name))
+          for module_name in self._service_module_names()
+        )
+
+      try:
+        await self._detect_rings(audio_executor)
+        # let the rings that were already detected be dispatched
+        await self._ring_queue.join()
+      finally:
+        for background_task in background_tasks:
+          background_task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+
+  def stop(self):
+    """
+      Stop the pipeline; safe to call from any thread, e.g. a signal handler
+
+      :return: None
+    """
+
+    if self._loop is not None:
+      self._loop.call_soon_threadsafe(self._stop_event.set)
+
+  def request_action(self, action):
+    """
+      Queue a SwitchBot press; safe to call from any thread,
+        e.g. a flask route that handles a twilio webhook
+
+      :param action: ANSWER_DOORBELL or UNLOCK_DOOR
+      :return: None
+    """
+
+    assert action in (DoorbellPipeline.ANSWER_DOORBELL, DoorbellPipeline.UNLOCK_DOOR), (
+      "unknown action '{}'".format(action)
+    )
+
+    self._loop.call_soon_threadsafe(_put_or_drop, self._action_queue, action)
+
+  def _service_module_names(self):
+    module_names = ['switchbot_buttons']
+    if self.to_phones is not None:
+      module_names.append('twilio_call')
+    return module_names
+
+  async def _warm_up(self, module_name):
+    started_at = time.monotonic()
+    try:
+      await self._loop.run_in_executor(None, _import_and_warm_up, module_name)
+    except Exception as e:
+      # not fatal, since the service is retried when it's first used
+      logging.warning("failed to warm up '{}': {!r}".format(module_name, e))
+    else:
+      logging.info("warmed up '{}' in {:.3f}s".format(module_name, time.monotonic() - started_at))
+
+  async def _serve_webhooks(self):
+    # imported here since importing flask and twilio is slow
+    from lib import twilio_call
+
+    twilio_call.set_action_requester(self.request_action)
+    try:
+      try:
+        # the server blocks its thread, which is a daemon, so it's started rather than awaited
+        await self._loop.run_in_executor(None, twilio_call.web_server_thread)
+      except Exception:
+        logging.exception('failed to serve the twilio webhooks')
+        return
+
+      logging.info('serving the twilio webhooks on port {}'.format(twilio_call.FLASK_PORT))
+      await self._stop_event.wait()
+    finally:
+      twilio_call.set_action_requester(None)
+
+  async def _detect_rings(self, audio_executor):
+    async for event in self.detector.aiter_ring_cycles(
+      executor=audio_executor,
+      stop_event=self._stop_event,
+    ):
+      _put_or_drop(self._ring_queue, event)
+
+  async def _dispatch_calls(self):
+    while True:
+      event = await self._ring_queue.get()
+      try:
+        await self._dispatch_call(event)
+      finally:
+        self._ring_queue.task_done()
+
+  async def _dispatch_call(self, event):
+    if self.to_phones is None:
+      logging.info('the doorbell is ringing: {}'.format(event))
+      return
+
+    # imported here since importing flask and twilio is slow,
+    #   though `_warm_up` has usually already done so
+    from lib import twilio_call
+
+    try:
+      fan_out = await self._loop.run_in_executor(None, twilio_call.doorbell_ring_all, self.to_phones)
+    except Exception:
+      logging.exception('failed to call {} for {}'.format(self.to_phones, event))
+    else:
+      logging.info('called {} for {}, queued after {}s'.format(self.to_phones, event, fan_out.queued_seconds))
+
+  async def _dispatch_actions(self):
+    while True:
+      action = await self._action_queue.get()
+
+      # imported here since importing `switchbot_buttons` requires bluetooth,
+      #   though `_warm_up` has usually already done so
+      from lib import switchbot_buttons
+
+      try:
+        await self._loop.run_in_executor(None, getattr(switchbot_buttons, action))
+      except Exception:
+        logging.exception("failed to press SwitchBot for '{}'".format(action))
+      else:
+        logging.info("pressed SwitchBot for '{}'".format(action))
+
+
+def _import_and_warm_up(module_name):
+  importlib.import_module('lib.{}'.format(module_name)).warm_up()
+
+
+def _put_or_drop(queue, item):
+  """
+    Never let a slow consumer stall a producer; in particular, the audio
+      stage must keep reading or the microphone overflows
+  """
+
+  try:
+    queue.put_nowait(item)
+  except asyncio.QueueFull:
+    logging.warning('dropped {} since the queue is full'.format(item))
@@ -0,0 +1,414 @@
+"""
+  Plots a recording's pitch and pitch confidence over time, overlaid with
+    what a doorbell detector made of it: the average of the ring or gap
+    window that it compared against its confidence thresholds, block by
+    block, and the rings and gaps it detected
+
+  The recording is streamed a chunk of blocks at a time, or read from a
+    `TraceCache`, and every series is reduced, as it streams, to a bounded
+    number of min/max buckets, so that a recording of any length is plotted
+    with the same memory, and, once its trace is cached, in about a second
+
+  Usage:
+    python -m lib.plotting --audio_file_path ring.wav
+    python -m lib.plotting --audio_file_path day.wav --trace_cache_dir_path traces --output_path day.png
+"""
+
+from argparse import ArgumentParser
+import logging
+import os
+
+from matplotlib.figure import Figure
+import numpy as np
+
+from lib import audio, batch_detection, door_bell_detectors
+from lib.calibration import load_detector_kwargs
+from lib.door_bell_detectors import DetectorEvent
+from lib.trace_cache import TraceCache
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-audio_file_path', '--audio_file_path', type=str, required=True)
+  arg_parser.add_argument('-output_path', '--output_path', type=str)
+  arg_parser.add_argument('-door_bell_detector', '--door_bell_detector', type=str, default='AiPhoneGT1A')
+  arg_parser.add_argument('-detector_kwargs_path', '--detector_kwargs_path', type=str)
+  arg_parser.add_argument('-trace_cache_dir_path', '--trace_cache_dir_path', type=str)
+  arg_parser.add_argument('-use_fast_model', '--use_fast_model', action='store_true')
+  arg_parser.add_argument('-num_points', '--num_points', type=int, default=2000)
+  arg_parser.add_argument('-log_level', '--log_level', type=str, default='WARNING')
+
+  kwargs = vars(arg_parser.parse_args())
+  kwargs['log_level'] = logging._checkLevel(kwargs['log_level'].upper())
+
+  return kwargs
+
+
+class MinMaxDecimator:
+  """
+    Reduces a stream of values, of unknown length, to the min and max of
+      each of between `num_buckets` and `2 * num_buckets` buckets of
+      consecutive values, which, unlike sampling every nth value, keeps
+      every spike visible
+
+    Every bucket holds `bucket_size` values; once there are `2 * num_buckets`
+      buckets, each pair is merged, and `bucket_size` is doubled
+
+    Usage example:
+
+      decimator = MinMaxDecimator(num_buckets=1000)
+      for chunk in chunks:
+        decimator.push(chunk)
+      starts, mins, maxs = decimator.buckets()
+  """
+
+  def __init__(self, *, num_buckets):
+    self.num_buckets = num_buckets
+    self.bucket_size = 1
+    self.num_values = 0
+
+    self._mins = np.empty(0, dtype=np.float64)
+    self._maxs = np.empty(0, dtype=np.float64)
+
+    # the min, max and number of values of the incomplete last bucket
+    self._partial_min = None
+    self._partial_max = None
+    self._partial_size = 0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tnum_buckets={}\n'
+      ').bucket_size={},\n'
+      '.num_values={}'
+      ''.format(
+        MinMaxDecimator.__name__,
+        self.num_buckets,
+        self.bucket_size,
+        self.num_values,
+      )
+    )
+
+  def push(self, values):
+    """
+      :param values: a 1-D array of the next values
+      :return: None
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    self.num_values += len(values)
+
+    while len(values):
+      if self._partial_size:
+        head = values[:self.bucket_size - self._partial_size]
+        values = values[len(head):]
+        self._extend_partial(head.min(), head.max(), len(head))
+        if self._partial_size == self.bucket_size:
+          self._partial_size = 0
+          self._append([self._partial_min], [self._partial_max])
+        continue
+
+      num_full_buckets = len(values) // self.bucket_size
+      if not num_full_buckets:
+        self._extend_partial(values.min(), values.max(), len(values))
+        break
+
+      # merging may double the bucket size, so the rest of the values are split anew
+      full = values[:num_full_buckets * self.bucket_size].reshape(num_full_buckets, self.bucket_size)
+      values = values[num_full_buckets * self.bucket_size:]
+      self._append(full.min(axis=1), full.max(axis=1))
+
+  def buckets(self):
+    """
+      :return: (the index, in the stream, of the first value of each bucket,
+        the min of each bucket, the max of each bucket), including the
+        incomplete last bucket, if any
+    """
+
+    mins, maxs = self._mins, self._maxs
+    if self._partial_size:
+      mins = np.append(mins, self._partial_min)
+      maxs = np.append(maxs, self._partial_max)
+
+    return np.arange(len(mins)) * self.bucket_size, mins, maxs
+
+  def _extend_partial(self, min_value, max_value, size):
+    if self._partial_size:
+      min_value = min(min_value, self._partial_min)
+      max_value = max(max_value, self._partial_max)
+
+    self._partial_min, self._partial_max = min_value, max_value
+    self._partial_size += size
+
+  def _append(self, mins, maxs):
+    self._mins = np.concatenate((self._mins, mins))
+    self._maxs = np.concatenate((self._maxs, maxs))
+
+    while len(self._mins) >= 2 * self.num_buckets:
+      if len(self._mins) % 2:
+        # the odd bucket out is merged into the incomplete last bucket, of twice the size
+        self._extend_partial(self._mins[-1], self._maxs[-1], self.bucket_size)
+        self._mins, self._maxs = self._mins[:-1], self._maxs[:-1]
+
+      self._mins = self._mins.reshape(-1, 2).min(axis=1)
+      self._maxs = self._maxs.reshape(-1, 2).max(axis=1)
+      self.bucket_size *= 2
+
+
+class PitchConfidenceSummary:
+  """
+    The decimated pitch, confidence and detector window averages of a
+      recording, and the rings, gaps and ring cycles that a detector detected in it
+  """
+
+  def __init__(self, detector, *, num_points=2000):
+    """
+      :param detector: an `AiPhoneGT1A`, whose thresholds and windows are overlaid
+      :param num_points: the number of min/max buckets of each series
+    """
+
+    self.detector = detector
+    self.num_points = num_points
+    self.block_seconds = detector.audio_stream.block_size / detector.audio_stream.sample_rate
+
+    self.ring_window_size = int(detector.pitch_confidences_per_second * detector.ringing_seconds)
+    self.gap_window_size = int(detector.pitch_confidences_per_second * detector.gap_seconds)
+
+    self.pitches = None
+    self.confidences = MinMaxDecimator(num_buckets=num_points)
+    # the `avg_confidence` of the detector after each confidence fed
+    self.window_averages = MinMaxDecimator(num_buckets=num_points)
+
+    # (kind, start seconds, end seconds) of every ring and gap detected
+    self.segments = []
+    # (kind, seconds) of every ring cycle detected, or timed out
+    self.markers = []
+
+    self.detector.reset()
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tnum_points={}\n'
+      ')._num_blocks={},\n'
+      '._num_segments={},\n'
+      '._num_markers={}'
+      ''.format(
+        PitchConfidenceSummary.__name__,
+        self.num_points,
+        self.confidences.num_values,
+        len(self.segments),
+        len(self.markers),
+      )
+    )
+
+  @property
+  def num_seconds(self):
+    return self.confidences.num_values * self.block_seconds
+
+  def push(self, pitches, confidences):
+    """
+      Add the trace of the next chunk of blocks
+
+      :param pitches: the pitch of each block, or None if there's no pitch
+      :param confidences: the confidence of each block
+
+      :return: None
+    """
+
+    if pitches is not None:
+      if self.pitches is None:
+        self.pitches = MinMaxDecimator(num_buckets=self.num_points)
+      self.pitches.push(pitches)
+
+    self.confidences.push(confidences)
+
+    detector = self.detector
+    feed_one = detector.feed_one
+    window_averages = np.empty(len(confidences), dtype=np.float64)
+    for i, confidence in enumerate(confidences.tolist()):
+      event = feed_one(confidence)
+      window_averages[i] = detector.avg_confidence
+      if event is not None:
+        self._add_event(event)
+
+    self.window_averages.push(window_averages)
+
+  def _add_event(self, event):
+    # the stream time at which the event's block was read
+    end_seconds = (event.confidence_index + 1) * self.block_seconds
+
+    if event.kind == DetectorEvent.TIMED_OUT:
+      self.markers.append((event.kind, end_seconds))
+      return
+
+    window_size = self.gap_window_size if event.kind == DetectorEvent.GAP else self.ring_window_size
+    self.segments.append((
+      DetectorEvent.GAP if event.kind == DetectorEvent.GAP else DetectorEvent.RING,
+      end_seconds - window_size * self.block_seconds,
+      end_seconds,
+    ))
+    if event.kind == DetectorEvent.RING_CYCLE:
+      self.markers.append((event.kind, end_seconds))
+
+
+def iter_traces(detector, *, trace_cache=None, chunk_num_blocks=4096, use_fast_model=False):
+  """
+    :param detector: a detector whose `audio_stream` is an unopened `audio.File`
+    :param trace_cache: an optional `TraceCache`, that the trace is read from, or added to
+
+    :return: a generator of the (pitches or None, confidences) of each
+      chunk of `chunk_num_blocks` blocks of the detector's recording
+  """
+
+  if trace_cache is not None:
+    pitches, confidences = trace_cache.trace(
+      detector.audio_stream,
+      detector.audio_pitch,
+      use_fast_model=use_fast_model,
+    )
+    # slices of the memory map, so only a chunk at a time is paged in
+    for start in range(0, len(confidences), chunk_num_blocks):
+      end = start + chunk_num_blocks
+      yield None if pitches is None else np.asarray(pitches[start:end]), np.asarray(confidences[start:end])
+    return
+
+  yield from batch_detection.iter_pitch_traces(
+    detector.audio_pitch,
+    batch_detection.iter_block_chunks(detector.audio_stream, chunk_num_blocks=chunk_num_blocks),
+    use_fast_model=use_fast_model,
+  )
+
+
+def summarize(detector, *, trace_cache=None, num_points=2000, chunk_num_blocks=4096, use_fast_model=False):
+  """
+    :return: the `PitchConfidenceSummary` of the detector's recording
+  """
+
+  summary = PitchConfidenceSummary(detector, num_points=num_points)
+  for pitches, confidences in iter_traces(
+    detector,
+    trace_cache=trace_cache,
+    chunk_num_blocks=chunk_num_blocks,
+    use_fast_model=use_fast_model,
+  ):
+    summary.push(pitches, confidences)
+
+  return summary
+
+
+def plot(summary, *, title=None, output_path=None):
+  """
+    Plot `summary`, to `output_path` if given, else to a window
+
+    :return: the matplotlib figure
+  """
+
+  if output_path is None:
+    # imported here since only a window needs a gui backend
+    import matplotlib.pyplot as plt
+    figure = plt.figure(figsize=(14, 7))
+  else:
+    figure = Figure(figsize=(14, 7))
+
+  detector = summary.detector
+  num_axes = 1 if summary.pitches is None else 2
+  axes = figure.subplots(num_axes, 1, sharex=True, squeeze=False)[:, 0]
+
+  if summary.pitches is not None:
+    _fill_buckets(axes[0], summary.pitches, block_seconds=summary.block_seconds, color='tab:purple')
+    # the pitch of an unvoiced block can be far off, so the rare outliers are cut off
+    _, _, maxs = summary.pitches.buckets()
+    axes[0].set_ylim(0, 1.1 * max(float(np.percentile(maxs, 99)), 1.0))
+    axes[0].set_ylabel('pitch (Hz)')
+
+  confidence_axes = axes[-1]
+  _fill_buckets(
+    confidence_axes,
+    summary.confidences,
+    block_seconds=summary.block_seconds,
+    color='tab:blue',
+    alpha=0.35,
+    label='confidence',
+  )
+  _fill_buckets(
+    confidence_axes,
+    summary.window_averages,
+    block_seconds=summary.block_seconds,
+    color='tab:green',
+    label='detector window average ({}s ring, {}s gap)'.format(detector.ringing_seconds, detector.gap_seconds),
+  )
+
+  for threshold in (detector.min_ringing_confidence, detector.max_ringing_confidence):
+    confidence_axes.axhline(threshold, color='tab:red', linestyle='--', linewidth=0.8)
+
+  span_colors = {DetectorEvent.RING: 'tab:green', DetectorEvent.GAP: 'tab:orange'}
+  for kind, start_seconds, end_seconds in summary.segments:
+    for axis in axes:
+      axis.axvspan(start_seconds, end_seconds, color=span_colors[kind], alpha=0.15, linewidth=0)
+
+  for kind, seconds in summary.markers:
+    is_ring_cycle = kind == DetectorEvent.RING_CYCLE
+    for axis in axes:
+      axis.axvline(
+        seconds,
+        color='tab:red' if is_ring_cycle else 'tab:gray',
+        linestyle='-' if is_ring_cycle else ':',
+        linewidth=1.2,
+      )
+
+  confidence_axes.set_ylim(0, 1.05)
+  confidence_axes.set_ylabel('pitch confidence')
+  confidence_axes.set_xlabel('seconds')
+  confidence_axes.set_xlim(0, summary.num_seconds)
+  confidence_axes.legend(loc='upper right', fontsize='small')
+
+  num_ring_cycles = sum(kind == DetectorEvent.RING_CYCLE for kind, _ in summary.markers)
+  axes[0].set_title('{}{} ring cycle(s) detected'.format('' if title is None else title + ': ', num_ring_cycles))
+  figure.tight_layout()
+
+  if output_path is None:
+    plt.show()
+  else:
+    figure.savefig(output_path, dpi=120)
+    logging.info("wrote the plot to '{}'".format(output_path))
+
+  return figure
+
+
+def _fill_buckets(axis, decimator, *, block_seconds, color, alpha=0.6, label=None):
+  starts, mins, maxs = decimator.buckets()
+  seconds = (starts + 1) * block_seconds
+  axis.fill_between(seconds, mins, maxs, step='post', color=color, alpha=alpha, linewidth=0.6, label=label)
+
+
+def main(
+  *,
+  audio_file_path,
+  output_path=None,
+  door_bell_detector='AiPhoneGT1A',
+  detector_kwargs_path=None,
+  trace_cache_dir_path=None,
+  num_points=2000,
+  use_fast_model=False,
+  log_level=logging.WARNING,
+):
+  logging.basicConfig(level=log_level)
+
+  detector_kwargs = {}
+  if detector_kwargs_path is not None:
+    # e.g. the output of `lib.calibration`
+    detector_kwargs = load_detector_kwargs(detector_kwargs_path)
+
+  doorbell_detector_class = getattr(door_bell_detectors, door_bell_detector)
+  detector = doorbell_detector_class(audio_stream=audio.File(file_path=audio_file_path), **detector_kwargs)
+  trace_cache = None if trace_cache_dir_path is None else TraceCache(trace_cache_dir_path)
+
+  summary = summarize(detector, trace_cache=trace_cache, num_points=num_points, use_fast_model=use_fast_model)
+  logging.info('summarized {:.1f}s of audio into {}'.format(summary.num_seconds, summary))
+  plot(summary, title=os.path.basename(audio_file_path), output_path=output_path)
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
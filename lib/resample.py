@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+
+class BlockResampler:
+  """
+    A streaming, polyphase resampler that turns every block of
+      `in_block_size` samples into exactly `out_block_size` samples
+
+    Since every block maps onto the same output phases, the indices and
+      anti-aliasing filter coefficients of every output sample are
+      precomputed once, as (out_block_size, num_taps) matrices, and
+      resampling a block is a gather, a multiply and a row sum into
+      preallocated arrays
+
+    The output lags the input by `delay_samples` input samples
+
+    Usage example, 20ms of 44.1kHz audio to 20ms of 8kHz audio:
+
+      resampler = BlockResampler(in_block_size=882, out_block_size=160)
+      resampled = resampler.process(block)
+  """
+
+  def __init__(self, *, in_block_size, out_block_size, num_zero_crossings=8, rolloff=0.9):
+    """
+      :param in_block_size: the number of samples in every input block
+      :param out_block_size: the number of samples in every output block
+
+      :param num_zero_crossings: the number of zero crossings of the
+         windowed sinc filter on each side of its center; more is sharper
+         but costs proportionally more
+
+      :param rolloff: the filter's cutoff, as a fraction of the lower
+         of the input and output nyquist frequencies
+    """
+
+    self.in_block_size = in_block_size
+    self.out_block_size = out_block_size
+    self.num_zero_crossings = num_zero_crossings
+    self.rolloff = rolloff
+
+    # the cutoff, in cycles per input sample
+    cutoff = 0.5 * rolloff * min(1.0, out_block_size / in_block_size)
+    half_width = int(math.ceil(num_zero_crossings / (2 * cutoff)))
+    num_taps = 2 * half_width
+
+    self.delay_samples = half_width
+    self._history_size = num_taps
+
+    # output sample j sits at this position of the [history, block] buffer
+    positions = (
+      self._history_size
+      - self.delay_samples
+      + np.arange(out_block_size) * (in_block_size / out_block_size)
+    )
+    first_taps = np.floor(positions).astype(np.int64) - half_width + 1
+    self._indices = first_taps[:, np.newaxis] + np.arange(num_taps)
+
+    offsets = positions[:, np.newaxis] - self._indices
+    window = np.where(
+      np.abs(offsets) < half_width,
+      0.42 + 0.5 * np.cos(np.pi * offsets / half_width) + 0.08 * np.cos(2 * np.pi * offsets / half_width),
+      0.0,
+    )
+    coefficients = 2 * cutoff * np.sinc(2 * cutoff * offsets) * window
+    # unity gain at DC for every output phase
+    coefficients /= coefficients.sum(axis=1, keepdims=True)
+    self._coefficients = coefficients.astype(np.float32)
+
+    self._buffer = np.zeros(self._history_size + in_block_size, dtype=np.float32)
+    self._gathered = np.zeros((out_block_size, num_taps), dtype=np.float32)
+    self._out = np.zeros(out_block_size, dtype=np.float32)
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tin_block_size={},\n'
+        '\tout_block_size={},\n'
+        '\tnum_zero_crossings={},\n'
+        '\trolloff={}\n'
+      ')._num_taps={}'
+      ''.format(
+        BlockResampler.__name__,
+        self.in_block_size,
+        self.out_block_size,
+        self.num_zero_crossings,
+        self.rolloff,
+        self._coefficients.shape[1],
+      )
+    )
+
+  @property
+  def num_taps(self):
+    return self._coefficients.shape[1]
+
+  def reset(self):
+    """
+      Forget the history, as if no samples had been processed
+
+      :return: None
+    """
+    self._buffer[:] = 0
+
+  def process(self, block, *, out=None):
+    """
+      :param block: `in_block_size` samples
+
+      :param out: an optional array of `out_block_size` samples to write to;
+         if None then an array owned by the resampler is written to, and
+         overwritten by the next call
+
+      :return: the `out_block_size` resampled samples
+    """
+
+    buffer = self._buffer
+    history_size = self._history_size
+
+    buffer[:history_size] = buffer[-history_size:]
+    buffer[history_size:] = block
+
+    np.take(buffer, self._indices, out=self._gathered)
+    np.multiply(self._gathered, self._coefficients, out=self._gathered)
+
+    out = self._out if out is None else out
+    return np.sum(self._gathered, axis=1, out=out)
@@ -0,0 +1,135 @@
+import numpy as np
+
+
+class RingBuffer:
+  """
+    A preallocated, circular buffer of audio frames, shared by exactly
+      one writer thread and one reader thread
+
+    No lock is needed: the writer only ever advances `_num_written` and
+      the reader only ever advances `_num_read`, each *after* copying the
+      frames it owns, and both counters only grow
+
+    When the writer finds too little free space, the incoming frames are
+      dropped, rather than overwriting frames the reader hasn't consumed,
+      and the overflow is counted
+  """
+
+  def __init__(self, *, capacity, num_channels=1, dtype='float32'):
+    """
+      :param capacity: the number of frames the buffer holds
+      :param num_channels: the number of channels per frame
+      :param dtype: the numpy dtype of the samples
+    """
+
+    self.capacity = capacity
+    self.num_channels = num_channels
+    self.dtype = dtype
+
+    self._frames = np.zeros((capacity, num_channels), dtype=dtype)
+    self._num_written = 0
+    self._num_read = 0
+
+    self._num_overflows = 0
+    self._num_frames_dropped = 0
+    self._high_water_mark = 0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tcapacity={},\n'
+        '\tnum_channels={},\n'
+        "\tdtype='{}'\n"
+      ')._num_available={},\n'
+      '._num_overflows={},\n'
+      '._num_frames_dropped={},\n'
+      '._high_water_mark={}'
+      ''.format(
+        RingBuffer.__name__,
+        self.capacity,
+        self.num_channels,
+        self.dtype,
+        self.num_available,
+        self._num_overflows,
+        self._num_frames_dropped,
+        self._high_water_mark,
+      )
+    )
+
+  @property
+  def num_available(self):
+    """
+      :return: the number of frames written but not yet read
+    """
+    return self._num_written - self._num_read
+
+  @property
+  def num_overflows(self):
+    return self._num_overflows
+
+  @property
+  def num_frames_dropped(self):
+    return self._num_frames_dropped
+
+  @property
+  def high_water_mark(self):
+    """
+      :return: the largest `num_available` seen by the writer
+    """
+    return self._high_water_mark
+
+  def write(self, frames):
+    """
+      Copy `frames`, of shape (num_frames, num_channels), into the buffer
+
+      Must only be called from the writer thread
+
+      :return: the number of frames written
+    """
+
+    num_frames = len(frames)
+    num_free = self.capacity - (self._num_written - self._num_read)
+    if num_frames > num_free:
+      self._num_overflows += 1
+      self._num_frames_dropped += num_frames - num_free
+      num_frames = num_free
+
+    start = self._num_written % self.capacity
+    num_before_wrap = min(num_frames, self.capacity - start)
+    self._frames[start:start + num_before_wrap] = frames[:num_before_wrap]
+    self._frames[:num_frames - num_before_wrap] = frames[num_before_wrap:num_frames]
+
+    # publish the frames only once they have been copied
+    self._num_written += num_frames
+
+    num_available = self._num_written - self._num_read
+    if num_available > self._high_water_mark:
+      self._high_water_mark = num_available
+
+    return num_frames
+
+  def read_into(self, out):
+    """
+      Copy the oldest `len(out)` frames into `out` and consume them
+
+      Must only be called from the reader thread, and only once
+        `num_available >= len(out)`
+
+      :return: out
+    """
+
+    num_frames = len(out)
+    assert num_frames <= self.num_available, (
+      'cannot read {} frames when only {} are available'
+      ''.format(num_frames, self.num_available)
+    )
+
+    start = self._num_read % self.capacity
+    num_before_wrap = min(num_frames, self.capacity - start)
+    out[:num_before_wrap] = self._frames[start:start + num_before_wrap]
+    out[num_before_wrap:] = self._frames[:num_frames - num_before_wrap]
+
+    # free the frames only once they have been copied
+    self._num_read += num_frames
+
+    return out
@@ -0,0 +1,286 @@
+"""
+  Scans a directory of recordings, e.g. weeks of an intercom's audio, for
+    every ring cycle, across a process pool
+
+  Every recording is streamed, a chunk of blocks at a time, into its pitch
+    confidence trace, which is scanned by `batch_detection`, so a worker
+    only ever holds a chunk of audio, and the trace, of one recording
+
+  A json line is written per recording as soon as it's scanned, e.g.
+
+    {"file": "2024-01-01/08.wav", "audio_seconds": 3600.0, "ring_cycles": [
+      {"start_seconds": 612.4, "end_seconds": 619.1, "gap_end_seconds": 614.9, ...,
+       "ring_confidence": 0.61, "gap_confidence": 0.12, "subsequent_ring_confidence": 0.6}
+    ]}
+
+  and, with a `--checkpoint_path`, the recording is then added to the
+    checkpoint, so that an interrupted scan resumes by skipping it; a
+    recording whose line was written, but not yet checkpointed, is scanned,
+    and written, again
+
+  Usage:
+    python -m lib.scanner --recordings_dir_path recordings --output_path rings.jsonl --checkpoint_path rings.done
+    python -m lib.scanner --recordings_dir_path recordings --trace_cache_dir_path traces > rings.jsonl
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import as_completed, ProcessPoolExecutor
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from lib import batch_detection
+from lib.calibration import AUDIO_FILE_EXTENSIONS, load_detector_kwargs, new_detector
+from lib.trace_cache import TraceCache
+
+
+def main_kwargs():
+  arg_parser = ArgumentParser()
+
+  arg_parser.add_argument('-recordings_dir_path', '--recordings_dir_path', type=str, required=True)
+  arg_parser.add_argument('-output_path', '--output_path', type=str)
+  arg_parser.add_argument('-checkpoint_path', '--checkpoint_path', type=str)
+  arg_parser.add_argument('-door_bell_detector', '--door_bell_detector', type=str, default='AiPhoneGT1A')
+  arg_parser.add_argument('-detector_kwargs_path', '--detector_kwargs_path', type=str)
+  arg_parser.add_argument('-trace_cache_dir_path', '--trace_cache_dir_path', type=str)
+  arg_parser.add_argument('-use_fast_model', '--use_fast_model', action='store_true')
+  arg_parser.add_argument('-num_workers', '--num_workers', type=int)
+  arg_parser.add_argument('-chunk_num_blocks', '--chunk_num_blocks', type=int, default=4096)
+  arg_parser.add_argument('-log_level', '--log_level', type=str, default='INFO')
+
+  kwargs = vars(arg_parser.parse_args())
+  kwargs['log_level'] = logging._checkLevel(kwargs['log_level'].upper())
+
+  return kwargs
+
+
+def find_recordings(dir_path):
+  """
+    :return: the sorted paths of every audio file under `dir_path`, relative to it
+  """
+
+  file_paths = []
+  for walked_dir_path, dir_names, file_names in os.walk(dir_path):
+    dir_names.sort()
+    for file_name in file_names:
+      if os.path.splitext(file_name)[1].lower() in AUDIO_FILE_EXTENSIONS:
+        file_paths.append(os.path.relpath(os.path.join(walked_dir_path, file_name), dir_path))
+
+  return sorted(file_paths)
+
+
+def read_checkpoint(checkpoint_path):
+  """
+    :return: the set of the recordings that the checkpoint at `checkpoint_path`
+      lists as scanned, which is empty if there's no checkpoint yet
+  """
+
+  try:
+    with open(checkpoint_path, 'r') as checkpoint_file:
+      return {line.rstrip('\n') for line in checkpoint_file if line.strip()}
+  except FileNotFoundError:
+    return set()
+
+
+def scan_recording(
+  file_path,
+  *,
+  door_bell_detector='AiPhoneGT1A',
+  detector_kwargs=None,
+  trace_cache_dir_path=None,
+  chunk_num_blocks=4096,
+  use_fast_model=False,
+):
+  """
+    Find every ring cycle of the recording at `file_path`
+
+    :param use_fast_model: see `batch_detection.pitch_confidences`
+
+    :return: a json-able dict of the recording's 'audio_seconds' and
+      'ring_cycles', the stream times, in seconds, of the phases of each
+      ring cycle, and their window averages, and its 'scan_seconds'
+  """
+
+  started_at = time.monotonic()
+  detector = new_detector(door_bell_detector, file_path=file_path, detector_kwargs=detector_kwargs or {})
+  audio_stream = detector.audio_stream
+
+  if trace_cache_dir_path is None:
+    # only a chunk of the audio is decoded at a time, and only its trace is kept
+    confidences = np.concatenate([
+      confidences
+      for _, confidences in batch_detection.iter_pitch_traces(
+        detector.audio_pitch,
+        batch_detection.iter_block_chunks(audio_stream, chunk_num_blocks=chunk_num_blocks),
+        use_fast_model=use_fast_model,
+      )
+    ])
+  else:
+    _, confidences = TraceCache(trace_cache_dir_path).trace(
+      audio_stream,
+      detector.audio_pitch,
+      use_fast_model=use_fast_model,
+    )
+
+  block_seconds = audio_stream.block_size / audio_stream.sample_rate
+  cadence_kwargs = batch_detection.cadence_kwargs(**batch_detection.detector_settings(detector))
+  ring_window_size = cadence_kwargs['ring_window_size']
+
+  ring_cycles = []
+  for ring, gap, subsequent_ring in batch_detection.find_ring_cycle_phases(confidences, **cadence_kwargs):
+    ring_start, ring_index, ring_confidence = ring
+    _, gap_index, gap_confidence = gap
+    _, ring_cycle_index, subsequent_ring_confidence = subsequent_ring
+
+    ring_cycles.append({
+      # the start of the ring window that first averaged within the ringing range
+      'start_seconds': max(ring_start, ring_index + 1 - ring_window_size) * block_seconds,
+      # the stream times at which the ring, and then the gap, were detected
+      'ring_end_seconds': (ring_index + 1) * block_seconds,
+      'gap_end_seconds': (gap_index + 1) * block_seconds,
+      # when `AiPhoneGT1A.is_ringing` would have returned True
+      'end_seconds': (ring_cycle_index + 1) * block_seconds,
+      'ring_confidence': ring_confidence,
+      'gap_confidence': gap_confidence,
+      'subsequent_ring_confidence': subsequent_ring_confidence,
+    })
+
+  return {
+    'audio_seconds': len(confidences) * block_seconds,
+    'ring_cycles': ring_cycles,
+    'scan_seconds': time.monotonic() - started_at,
+  }
+
+
+def scan(
+  recordings_dir_path,
+  *,
+  output_file,
+  checkpoint_path=None,
+  num_workers=None,
+  **scan_kwargs
+):
+  """
+    Scan every recording under `recordings_dir_path` that isn't checkpointed,
+      writing a json line, to `output_file`, per recording, as it's scanned
+
+    :param scan_kwargs: the kwargs to pass to `scan_recording`
+
+    :return: a dict of the number of recordings scanned, and failed, and the
+      seconds of audio scanned, and of the wall clock
+  """
+
+  file_paths = find_recordings(recordings_dir_path)
+  scanned = set() if checkpoint_path is None else read_checkpoint(checkpoint_path)
+  pending = [file_path for file_path in file_paths if file_path not in scanned]
+  logging.info('scanning {} of {} recordings, {} were already scanned'.format(
+    len(pending),
+    len(file_paths),
+    len(file_paths) - len(pending),
+  ))
+
+  summary = {'num_scanned': 0, 'num_failed': 0, 'audio_seconds': 0.0, 'wall_seconds': 0.0}
+  started_at = time.monotonic()
+
+  checkpoint_file = None if checkpoint_path is None else open(checkpoint_path, 'a')
+  try:
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+      futures = {
+        executor.submit(scan_recording, os.path.join(recordings_dir_path, file_path), **scan_kwargs): file_path
+        for file_path in pending
+      }
+
+      for future in as_completed(futures):
+        file_path = futures[future]
+        try:
+          result = future.result()
+        except Exception:
+          # not checkpointed, so that it's retried by the next scan
+          summary['num_failed'] += 1
+          logging.exception("failed to scan '{}'".format(file_path))
+          continue
+
+        output_file.write(json.dumps({'file': file_path, **result}) + '\n')
+        output_file.flush()
+        if checkpoint_file is not None:
+          checkpoint_file.write(file_path + '\n')
+          checkpoint_file.flush()
+
+        summary['num_scanned'] += 1
+        summary['audio_seconds'] += result['audio_seconds']
+        summary['wall_seconds'] = time.monotonic() - started_at
+        logging.info('{}/{} {}: {} ring cycle(s), {:.2f} audio hours per wall minute so far'.format(
+          summary['num_scanned'] + summary['num_failed'],
+          len(pending),
+          file_path,
+          len(result['ring_cycles']),
+          audio_hours_per_wall_minute(summary),
+        ))
+  finally:
+    if checkpoint_file is not None:
+      checkpoint_file.close()
+
+  summary['wall_seconds'] = time.monotonic() - started_at
+  return summary
+
+
+def audio_hours_per_wall_minute(summary):
+  return (summary['audio_seconds'] / 3600) / max(summary['wall_seconds'] / 60, 1e-9)
+
+
+def main(
+  *,
+  recordings_dir_path,
+  output_path=None,
+  checkpoint_path=None,
+  door_bell_detector='AiPhoneGT1A',
+  detector_kwargs_path=None,
+  trace_cache_dir_path=None,
+  num_workers=None,
+  chunk_num_blocks=4096,
+  use_fast_model=False,
+  log_level=logging.INFO,
+):
+  logging.basicConfig(level=log_level)
+
+  detector_kwargs = {}
+  if detector_kwargs_path is not None:
+    # e.g. the output of `lib.calibration`
+    detector_kwargs = load_detector_kwargs(detector_kwargs_path)
+
+  # appended to, so that a resumed scan keeps the lines of the recordings it skips
+  output_file = sys.stdout if output_path is None else open(output_path, 'a')
+  try:
+    summary = scan(
+      recordings_dir_path,
+      output_file=output_file,
+      checkpoint_path=checkpoint_path,
+      num_workers=num_workers,
+      door_bell_detector=door_bell_detector,
+      detector_kwargs=detector_kwargs,
+      trace_cache_dir_path=trace_cache_dir_path,
+      chunk_num_blocks=chunk_num_blocks,
+      use_fast_model=use_fast_model,
+    )
+  finally:
+    if output_file is not sys.stdout:
+      output_file.close()
+
+  logging.info(
+    'scanned {} recordings, {} failed: {:.2f} hours of audio in {:.2f} minutes, {:.2f} audio hours per wall minute'
+    ''.format(
+      summary['num_scanned'],
+      summary['num_failed'],
+      summary['audio_seconds'] / 3600,
+      summary['wall_seconds'] / 60,
+      audio_hours_per_wall_minute(summary),
+    )
+  )
+
+
+if __name__ == '__main__':
+  main(**main_kwargs())
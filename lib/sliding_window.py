@@ -0,0 +1,205 @@
+from collections import deque
+import math
+
+# far larger than the rounding error of the running mean, between resyncs,
+#   of values of about unit magnitude, e.g. pitch confidences
+MEAN_TOLERANCE = 1e-9
+
+
+class SlidingWindow:
+  """
+    A fixed-size window over the most recent values pushed into it,
+      with O(1) (amortized, for min/max) running statistics
+
+    The window always holds exactly `size` values; it starts out
+      filled with `fill_value`, the same way a
+      `deque((fill_value for _ in range(size)), maxlen=size)` does
+
+    Usage example:
+
+      window = SlidingWindow(size=3)
+      for value in (0.5, 0.6, 0.7):
+        window.push(value)
+      window.mean  # 0.6
+
+    The running sums are only equal to `math.fsum` of the values to within
+      rounding, so `mean_for` recomputes a mean that's about to be compared
+      with a threshold it's within `MEAN_TOLERANCE` of
+  """
+
+  def __init__(self, *, size, fill_value=0.0, track_extrema=True, resync_every=None):
+    """
+      :param size: the number of values held by the window
+
+      :param fill_value: the value that the window is initially filled with
+
+      :param track_extrema: if False then `min` and `max` are unavailable,
+         which saves the cost of maintaining them on every push
+
+      :param resync_every: the number of pushes after which the running
+         sums are recomputed from scratch, which bounds the floating point
+         drift of the running sums; defaults to `size`, so that the
+         recomputation costs O(1) amortized per push
+    """
+
+    assert size > 0, 'size must be positive, but found {}'.format(size)
+
+    self.size = size
+    self.track_extrema = track_extrema
+    self.resync_every = size if resync_every is None else resync_every
+
+    self._values = [fill_value] * size
+    self._index = 0
+    self._num_pushed = 0
+    self._sum = 0.0
+    self._sum_of_squares = 0.0
+    self._min_deque = deque()
+    self._max_deque = deque()
+
+    self.reset(fill_value=fill_value)
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tsize={},\n'
+        '\ttrack_extrema={},\n'
+        '\tresync_every={}\n'
+      ')._num_pushed={}'
+      ''.format(
+        SlidingWindow.__name__,
+        self.size,
+        self.track_extrema,
+        self.resync_every,
+        self._num_pushed,
+      )
+    )
+
+  def __len__(self):
+    return self.size
+
+  def reset(self, *, fill_value=0.0):
+    """
+      Refill the window with `fill_value`, reusing its storage
+
+      :return: None
+    """
+
+    values = self._values
+    for i in range(self.size):
+      values[i] = fill_value
+
+    self._index = 0
+    self._num_pushed = 0
+    self._sum = fill_value * self.size
+    self._sum_of_squares = fill_value * fill_value * self.size
+
+    # the deques hold (push number, value) pairs, where the fill values
+    #   are treated as having been pushed before the window was created
+    self._min_deque.clear()
+    self._min_deque.append((-1, fill_value))
+    self._max_deque.clear()
+    self._max_deque.append((-1, fill_value))
+
+  def push(self, value):
+    """
+      Append `value` to the window, evicting the oldest value
+
+      :return: the evicted value
+    """
+
+    index = self._index
+    evicted = self._values[index]
+    self._values[index] = value
+    self._index = index + 1 if index + 1 < self.size else 0
+
+    num_pushed = self._num_pushed
+    self._num_pushed = num_pushed + 1
+
+    if self._num_pushed % self.resync_every == 0:
+      self._resync()
+    else:
+      self._sum += value - evicted
+      self._sum_of_squares += value * value - evicted * evicted
+
+    if self.track_extrema:
+      self._push_extrema(num_pushed, value)
+
+    return evicted
+
+  def _push_extrema(self, num_pushed, value):
+    oldest_kept = num_pushed - self.size + 1
+
+    min_deque = self._min_deque
+    while min_deque and min_deque[-1][1] >= value:
+      min_deque.pop()
+    min_deque.append((num_pushed, value))
+    if min_deque[0][0] < oldest_kept:
+      min_deque.popleft()
+
+    max_deque = self._max_deque
+    while max_deque and max_deque[-1][1] <= value:
+      max_deque.pop()
+    max_deque.append((num_pushed, value))
+    if max_deque[0][0] < oldest_kept:
+      max_deque.popleft()
+
+  def _resync(self):
+    self._sum = math.fsum(self._values)
+    self._sum_of_squares = math.fsum(value * value for value in self._values)
+
+  @property
+  def num_pushed(self):
+    return self._num_pushed
+
+  @property
+  def sum(self):
+    return self._sum
+
+  @property
+  def mean(self):
+    return self._sum / self.size
+
+  def mean_for(self, *thresholds):
+    """
+      :return: the mean, to be compared with `thresholds`, which is recomputed
+        from the values, as exactly rounded by `math.fsum`, if the running
+        mean is within `MEAN_TOLERANCE` of any of them, so that the rounding
+        of the running sum can't flip a comparison
+    """
+
+    mean = self._sum / self.size
+    for threshold in thresholds:
+      if abs(mean - threshold) <= MEAN_TOLERANCE:
+        return math.fsum(self._values) / self.size
+
+    return mean
+
+  @property
+  def min(self):
+    assert self.track_extrema, 'min is unavailable when track_extrema=False'
+    return self._min_deque[0][1]
+
+  @property
+  def max(self):
+    assert self.track_extrema, 'max is unavailable when track_extrema=False'
+    return self._max_deque[0][1]
+
+  @property
+  def variance(self):
+    """
+      :return: the population variance of the values in the window
+    """
+
+    mean = self._sum / self.size
+    return max(self._sum_of_squares / self.size - mean * mean, 0.0)
+
+  @property
+  def std(self):
+    return math.sqrt(self.variance)
+
+  def values(self):
+    """
+      :return: a list of the values in the window, oldest first
+    """
+
+    return self._values[self._index:] + self._values[:self._index]
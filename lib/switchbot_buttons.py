@@ -1,23 +1,125 @@
 import os
-from switchbotpy import Bot
+import queue
 
-SWITCHBOT_MAC_ANSWER_BELL = os.environ['SWITCHBOT_MAC_ANSWER_BELL']
-SWITCHBOT_MAC_UNLOCK_DOOR = os.environ['SWITCHBOT_MAC_UNLOCK_DOOR']
+import pygatt
+from switchbotpy.switchbot_util import ActionStatus, SwitchbotError
 
+from lib.ble_connections import BleConnectionManager, BleLink
+from lib.utils import computed_once
 
-def answer_doorbell():
-  bot = Bot(
-    bot_id=0,
-    mac=SWITCHBOT_MAC_ANSWER_BELL,
-    name='answer_doorbell'
+# https://github.com/OpenWonderLabs/SwitchBotAPI-BLE/blob/latest/devicetypes/bot.md
+SWITCHBOT_NOTIFICATION_UUID = 'cba20003-224d-11e6-9fb8-0002a5d5c51b'
+SWITCHBOT_COMMAND_HANDLE = 0x16
+SWITCHBOT_PRESS_COMMAND = b'\x57\x01'
+
+
+class SwitchBotLink(BleLink):
+  """
+    A persistent connection to a SwitchBot bot
+
+    `switchbotpy.Bot` starts its adapter, connects and subscribes on every
+      press, and stops the adapter afterwards; this does so once, and only
+      writes the press command, and waits for its notification, per press
+  """
+
+  def __init__(self, *, mac, connect_timeout_seconds=5, notification_timeout_seconds=5):
+    self.mac = mac
+    self.connect_timeout_seconds = connect_timeout_seconds
+    self.notification_timeout_seconds = notification_timeout_seconds
+
+    self._adapter = None
+    self._device = None
+    # this bot's own notifications, unlike `switchbotpy`'s queue, which every bot shares
+    self._notifications = queue.Queue()
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tmac='{}',\n"
+        '\tconnect_timeout_seconds={},\n'
+        '\tnotification_timeout_seconds={}\n'
+      ')'
+      ''.format(
+        SwitchBotLink.__name__,
+        self.mac,
+        self.connect_timeout_seconds,
+        self.notification_timeout_seconds,
+      )
+    )
+
+  @property
+  def is_connected(self):
+    return self._device is not None
+
+  def connect(self):
+    self._adapter = pygatt.GATTToolBackend()
+    # without resetting the bluetooth controller, which would drop the other bots' connections
+    self._adapter.start(reset_on_start=False)
+    try:
+      self._device = self._adapter.connect(
+        self.mac,
+        timeout=self.connect_timeout_seconds,
+        address_type=pygatt.BLEAddressType.random,
+      )
+      self._device.subscribe(SWITCHBOT_NOTIFICATION_UUID, callback=self._on_notification)
+    except Exception:
+      self.disconnect()
+      raise
+
+  def disconnect(self):
+    device, self._device = self._device, None
+    adapter, self._adapter = self._adapter, None
+
+    try:
+      if device is not None:
+        device.disconnect()
+    finally:
+      if adapter is not None:
+        adapter.stop()
+
+  def press(self):
+    # drop the notifications of any press that timed out
+    while not self._notifications.empty():
+      self._notifications.get_nowait()
+
+    self._device.char_write_handle(handle=SWITCHBOT_COMMAND_HANDLE, value=SWITCHBOT_PRESS_COMMAND)
+    value = self._notifications.get(timeout=self.notification_timeout_seconds)
+
+    action_status = ActionStatus(value[0])
+    if action_status is not ActionStatus.complete:
+      raise SwitchbotError(message=action_status.msg(), switchbot_action_status=action_status)
+
+  def _on_notification(self, _handle, value):
+    self._notifications.put(value)
+
+
+# the MAC addresses are read, and the bots connected, on first use,
+#   so that importing this module is side-effect free
+
+@computed_once
+def connection_manager():
+  return BleConnectionManager(
+    links={
+      'answer_doorbell': SwitchBotLink(mac=os.environ['SWITCHBOT_MAC_ANSWER_BELL']),
+      'unlock_door': SwitchBotLink(mac=os.environ['SWITCHBOT_MAC_UNLOCK_DOOR']),
+    },
   )
-  bot.press()
+
+
+def warm_up():
+  """
+    Connect to the bots, e.g. in a background thread while the doorbell
+      detector starts listening, so that the first press doesn't wait for them
+
+    :return: None
+  """
+
+  connection_manager().connect_all()
+
+
+def answer_doorbell():
+  return connection_manager().press('answer_doorbell')
 
 
 def unlock_door():
-  bot = Bot(
-    bot_id=1,
-    mac=SWITCHBOT_MAC_UNLOCK_DOOR,
-    name='unlock_door'
-  )
-  bot.press()
+  return connection_manager().press('unlock_door')
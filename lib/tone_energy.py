@@ -0,0 +1,209 @@
+"""
+  A cheap alternative to `audio.Pitch` for a known tone: the fraction of each
+    block's energy that sits at the tone's frequencies
+
+  The energy at each frequency is a single-bin DFT, i.e. what a Goertzel
+    filter computes, but for every frequency at once as one small matrix
+    product per block, rather than a python loop per sample
+"""
+
+import time
+
+import numpy as np
+
+from lib.instrumentation import INSTRUMENTATION, PITCH_PROCESS_DATA
+from lib.utils import AssertContextFunc
+
+
+class ToneEnergy:
+  """
+    Takes the place of `audio.Pitch`, with the fraction of each block's
+      energy at `tone_frequencies` as its `confidence`: about 1 for a
+      block of pure tone, and about 0 for one without it
+
+    Usage example:
+
+      with ToneEnergy(audio_stream, tone_frequencies=[1000.0]) as tone_energy:
+        for _ in audio_stream.iter_read():
+          tone_energy.process_data()
+          print(tone_energy.confidence)
+  """
+
+  def __init__(self, audio_stream, *, tone_frequencies):
+    """
+      :param audio_stream: the `Stream` whose blocks are processed
+      :param tone_frequencies: the frequencies, in Hz, of the tone,
+         e.g. from `learn_tone_frequencies`
+    """
+
+    self.audio_stream = audio_stream
+    self.tone_frequencies = list(tone_frequencies)
+
+    block_size = audio_stream.block_size
+    window = np.hanning(block_size + 2)[1:-1]
+    t = np.arange(block_size) / audio_stream.sample_rate
+    phases = 2 * np.pi * np.outer(self.tone_frequencies, t)
+
+    # the windowed cosine and sine rows of every frequency's DFT bin
+    self._basis = (np.concatenate((np.cos(phases), np.sin(phases))) * window).astype(np.float32)
+    self._window_squared = (window ** 2).astype(np.float32)
+    # scales a bin's power by the block's windowed energy, so that a pure
+    #   tone, at the bin's frequency, has a confidence of 1
+    self._normalization = 2 * np.sum(window ** 2) / np.sum(window) ** 2
+
+    self._projections = np.zeros(len(self._basis), dtype=np.float32)
+    self._squared = np.zeros(block_size, dtype=np.float32)
+    self._is_open = None
+    self._confidence = 0.0
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\taudio_stream={},\n'
+        '\ttone_frequencies={}\n'
+      ')._confidence={}'
+      ''.format(
+        ToneEnergy.__name__,
+        str(self.audio_stream).replace('\n', '\n\t'),
+        self.tone_frequencies,
+        self._confidence,
+      )
+    )
+
+  @property
+  def confidences_per_second(self):
+    return self.audio_stream.sample_rate / self.audio_stream.block_size
+
+  @AssertContextFunc(does_set=True, attribute='_is_open')
+  def open(self):
+    self._is_open = True
+    self._confidence = 0.0
+
+  def __enter__(self):
+    self.open()
+    return self
+
+  @AssertContextFunc(sets_to_none=True, attribute='_is_open')
+  def close(self):
+    self._is_open = None
+
+  def __exit__(self, *args, **kwargs):
+    self.close()
+
+  def process_data(self):
+    self.process_block(self.audio_stream.data)
+
+  def process_block(self, data):
+    """
+      :param data: a block that needn't be the stream's latest,
+         e.g. one replayed by an `EnergyGate`
+    """
+
+    if INSTRUMENTATION.enabled:
+      start = time.perf_counter()
+      self._process(data)
+      INSTRUMENTATION.record(PITCH_PROCESS_DATA, time.perf_counter() - start)
+    else:
+      self._process(data)
+
+  @property
+  def confidence(self):
+    return self._confidence
+
+  def confidences_of(self, blocks):
+    """
+      The batch equivalent of `process_data` and `confidence`
+
+      :param blocks: a float32 array of shape (num_blocks, block_size)
+      :return: a float64 array of shape (num_blocks,)
+    """
+
+    projections = blocks @ self._basis.T
+    tone_energies = np.sum(projections.astype(np.float64) ** 2, axis=1)
+    energies = (blocks * blocks) @ self._window_squared
+    return _confidences(tone_energies, energies, normalization=self._normalization)
+
+  def _process(self, data):
+    projections = np.dot(self._basis, data, out=self._projections)
+    tone_energy = float(np.dot(projections, projections))
+    energy = float(np.dot(np.multiply(data, data, out=self._squared), self._window_squared))
+    self._confidence = float(_confidences(tone_energy, energy, normalization=self._normalization))
+
+
+def _confidences(tone_energies, energies, *, normalization):
+  # silence is not the tone, and the sum of a few bins' leakage can exceed the energy
+  return np.minimum(tone_energies * normalization / np.maximum(energies, 1e-12), 1.0)
+
+
+def learn_tone_frequencies(
+  samples,
+  *,
+  sample_rate,
+  num_tones=1,
+  frame_size=4096,
+  min_hz=100.0,
+  max_hz=4000.0,
+  tonal_fraction=0.25,
+):
+  """
+    Learn the frequencies of the tone in a sample recording of the doorbell
+
+    The frames that are most tonal, i.e. whose spectral peak is furthest
+      above their median, are assumed to be ringing; their average spectrum's
+      `num_tones` highest peaks, between `min_hz` and `max_hz`, are the tone
+
+    :param samples: a 1-D float array of the recording, which should
+       include at least a couple of seconds of ringing
+    :param num_tones: the number of frequencies to learn, e.g. 2 for a
+       tone that alternates between two pitches
+
+    :param frame_size: the samples per analysed frame; larger is
+       more precise, at sample_rate / frame_size Hz per bin
+
+    :param tonal_fraction: the fraction of frames, the most tonal,
+       that are averaged
+
+    :return: a list of the `num_tones` frequencies, in Hz, strongest first
+  """
+
+  num_frames = len(samples) // frame_size
+  assert num_frames >= 1, (
+    'the sample must be at least {} samples long, but found {}'.format(frame_size, len(samples))
+  )
+
+  frames = np.asarray(samples[:num_frames * frame_size], dtype=np.float64).reshape(num_frames, frame_size)
+  spectra = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1)) ** 2
+
+  frequencies = np.fft.rfftfreq(frame_size, d=1 / sample_rate)
+  in_band = (frequencies >= min_hz) & (frequencies <= max_hz)
+  band_spectra = spectra[:, in_band]
+
+  tonalities = band_spectra.max(axis=1) / np.maximum(np.median(band_spectra, axis=1), 1e-20)
+  num_tonal_frames = max(1, int(round(num_frames * tonal_fraction)))
+  tonal_frames = np.argsort(tonalities)[-num_tonal_frames:]
+  spectrum = band_spectra[tonal_frames].mean(axis=0)
+  band_frequencies = frequencies[in_band]
+
+  tone_frequencies = []
+  remaining_spectrum = spectrum.copy()
+  for _ in range(num_tones):
+    peak = int(np.argmax(remaining_spectrum))
+    tone_frequencies.append(_interpolated_frequency(spectrum, peak, band_frequencies))
+    # the main lobe of a hann window is 4 bins wide
+    remaining_spectrum[max(0, peak - 2):peak + 3] = 0
+
+  return tone_frequencies
+
+
+def _interpolated_frequency(spectrum, peak, frequencies):
+  """
+    :return: the frequency of the parabola through the log power of the
+      `peak` bin and its neighbours, which is more precise than the bin's
+  """
+
+  if peak == 0 or peak == len(spectrum) - 1:
+    return float(frequencies[peak])
+
+  left, center, right = np.log(np.maximum(spectrum[peak - 1:peak + 2], 1e-20))
+  offset = 0.5 * (left - right) / (left - 2 * center + right)
+  return float(frequencies[peak] + offset * (frequencies[1] - frequencies[0]))
@@ -0,0 +1,285 @@
+"""
+  A persistent cache of the pitch and confidence traces of audio files, so
+    that rerunning batch detection, calibration or plotting over the same
+    recordings skips decoding them and detecting their pitch
+
+  A trace is keyed by the hash of its file's content and every setting that
+    changes it, e.g. the `Pitch` model, tolerance and block size, and is
+    stored as `.npy` files, which are memory-mapped when loaded
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from lib import batch_detection
+from lib.audio import Pitch
+from lib.energy_gate import EnergyGate
+from lib.tone_energy import ToneEnergy
+
+# bumped whenever the traces computed for the same settings change,
+#   e.g. 2 when the `EnergyGate`'s pre-roll grew to cover a decimated pitch's buffer
+TRACE_FORMAT_VERSION = 2
+
+PITCHES = 'pitches'
+CONFIDENCES = 'confidences'
+
+
+class TraceCache:
+  """
+    Usage example:
+
+      trace_cache = TraceCache('~/.cache/doorbell_traces')
+      pitches, confidences = trace_cache.trace(audio_file, detector.audio_pitch)
+
+    Every trace is a pair of `<key>.confidences.npy` and, except for a
+      `ToneEnergy`'s, `<key>.pitches.npy`; once the cache holds more than
+      `max_bytes`, the least recently used traces are evicted
+  """
+
+  def __init__(self, dir_path, *, max_bytes=2 ** 30, hash_chunk_size=2 ** 20):
+    """
+      :param dir_path: the directory of the cached traces
+      :param max_bytes: the size that the cache is evicted down to
+      :param hash_chunk_size: the bytes of a file read at a time while hashing it
+    """
+
+    self.dir_path = os.path.expanduser(dir_path)
+    self.max_bytes = max_bytes
+    self.hash_chunk_size = hash_chunk_size
+
+    self.num_hits = 0
+    self.num_misses = 0
+
+    os.makedirs(self.dir_path, exist_ok=True)
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        "\tdir_path='{}',\n"
+        '\tmax_bytes={}\n'
+      ')._num_hits={},\n'
+      '._num_misses={}'
+      ''.format(
+        TraceCache.__name__,
+        self.dir_path,
+        self.max_bytes,
+        self.num_hits,
+        self.num_misses,
+      )
+    )
+
+  def key(self, audio_file, audio_pitch, *, use_fast_model=False):
+    """
+      :return: the hex digest of the content of `audio_file` and of
+        every setting of it and `audio_pitch` that changes its trace
+    """
+
+    digest = hashlib.sha256()
+    with open(audio_file.file_path, 'rb') as file:
+      for chunk in iter(lambda: file.read(self.hash_chunk_size), b''):
+        digest.update(chunk)
+
+    digest.update(json.dumps(
+      {
+        'version': TRACE_FORMAT_VERSION,
+        'sample_rate': audio_file.sample_rate,
+        'block_size': audio_file.block_size,
+        'num_channels': audio_file.num_channels,
+        'pitch': trace_settings(audio_pitch, use_fast_model=use_fast_model),
+      },
+      sort_keys=True,
+    ).encode())
+
+    return digest.hexdigest()
+
+  def trace(self, audio_file, audio_pitch, *, use_fast_model=False, num_workers=1):
+    """
+      The trace of `audio_file`, as `batch_detection.pitch_trace` computes
+        it, loaded from the cache or computed and then cached
+
+      :param audio_file: an unopened `audio.File`
+      :param audio_pitch: the `audio.Pitch`, `ToneEnergy` or `EnergyGate` whose settings are used
+      :param num_workers: see `batch_detection.pitch_confidences`
+
+      :return: (the read-only pitches or None, the read-only confidences),
+        which are memory-mapped if they were cached
+    """
+
+    key = self.key(audio_file, audio_pitch, use_fast_model=use_fast_model)
+    has_pitches = _has_pitches(audio_pitch)
+
+    trace = self._load(key, has_pitches=has_pitches)
+    if trace is not None:
+      self.num_hits += 1
+      return trace
+
+    self.num_misses += 1
+    started_at = time.monotonic()
+    # decoded a chunk at a time, so that only the trace, rather than the audio, is held in memory
+    traces = list(batch_detection.iter_pitch_traces(
+      audio_pitch,
+      batch_detection.iter_block_chunks(audio_file),
+      use_fast_model=use_fast_model,
+      num_workers=num_workers,
+    ))
+    pitches = None
+    if has_pitches:
+      pitches = np.concatenate([pitches for pitches, _ in traces] or [np.empty(0, dtype=np.float64)])
+    confidences = np.concatenate([confidences for _, confidences in traces] or [np.empty(0, dtype=np.float64)])
+    logging.info("computed the trace of '{}' in {:.3f}s".format(
+      audio_file.file_path,
+      time.monotonic() - started_at,
+    ))
+
+    # the confidences are written last, since a trace is only loaded once they're there
+    if pitches is not None:
+      self._save(key, PITCHES, pitches)
+    self._save(key, CONFIDENCES, confidences)
+    self.evict(keep_key=key)
+
+    # returned as computed, rather than reloaded, since a concurrent eviction may have deleted them
+    for array in (pitches, confidences):
+      if array is not None:
+        array.setflags(write=False)
+    return pitches, confidences
+
+  def evict(self, *, keep_key=None):
+    """
+      Delete the least recently used traces, each of whose files are
+        deleted together, until the cache holds at most `max_bytes`,
+        or only the trace of `keep_key` is left
+
+      :param keep_key: the key of a trace that's never deleted, e.g. the one just cached,
+         even if it alone holds more than `max_bytes`
+
+      :return: the number of bytes deleted
+    """
+
+    # the (last use, number of bytes, paths) of the files of every trace
+    entries = {}
+    for file_name in os.listdir(self.dir_path):
+      if not file_name.endswith('.npy'):
+        continue
+
+      key = file_name.split('.', 1)[0]
+      path = os.path.join(self.dir_path, file_name)
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        # evicted concurrently, e.g. by another process
+        continue
+
+      last_used_at, num_bytes, paths = entries.get(key, (0.0, 0, []))
+      entries[key] = (max(last_used_at, stat.st_mtime), num_bytes + stat.st_size, paths + [path])
+
+    num_bytes = sum(size for _, size, _ in entries.values())
+    num_bytes_deleted = 0
+    for key, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1][:2]):
+      if num_bytes - num_bytes_deleted <= self.max_bytes:
+        break
+      if key == keep_key:
+        continue
+
+      # the confidences first, so that a concurrent `_load` never finds a trace without its pitches
+      for path in sorted(paths, key=lambda path: not path.endswith('.{}.npy'.format(CONFIDENCES))):
+        try:
+          os.remove(path)
+        except FileNotFoundError:
+          pass
+      num_bytes_deleted += size
+
+    return num_bytes_deleted
+
+  def _path(self, key, name):
+    return os.path.join(self.dir_path, '{}.{}.npy'.format(key, name))
+
+  def _load(self, key, *, has_pitches):
+    """
+      :return: the cached (pitches or None, confidences) of `key`, marking
+        them as recently used, or None if they aren't cached, or if
+        `has_pitches` but the pitches aren't, e.g. since they were
+        evicted concurrently
+    """
+
+    try:
+      confidences = np.load(self._path(key, CONFIDENCES), mmap_mode='r')
+      pitches = np.load(self._path(key, PITCHES), mmap_mode='r') if has_pitches else None
+    except FileNotFoundError:
+      return None
+
+    # the modification time is the last use, since access times are often disabled
+    for name in (PITCHES, CONFIDENCES):
+      try:
+        os.utime(self._path(key, name))
+      except FileNotFoundError:
+        pass
+
+    return pitches, confidences
+
+  def _save(self, key, name, array):
+    # written to a temporary file, and renamed, so that a concurrent
+    #   reader never loads a partially written trace
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=self.dir_path, suffix='.tmp')
+    try:
+      with os.fdopen(file_descriptor, 'wb') as file:
+        np.save(file, array)
+      os.replace(temporary_path, self._path(key, name))
+    except BaseException:
+      os.remove(temporary_path)
+      raise
+
+
+def _has_pitches(audio_pitch):
+  """
+    :return: whether the trace of `audio_pitch` has pitches, which a `ToneEnergy`'s doesn't
+  """
+
+  if isinstance(audio_pitch, EnergyGate):
+    return _has_pitches(audio_pitch.pitch)
+  return not isinstance(audio_pitch, ToneEnergy)
+
+
+def trace_settings(audio_pitch, *, use_fast_model=False):
+  """
+    :return: a json-able dict of every setting of `audio_pitch` that changes its trace
+  """
+
+  if isinstance(audio_pitch, EnergyGate):
+    return {
+      'type': EnergyGate.__name__,
+      'open_db': audio_pitch.open_db,
+      'close_db': audio_pitch.close_db,
+      'peak_open_db': audio_pitch.peak_open_db,
+      'hold_seconds': audio_pitch.hold_seconds,
+      'pre_roll_seconds': audio_pitch.pre_roll_seconds,
+      'floor_fall_seconds': audio_pitch.floor_fall_seconds,
+      'floor_rise_seconds': audio_pitch.floor_rise_seconds,
+      'min_rms': audio_pitch.min_rms,
+      'pitch': trace_settings(audio_pitch.pitch, use_fast_model=use_fast_model),
+    }
+
+  if isinstance(audio_pitch, ToneEnergy):
+    return {
+      'type': ToneEnergy.__name__,
+      'tone_frequencies': audio_pitch.tone_frequencies,
+    }
+
+  assert isinstance(audio_pitch, Pitch), 'cannot cache the trace of a {}'.format(type(audio_pitch))
+
+  model = audio_pitch.model
+  if use_fast_model:
+    model = batch_detection.FAST_PITCH_MODELS.get(model, model)
+
+  return {
+    'type': Pitch.__name__,
+    'model': model,
+    'tolerance': audio_pitch.tolerance,
+    'block_size_multiple': audio_pitch.block_size_multiple,
+    'decimated_sample_rate': audio_pitch.decimated_sample_rate,
+  }
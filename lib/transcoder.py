@@ -0,0 +1,209 @@
+"""
+  Vectorized transcoding between float32 audio, at the microphone's or
+    speaker's sample rate, and the base64 encoded, 8kHz mu-law frames of
+    twilio media streams
+
+  https://www.twilio.com/docs/voice/twiml/stream#message-media
+"""
+
+import base64
+
+import numpy as np
+
+from lib.resample import BlockResampler
+
+MULAW_SAMPLE_RATE = 8000
+FRAME_SECONDS = 0.02
+MULAW_FRAME_SIZE = int(MULAW_SAMPLE_RATE * FRAME_SECONDS)
+
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 32635
+
+
+def _build_mulaw_decode_table():
+  """
+    :return: the int16 linear PCM value of each of the 256 mu-law bytes, per G.711
+  """
+
+  ulaw = ~np.arange(256, dtype=np.int32) & 0xFF
+  exponent = (ulaw >> 4) & 0x07
+  mantissa = ulaw & 0x0F
+  magnitude = (((mantissa << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+  return np.where(ulaw & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _build_mulaw_encode_table():
+  """
+    :return: the mu-law byte of every 14-bit linear PCM value, i.e. an int16
+      sample shifted right by 2, indexed from -8192 at 0, per G.711
+  """
+
+  pcm = np.arange(-8192, 8192, dtype=np.int32) << 2
+  sign = np.where(pcm < 0, 0x80, 0)
+  magnitude = np.minimum(np.abs(pcm), _MULAW_CLIP) + _MULAW_BIAS
+  exponent = np.floor(np.log2(np.maximum(magnitude >> 7, 1))).astype(np.int32)
+  mantissa = (magnitude >> (exponent + 3)) & 0x0F
+  return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+MULAW_DECODE_TABLE = _build_mulaw_decode_table()
+MULAW_ENCODE_TABLE = _build_mulaw_encode_table()
+
+_MULAW_DECODE_TABLE_FLOAT32 = (MULAW_DECODE_TABLE / 32768).astype(np.float32)
+
+
+class MulawEncoder:
+  """
+    Encodes float32 audio, in blocks of any size, into 20ms base64 payloads
+      of 8kHz mu-law: anti-aliased resampling -> 14-bit PCM -> mu-law lookup
+
+    Usage example:
+
+      encoder = MulawEncoder(sample_rate=44100)
+      for payload in encoder.encode(microphone_block):
+        send(payload)
+  """
+
+  def __init__(self, *, sample_rate=44100):
+    self.sample_rate = sample_rate
+    self.frame_size = int(round(sample_rate * FRAME_SECONDS))
+    assert self.frame_size == sample_rate * FRAME_SECONDS, (
+      'sample_rate must be a multiple of {} Hz, but found {}'.format(1 / FRAME_SECONDS, sample_rate)
+    )
+
+    self._resampler = BlockResampler(
+      in_block_size=self.frame_size,
+      out_block_size=MULAW_FRAME_SIZE,
+    )
+
+    # samples that are waiting for enough to make a whole frame
+    self._pending = np.zeros(self.frame_size, dtype=np.float32)
+    self._num_pending = 0
+
+    self._resampled = np.zeros(MULAW_FRAME_SIZE, dtype=np.float32)
+    self._indices = np.zeros(MULAW_FRAME_SIZE, dtype=np.int32)
+    self._mulaw = np.zeros(MULAW_FRAME_SIZE, dtype=np.uint8)
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tsample_rate={}\n'
+      ')._num_pending={}'
+      ''.format(
+        MulawEncoder.__name__,
+        self.sample_rate,
+        self._num_pending,
+      )
+    )
+
+  def encode(self, samples):
+    """
+      :param samples: a 1-D float32 array, in [-1, 1], of any length
+      :return: a list of the base64 payloads of the frames completed by `samples`
+    """
+
+    payloads = []
+    num_samples = len(samples)
+    i = 0
+    while i < num_samples:
+      num_to_copy = min(self.frame_size - self._num_pending, num_samples - i)
+      self._pending[self._num_pending:self._num_pending + num_to_copy] = samples[i:i + num_to_copy]
+      self._num_pending += num_to_copy
+      i += num_to_copy
+
+      if self._num_pending == self.frame_size:
+        payloads.append(self._encode_frame(self._pending))
+        self._num_pending = 0
+
+    return payloads
+
+  def _encode_frame(self, frame):
+    resampled = self._resampler.process(frame, out=self._resampled)
+
+    # float in [-1, 1] -> 14-bit linear PCM -> index into the encode table
+    np.clip(resampled, -1.0, 1.0, out=resampled)
+    np.multiply(resampled, 8191.0, out=resampled)
+    np.add(resampled, 8192.0, out=resampled)
+    np.rint(resampled, out=resampled)
+    self._indices[:] = resampled
+    np.take(MULAW_ENCODE_TABLE, self._indices, out=self._mulaw)
+
+    return base64.b64encode(self._mulaw.tobytes()).decode('ascii')
+
+
+class MulawDecoder:
+  """
+    Decodes base64 payloads of 8kHz mu-law into float32 audio at `sample_rate`:
+      mu-law lookup -> float -> anti-imaging resampling
+
+    Usage example:
+
+      decoder = MulawDecoder(sample_rate=44100)
+      speaker.write(decoder.decode(payload))
+  """
+
+  def __init__(self, *, sample_rate=44100):
+    self.sample_rate = sample_rate
+    self.frame_size = int(round(sample_rate * FRAME_SECONDS))
+    assert self.frame_size == sample_rate * FRAME_SECONDS, (
+      'sample_rate must be a multiple of {} Hz, but found {}'.format(1 / FRAME_SECONDS, sample_rate)
+    )
+
+    self._resampler = BlockResampler(
+      in_block_size=MULAW_FRAME_SIZE,
+      out_block_size=self.frame_size,
+    )
+
+    self._pending = np.zeros(MULAW_FRAME_SIZE, dtype=np.uint8)
+    self._num_pending = 0
+
+    self._linear = np.zeros(MULAW_FRAME_SIZE, dtype=np.float32)
+    # grown, rarely, to fit the most frames that a single payload has completed
+    self._decoded = np.zeros(self.frame_size, dtype=np.float32)
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tsample_rate={}\n'
+      ')._num_pending={}'
+      ''.format(
+        MulawDecoder.__name__,
+        self.sample_rate,
+        self._num_pending,
+      )
+    )
+
+  def decode(self, payload):
+    """
+      :param payload: base64 encoded mu-law bytes, of any length
+      :return: a float32 array of the samples of the frames completed by
+        `payload`, a whole number of `frame_size`s long, which is only
+        valid until the next call
+    """
+
+    mulaw = np.frombuffer(base64.b64decode(payload), dtype=np.uint8)
+
+    num_bytes = len(mulaw)
+    max_num_frames = (self._num_pending + num_bytes) // MULAW_FRAME_SIZE
+    if max_num_frames * self.frame_size > len(self._decoded):
+      self._decoded = np.zeros(max_num_frames * self.frame_size, dtype=np.float32)
+
+    num_frames = 0
+    i = 0
+    while i < num_bytes:
+      num_to_copy = min(MULAW_FRAME_SIZE - self._num_pending, num_bytes - i)
+      self._pending[self._num_pending:self._num_pending + num_to_copy] = mulaw[i:i + num_to_copy]
+      self._num_pending += num_to_copy
+      i += num_to_copy
+
+      if self._num_pending == MULAW_FRAME_SIZE:
+        start = num_frames * self.frame_size
+        self._decode_frame(self._pending, out=self._decoded[start:start + self.frame_size])
+        self._num_pending = 0
+        num_frames += 1
+
+    return self._decoded[:num_frames * self.frame_size]
+
+  def _decode_frame(self, frame, *, out):
+    np.take(_MULAW_DECODE_TABLE_FLOAT32, frame, out=self._linear)
+    return self._resampler.process(self._linear, out=out)
@@ -1,14 +1,27 @@
 # https://www.twilio.com/docs/usage/tutorials/how-to-use-your-free-trial-account#verify-your-personal-phone-number
 # https://www.twilio.com/blog/design-phone-survey-system-python-google-sheets-twilio
 
-import base64
+from collections import OrderedDict
+import logging
 import os
+import threading
+import time
+from urllib.parse import urlencode
+import uuid
 
-from flask import Flask, Response, url_for
+from flask import Flask, request, Response, url_for
 from flask_socketio import emit, SocketIO
 from pyngrok import ngrok
+import sounddevice
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
-from twilio.twiml.voice_response import Connect, Start, VoiceResponse
+from twilio.twiml.voice_response import Connect, VoiceResponse
+
+from lib.audio import CallbackMicrophone
+from lib.call_fan_out import CallFanOut, warm_up_connections
+from lib.pipeline import DoorbellPipeline
+from lib.transcoder import MulawDecoder, MulawEncoder
+from lib.utils import computed_once
 
 
 """  NOTES
@@ -19,8 +32,8 @@ from twilio.twiml.voice_response import Connect, Start, VoiceResponse
     with response.gather(
       num_digits=1,
       action=url_for_domain(
-        domain=NGROK_HTTP_DOMAIN,
-        endpoint='/doorbell/answered'
+        domain=ngrok_http_domain(),
+        path='/doorbell/response'
       ),
       method='POST'
     ) as g:
@@ -58,27 +71,141 @@ from twilio.twiml.voice_response import Connect, Start, VoiceResponse
 
 
 TWILIO_VOICE = 'alice'
-TWILIO_ACCOUNT_SID = os.environ['TWILIO_ACCOUNT_SID']
-TWILIO_AUTH_TOKEN = os.environ['TWILIO_AUTH_TOKEN']
-TWILIO_FROM_NUMBER = os.environ['TWILIO_FROM_NUMBER']
+TWILIO_HTTP_TIMEOUT_SECONDS = 10
+# the optional environment variable, e.g. of conf.json, of the seconds between
+#   the requests that keep a connection open between rings; idle HTTPS
+#   connections are closed by the server, and by NATs, after about a minute,
+#   so e.g. 45, though every request counts against the account's rate limit,
+#   so without it a ring pays for a TLS handshake instead
+TWILIO_KEEP_ALIVE_SECONDS_ENV = 'TWILIO_KEEP_ALIVE_SECONDS'
 
-FLASK_SECRET_KEY = os.environ['FLASK_SECRET_KEY']
 FLASK_PORT = 5000
 
-NGROK_HTTP_DOMAIN = ngrok.connect(
-  port=FLASK_PORT
-)
-NGROK_WSS_DOMAIN = ngrok.connect(
-  port=FLASK_PORT,
-  proto='wss',
-)
 
-app = Flask(__name__)
-app.secret_key = FLASK_SECRET_KEY
-app.config.update({
- 'PREFERRED_URL_SCHEME': 'https',
-})
-socketio = SocketIO(app)
+# nothing connects, or reads the environment, until it's first used, or
+#   `warm_up` is called, so that importing this module is side-effect free
+
+@computed_once
+def twilio_client():
+  # a single client, whose pooled HTTP session keeps its HTTPS connections
+  #   open, so that a ring doesn't pay for a TLS handshake per call
+  return Client(
+    os.environ['TWILIO_ACCOUNT_SID'],
+    os.environ['TWILIO_AUTH_TOKEN'],
+    http_client=TwilioHttpClient(
+      pool_connections=True,
+      timeout=TWILIO_HTTP_TIMEOUT_SECONDS,
+    ),
+  )
+
+
+@computed_once
+def twilio_keep_alive_thread():
+  """
+    :return: the started daemon thread that keeps one of `twilio_client`'s
+      connections open between rings, which can be hours apart, with a
+      single request every `TWILIO_KEEP_ALIVE_SECONDS`, or None if that
+      environment variable isn't set
+  """
+
+  keep_alive_seconds = os.environ.get(TWILIO_KEEP_ALIVE_SECONDS_ENV)
+  if keep_alive_seconds is None:
+    return None
+  keep_alive_seconds = float(keep_alive_seconds)
+
+  def keep_alive():
+    while True:
+      time.sleep(keep_alive_seconds)
+      try:
+        warm_up_connections(twilio_client())
+      except Exception as e:
+        logging.warning('failed to keep the twilio connection alive: {!r}'.format(e))
+
+  thread = threading.Thread(target=keep_alive, name='twilio-keep-alive', daemon=True)
+  thread.start()
+  return thread
+
+
+@computed_once
+def ngrok_http_domain():
+  return ngrok.connect(
+    port=FLASK_PORT
+  )
+
+
+@computed_once
+def ngrok_wss_domain():
+  return ngrok.connect(
+    port=FLASK_PORT,
+    proto='wss',
+  )
+
+
+@computed_once
+def flask_app():
+  app = Flask(__name__)
+  app.secret_key = os.environ['FLASK_SECRET_KEY']
+  app.config.update({
+   'PREFERRED_URL_SCHEME': 'https',
+  })
+
+  app.add_url_rule('/doorbell/connect', view_func=doorbell_connect, methods=['POST'])
+  app.add_url_rule('/doorbell/answered', view_func=doorbell_answered, methods=['POST'])
+  app.add_url_rule('/doorbell/response', view_func=doorbell_response, methods=['POST'])
+  return app
+
+
+@computed_once
+def socketio_server():
+  socketio = SocketIO(flask_app())
+
+  socketio.on_event('start', doorbell_audio_track_started, namespace='/doorbell/stream')
+  socketio.on_event('media', doorbell_audio_track_media, namespace='/doorbell/stream')
+  socketio.on_event('dtmf', doorbell_audio_track_dtmf, namespace='/doorbell/stream')
+  socketio.on_event('stop', doorbell_audio_track_stopped, namespace='/doorbell/stream')
+  return socketio
+
+
+@computed_once
+def web_server_thread():
+  """
+    :return: the started daemon thread that serves the flask app, and its
+      websockets, on `FLASK_PORT`, which the ngrok tunnels forward twilio's
+      webhooks to
+  """
+
+  thread = threading.Thread(
+    target=socketio_server().run,
+    args=(flask_app(),),
+    kwargs={
+      'port': FLASK_PORT,
+      'use_reloader': False,
+      'log_output': False,
+      # the werkzeug server is enough for the webhooks of one doorbell
+      'allow_unsafe_werkzeug': True,
+    },
+    name='twilio-web-server',
+    daemon=True,
+  )
+  thread.start()
+  return thread
+
+
+def warm_up():
+  """
+    Connect the ngrok tunnels and the twilio client, and start serving the
+      flask app, e.g. in a background thread while the doorbell detector
+      starts listening, so that the first ring doesn't wait for them; the
+      client's connection is only kept open if `TWILIO_KEEP_ALIVE_SECONDS` is set
+
+    :return: None
+  """
+
+  warm_up_connections(twilio_client())
+  twilio_keep_alive_thread()
+  ngrok_http_domain()
+  ngrok_wss_domain()
+  web_server_thread()
 
 
 def twiml(twilio_response):
@@ -89,76 +216,241 @@ def twiml(twilio_response):
   return flask_response
 
 
-def url_for_domain(*, domain, endpoint):
-  # return a join of the `domain` and `endpoint`
-  flask_path = url_for(endpoint)
+def url_for_domain(*, domain, path):
+  # return a join of the `domain`, e.g. an ngrok tunnel, and the url `path`,
+  # which, unlike flask's `url_for`, needs no app or request context, so
+  # that it can be called from any thread
+  domain = getattr(domain, 'public_url', domain)
 
   return '/'.join((
     domain.strip('/'),
-    flask_path.strip('/')
+    path.strip('/')
   ))
 
 
+# the function that the webhooks request SwitchBot actions with,
+#   e.g. `DoorbellPipeline.request_action`, or None to only log them
+_action_requester = {
+  'request_action': None,
+}
+def set_action_requester(request_action):
+  _action_requester['request_action'] = request_action
+
+def _request_action(action):
+  request_action = _action_requester['request_action']
+  if request_action is None:
+    logging.info("no action requester for '{}'".format(action))
+    return
+
+  request_action(action)
+
+
 def doorbell_ring(to_phone):
   # ring the `to_phone` number to initiate doorbell communication
-  # response handled by `doorbell_answered`
-  client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-  return client.calls.create(
+  # the answered call's TwiML is handled by `doorbell_connect`
+  web_server_thread()
+  return twilio_client().calls.create(
     to=to_phone,
-    from_=TWILIO_FROM_NUMBER,
-    status_callback=url_for_domain(
-      domain=NGROK_HTTP_DOMAIN,
-      endpoint='/doorbell/answered'
-    ),
-    status_callback_event='answered',
-    status_callback_method='POST'
+    from_=os.environ['TWILIO_FROM_NUMBER'],
+    **_doorbell_call_kwargs()
+  )
+
+
+# the latest fan outs by their id, which the answered calls' webhooks are
+# sent with, so that a call is only ever looked up in its own fan out
+_fan_outs = OrderedDict()
+_fan_outs_lock = threading.Lock()
+MAX_NUM_FAN_OUTS = 8
+
+def doorbell_ring_all(to_phones):
+  # ring every `to_phones` number at once; the first to answer
+  # gets the doorbell, and the others' calls are canceled by `doorbell_answered`
+  web_server_thread()
+  fan_out_id = uuid.uuid4().hex
+  fan_out = CallFanOut(
+    client=twilio_client(),
+    from_phone=os.environ['TWILIO_FROM_NUMBER'],
+    to_phones=to_phones,
+    create_kwargs=_doorbell_call_kwargs(fan_out_id=fan_out_id),
   )
+  with _fan_outs_lock:
+    _fan_outs[fan_out_id] = fan_out
+    while len(_fan_outs) > MAX_NUM_FAN_OUTS:
+      _fan_outs.popitem(last=False)
+
+  return fan_out.start()
+
+def _doorbell_call_kwargs(*, http_domain=None, fan_out_id=None):
+  # the kwargs of every doorbell call's `calls.create`
+  # twilio fetches the TwiML of the answered call from `url`, whereas
+  # whatever the `status_callback` returns is ignored, so it only cancels
+  # the other calls of a `doorbell_ring_all`, whose `fan_out_id` both
+  # webhooks are sent with
+  http_domain = ngrok_http_domain() if http_domain is None else http_domain
+  query = '' if fan_out_id is None else '?' + urlencode({'fan_out_id': fan_out_id})
+  return {
+    'url': url_for_domain(
+      domain=http_domain,
+      path='/doorbell/connect' + query
+    ),
+    'method': 'POST',
+    'status_callback': url_for_domain(
+      domain=http_domain,
+      path='/doorbell/answered' + query
+    ),
+    'status_callback_event': 'answered',
+    'status_callback_method': 'POST',
+  }
+
+def _is_doorbell_answer(call_sid, fan_out_id):
+  # whether `call_sid` gets the doorbell, i.e. is the call of a `doorbell_ring`,
+  # which has no `fan_out_id`, or the first answer of its `doorbell_ring_all`
+  if fan_out_id is None:
+    return True
+
+  with _fan_outs_lock:
+    fan_out = _fan_outs.get(fan_out_id)
+  if fan_out is None:
+    # too old to still be kept, so that whether it was answered first is unknown
+    logging.warning("no fan out '{}' of call '{}'".format(fan_out_id, call_sid))
+    return False
+
+  return fan_out.on_answered(call_sid)
 
-@app.route('/doorbell/answered', methods=['POST'])
 def doorbell_answered():
-  # the `doorbell_ring` has been answered by the `to_phone`
+  # the status callback of a `doorbell_ring` having been answered by the
+  # `to_phone`, which cancels the other calls of its `doorbell_ring_all`
+  _is_doorbell_answer(
+    request.form.get('CallSid'),
+    request.args.get('fan_out_id'),
+  )
+  return Response(status=204)
+
+def doorbell_connect():
+  # the TwiML of a `doorbell_ring` that the `to_phone` answered
   # initiate a bi-directional stream to be communicated over websocket
 
   response = VoiceResponse()
 
-  start = Start()
-  start.stream(
+  if not _is_doorbell_answer(
+    request.form.get('CallSid'),
+    request.args.get('fan_out_id'),
+  ):
+    # another phone of the `doorbell_ring_all` answered first
+    response.hangup()
+    return twiml(response)
+
+  # pick up the intercom's handset, so that the call has its audio
+  _request_action(DoorbellPipeline.ANSWER_DOORBELL)
+
+  # only a <Connect><Stream> accepts media sent back over the websocket
+  connect = Connect()
+  connect.stream(
     url=url_for_domain(
-      domain=NGROK_WSS_DOMAIN,
-      endpoint='/doorbell/stream'
-    ),
-    track='both_tracks'
+      domain=ngrok_wss_domain(),
+      path='/doorbell/stream'
+    )
   )
-  response.append(start)
+  response.append(connect)
   return twiml(response)
 
+
+class DoorbellAudioBridge:
+  """
+    Bridges the intercom's audio with the phone call's media stream:
+      intercom microphone (float32) -> 8kHz mu-law payloads -> caller
+      caller -> 8kHz mu-law payloads -> float32 -> intercom speaker
+  """
+
+  def __init__(self, *, sample_rate=44100):
+    self.sample_rate = sample_rate
+
+    self.encoder = MulawEncoder(sample_rate=sample_rate)
+    self.decoder = MulawDecoder(sample_rate=sample_rate)
+    self.microphone = CallbackMicrophone(
+      sample_rate=sample_rate,
+      block_size=self.encoder.frame_size,
+    )
+    self._speaker = None
+
+  def __repr__(self):
+    return (
+      '{}(\n'
+        '\tsample_rate={}\n'
+      ')'
+      ''.format(
+        DoorbellAudioBridge.__name__,
+        self.sample_rate,
+      )
+    )
+
+  def open(self):
+    self.microphone.open()
+    self._speaker = sounddevice.OutputStream(
+      samplerate=self.sample_rate,
+      channels=1,
+      dtype='float32',
+    )
+    self._speaker.start()
+
+  def close(self):
+    self.microphone.close()
+    self._speaker.stop()
+    self._speaker.close()
+    self._speaker = None
+
+  def play(self, payload):
+    samples = self.decoder.decode(payload)
+    if len(samples):
+      self._speaker.write(samples)
+
+  def iter_outbound_payloads(self):
+    # only send what has already been captured, so that this never blocks
+    while self.microphone.num_frames_buffered >= self.microphone.block_size:
+      yield from self.encoder.encode(self.microphone.read())
+
+
 _cache = {
   'stream_sid': None,
+  'audio_bridge': None,
 }
-@socketio.on('start', namespace='/doorbell/stream')
 def doorbell_audio_track_started(data):
   assert _cache['stream_sid'] is None, "_cache['stream_sid'] == '{}'".format(_cache['stream_sid'])
 
   _cache['stream_sid'] = data['start']['streamSid']
+  _cache['audio_bridge'] = DoorbellAudioBridge()
+  _cache['audio_bridge'].open()
 
-@socketio.on('media', namespace='/doorbell/stream')
-def doorbell_audio_track_media(_data):
-  assert _cache['stream_sid'] is not None, "_cache['stream_sid'] is None for data of {}".format(_data)
-
-  emit(
-    'media',
-    {
-      'streamSid': 'xxxxxxx',
-      'media': {
-        'payload': base64.b64encode(
-          # raw mulaw/8000
-        )
+def doorbell_audio_track_media(data):
+  assert _cache['stream_sid'] is not None, "_cache['stream_sid'] is None for data of {}".format(data)
+
+  audio_bridge = _cache['audio_bridge']
+  audio_bridge.play(data['media']['payload'])
+
+  for payload in audio_bridge.iter_outbound_payloads():
+    emit(
+      'media',
+      {
+        'event': 'media',
+        'streamSid': _cache['stream_sid'],
+        'media': {
+          'payload': payload,
+        },
       }
+    )
 
-    }
-  )
+def doorbell_audio_track_dtmf(data):
+  # any key pressed by the caller unlocks the door to the building
+  logging.info("the caller pressed '{}'".format(data['dtmf']['digit']))
+  _request_action(DoorbellPipeline.UNLOCK_DOOR)
+
+def doorbell_audio_track_stopped(_data):
+  if _cache['audio_bridge'] is not None:
+    _cache['audio_bridge'].close()
+
+  _cache['stream_sid'] = None
+  _cache['audio_bridge'] = None
 
-@app.route('/doorbell/response', methods=['POST'])
 def doorbell_response():
   response = VoiceResponse()
   with response.gather(
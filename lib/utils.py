@@ -3,6 +3,7 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
 
 
@@ -127,3 +128,37 @@ class AssertContextFunc(object):
       )
     
     return decorated
+
+
+def computed_once(func):
+  """
+    A decorator for a function without arguments, e.g. one that connects to
+      a service, that runs it on the first call only, and returns that
+      first call's result from then on
+    
+    Unlike `functools.lru_cache`, concurrent first calls run `func` once,
+      with the other callers waiting for its result, so that a service can
+      be warmed up in a background thread while it's also being used
+    
+    If `func` raises then nothing is cached, and the next call retries
+    
+    Usage example:
+    
+      @computed_once
+      def client():
+        return Client(os.environ['ACCOUNT_SID'])
+  """
+  
+  lock = threading.Lock()
+  results = []
+  
+  @functools.wraps(func)
+  def decorated():
+    if not results:
+      with lock:
+        if not results:
+          results.append(func())
+    return results[0]
+  
+  decorated.is_computed = lambda: bool(results)
+  return decorated
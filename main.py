@@ -1,9 +1,19 @@
 from argparse import ArgumentParser
+import asyncio
+from contextlib import ExitStack
 import logging
 import os
 from pathlib import Path
+import signal
+import threading
 from lib.utils import configure_logging, load_conf_to_env_vars
-from lib import audio, door_bell_detectors
+from lib import audio, batch_detection, door_bell_detectors
+from lib.calibration import load_detector_kwargs
+from lib.capture import CaptureManager
+from lib.clips import ClipRecorder
+from lib.instrumentation import INSTRUMENTATION
+from lib.pipeline import DoorbellPipeline
+from lib.trace_cache import TraceCache
 
 
 def main_kwargs():
@@ -13,6 +23,23 @@ def main_kwargs():
   arg_parser.add_argument('-conf_path', '--conf_path', type=str, default=os.path.join(Path().absolute(), 'conf.json'))
   arg_parser.add_argument('-log_level', '--log_level', type=str, default='INFO')
   arg_parser.add_argument('-audio_file_path', '--audio_file_path', type=str)
+  arg_parser.add_argument('-replay_speed', '--replay_speed', type=float)
+  arg_parser.add_argument('-batch', '--batch', action='store_true')
+  arg_parser.add_argument('-callback_microphone', '--callback_microphone', action='store_true')
+  arg_parser.add_argument('-daemon', '--daemon', action='store_true')
+  arg_parser.add_argument('-cooldown_seconds', '--cooldown_seconds', type=float, default=10)
+  arg_parser.add_argument('-async_pipeline', '--async_pipeline', action='store_true')
+  arg_parser.add_argument('-to_phones', '--to_phones', type=str, nargs='+')
+  arg_parser.add_argument('-instrumentation_log_seconds', '--instrumentation_log_seconds', type=float)
+  arg_parser.add_argument('-decimated_sample_rate', '--decimated_sample_rate', type=int)
+  arg_parser.add_argument('-tone_frequencies', '--tone_frequencies', type=float, nargs='+')
+  arg_parser.add_argument('-tone_sample_file_path', '--tone_sample_file_path', type=str)
+  arg_parser.add_argument('-energy_gate', '--energy_gate', action='store_true')
+  arg_parser.add_argument('-devices', '--devices', type=str, nargs='+')
+  arg_parser.add_argument('-clips_dir_path', '--clips_dir_path', type=str)
+  arg_parser.add_argument('-detector_kwargs_path', '--detector_kwargs_path', type=str)
+  arg_parser.add_argument('-trace_cache_dir_path', '--trace_cache_dir_path', type=str)
+  arg_parser.add_argument('-use_fast_model', '--use_fast_model', action='store_true')
   
   kwargs = vars(arg_parser.parse_args())
   kwargs['log_level'] = logging._checkLevel(kwargs['log_level'].upper())
@@ -20,22 +47,201 @@ def main_kwargs():
   return kwargs
 
 
-def main(*, conf_path, log_level, door_bell_detector, audio_file_path=None):
+def main(
+  *,
+  conf_path,
+  log_level,
+  door_bell_detector,
+  audio_file_path=None,
+  replay_speed=None,
+  batch=False,
+  callback_microphone=False,
+  daemon=False,
+  cooldown_seconds=10,
+  async_pipeline=False,
+  to_phones=None,
+  instrumentation_log_seconds=None,
+  decimated_sample_rate=None,
+  tone_frequencies=None,
+  tone_sample_file_path=None,
+  energy_gate=False,
+  devices=None,
+  clips_dir_path=None,
+  detector_kwargs_path=None,
+  trace_cache_dir_path=None,
+  use_fast_model=False,
+):
   load_conf_to_env_vars(json_path=conf_path)
   configure_logging(level=log_level)
   
-  audio_stream = (
-    audio.Microphone()
-    if audio_file_path is None
-    else audio.File(file_path=audio_file_path)
+  assert not batch or audio_file_path is not None, (
+    'batch detection requires an audio_file_path'
   )
+  assert batch or not use_fast_model, (
+    'use_fast_model only applies to batch detection'
+  )
+  assert batch or trace_cache_dir_path is None, (
+    'trace_cache_dir_path only applies to batch detection'
+  )
+  assert sum((async_pipeline, daemon, batch)) <= 1, (
+    'async_pipeline, daemon and batch are mutually exclusive'
+  )
+  assert async_pipeline or not to_phones, (
+    'to_phones are only called by the async_pipeline'
+  )
+  assert not batch or replay_speed is None, (
+    'batch detection reads the audio_file_path at once, so it has no replay_speed'
+  )
+  assert devices is None or audio_file_path is None, (
+    'devices are only listened to when there is no audio_file_path'
+  )
+  assert devices is None or not (async_pipeline or daemon or batch or to_phones), (
+    'devices are only listened to for printing their rings, so the async_pipeline, daemon, '
+    'batch and to_phones options are unsupported with them'
+  )
+  
+  if instrumentation_log_seconds is not None:
+    INSTRUMENTATION.enable(log_interval_seconds=instrumentation_log_seconds)
+  
+  microphone_class = audio.CallbackMicrophone if callback_microphone else audio.Microphone
   
   doorbell_detector_class = getattr(door_bell_detectors, door_bell_detector)
-  doorbell_detector_instance = doorbell_detector_class(audio_stream=audio_stream)
-  logging.info('Listening via doorbell detector of {}'.format(doorbell_detector_instance))
+  doorbell_detector_kwargs = {}
+  if detector_kwargs_path is not None:
+    # e.g. the output of `lib.calibration`
+    doorbell_detector_kwargs = load_detector_kwargs(detector_kwargs_path)
+  if decimated_sample_rate is not None:
+    doorbell_detector_kwargs['pitch_kwargs'] = {
+      **doorbell_detector_kwargs.get('pitch_kwargs', {}),
+      'decimated_sample_rate': decimated_sample_rate,
+    }
+  if tone_frequencies is not None:
+    doorbell_detector_kwargs['tone_frequencies'] = tone_frequencies
+  if tone_sample_file_path is not None:
+    doorbell_detector_kwargs['tone_sample_file_path'] = tone_sample_file_path
+  if energy_gate:
+    doorbell_detector_kwargs['energy_gate_kwargs'] = {}
+  
+  with ExitStack() as exit_stack:
+    def new_detector(audio_stream, *, clips_sub_dir_path=''):
+      clip_recorder = None
+      if clips_dir_path is not None:
+        clip_recorder = exit_stack.enter_context(ClipRecorder(
+          audio_stream,
+          dir_path=os.path.join(clips_dir_path, clips_sub_dir_path),
+        ))
+      
+      return doorbell_detector_class(
+        audio_stream=audio_stream,
+        clip_recorder=clip_recorder,
+        **doorbell_detector_kwargs
+      )
+    
+    if devices is not None:
+      capture_manager = CaptureManager(
+        detectors={
+          device: new_detector(microphone_class(device=device), clips_sub_dir_path=device)
+          for device in devices
+        },
+        cooldown_seconds=cooldown_seconds,
+        log_interval_seconds=instrumentation_log_seconds,
+      )
+      logging.info('Listening via {}'.format(capture_manager))
+      capture_until_terminated(capture_manager)
+      return
+    
+    doorbell_detector_instance = new_detector(
+      microphone_class()
+      if audio_file_path is None
+      else audio.File(file_path=audio_file_path, replay_speed=replay_speed)
+    )
+    logging.info('Listening via doorbell detector of {}'.format(doorbell_detector_instance))
+    
+    if async_pipeline:
+      run_pipeline_until_terminated(
+        doorbell_detector_instance,
+        to_phones=to_phones,
+      )
+    elif daemon:
+      listen_until_terminated(
+        doorbell_detector_instance,
+        cooldown_seconds=cooldown_seconds,
+      )
+    elif batch:
+      # batch detection doesn't stream the blocks, so it records no clips
+      trace_cache = None if trace_cache_dir_path is None else TraceCache(trace_cache_dir_path)
+      for seconds in batch_detection.detect_ring_cycles(
+        doorbell_detector_instance,
+        use_fast_model=use_fast_model,
+        trace_cache=trace_cache,
+      ):
+        print('the doorbell is ringing at {:.3f}s'.format(seconds))
+    elif doorbell_detector_instance.is_ringing():
+      print('the doorbell is ringing')
+  
+  if INSTRUMENTATION.enabled:
+    logging.info('instrumentation summary: {}'.format(INSTRUMENTATION.summary()))
+
+
+def listen_until_terminated(doorbell_detector_instance, *, cooldown_seconds):
+  """
+    Run `doorbell_detector_instance` as a long-lived service,
+      reporting every ring, until SIGTERM or SIGINT is received
+  """
+  
+  stop_event = threading.Event()
+  
+  def stop(signal_number, _frame):
+    logging.info('Received signal {}; stopping'.format(signal.Signals(signal_number).name))
+    stop_event.set()
+  
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+  
+  doorbell_detector_instance.listen(
+    on_ring=lambda: print('the doorbell is ringing', flush=True),
+    cooldown_seconds=cooldown_seconds,
+    stop_event=stop_event,
+  )
+
+
+def capture_until_terminated(capture_manager):
+  """
+    Run every device of `capture_manager`, reporting each ring along
+      with its device, until SIGTERM or SIGINT is received
+  """
+  
+  def stop(signal_number, _frame):
+    logging.info('Received signal {}; stopping'.format(signal.Signals(signal_number).name))
+    capture_manager.stop()
+  
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+  
+  capture_manager.run(
+    on_ring=lambda device: print("the doorbell of '{}' is ringing".format(device), flush=True),
+  )
+
+
+def run_pipeline_until_terminated(doorbell_detector_instance, *, to_phones):
+  """
+    Run the asyncio `DoorbellPipeline`, calling `to_phones` for every ring,
+      until SIGTERM or SIGINT is received
+  """
+  
+  pipeline = DoorbellPipeline(
+    detector=doorbell_detector_instance,
+    to_phones=to_phones,
+  )
+  
+  def stop(signal_number, _frame):
+    logging.info('Received signal {}; stopping'.format(signal.Signals(signal_number).name))
+    pipeline.stop()
+  
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
   
-  if doorbell_detector_instance.is_ringing():
-    print('the doorbell is ringing')
+  asyncio.run(pipeline.run())
 
 
 if __name__ == '__main__':